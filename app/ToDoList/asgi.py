@@ -9,8 +9,55 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
+from asgiref.sync import ThreadSensitiveContext
+from asgiref.wsgi import WsgiToAsgi
 from django.core.asgi import get_asgi_application
+from django.core.wsgi import get_wsgi_application
+from django.urls import Resolver404, resolve
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ToDoList.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+# Выгрузка доски – синхронный генератор с запросами к базе внутри транзакции. ASGI обработчик Django 4.1
+# перебирает его в цикле событий (SynchronousOnlyOperation), поэтому она идет через WSGI обработчик,
+# который вместе с перебором ответа выполняется в одном потоке. Поток у каждой выгрузки свой
+# (ThreadSensitiveContext, как у запросов Django), иначе все выгрузки воркера шли бы по очереди
+# через общий поток sync_to_async
+wsgi_handler = get_wsgi_application()
+
+
+def closing_wsgi_handler(environ, start_response):
+    # WsgiToAsgi не вызывает close() у ответа, а без него нет request_finished и соединение с базой
+    # остается в потоке выгрузки
+    response = wsgi_handler(environ, start_response)
+    try:
+        yield from response
+    finally:
+        response.close()
+
+
+wsgi_application = WsgiToAsgi(closing_wsgi_handler)
+
+# Импортируем после инициализации Django
+from goals import sse  # noqa: E402
+
+# Поток событий досок обслуживается отдельным асинхронным приложением, выгрузка – WSGI обработчиком,
+# остальное – Django
+SSE_PATH = "/goals/events"
+WSGI_ROUTES = {"export-board"}
+
+
+def is_wsgi_route(path: str) -> bool:
+    try:
+        return resolve(path).url_name in WSGI_ROUTES
+    except Resolver404:
+        return False
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "http" and scope["path"] == SSE_PATH:
+        return await sse.application(scope, receive, send)
+    if scope["type"] == "http" and is_wsgi_route(scope["path"]):
+        async with ThreadSensitiveContext():
+            return await wsgi_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -50,6 +50,7 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     'social_django',
     'django_filters',
     'rest_framework',
@@ -60,6 +61,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы время запроса включало остальные middleware
+    "core.middleware.MetricsMiddleware",
+    # До сессий и аутентификации, чтобы и их чтение шло с реплики
+    "core.middleware.ReplicaMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -104,9 +109,52 @@ DATABASES = {
             'PASSWORD': env('POSTGRES_PASSWORD'),
             'HOST': env('POSTGRES_HOST', default='127.0.0.1'),
             'PORT': env('POSTGRES_PORT'),
+            # Используется только с ENGINE = 'core.db.pooled': соединения берутся из пула процесса
+            # и возвращаются в него по окончании запроса (CONN_MAX_AGE = 0)
+            'POOL': {
+                'MAX_SIZE': env.int('DB_POOL_MAX_SIZE', default=10),
+                'TIMEOUT': env.float('DB_POOL_TIMEOUT', default=5),
+                'MAX_IDLE': env.int('DB_POOL_MAX_IDLE', default=300),
+                'HEALTH_CHECK_INTERVAL': env.int('DB_POOL_HEALTH_CHECK_INTERVAL', default=30),
+            },
         }
 }
 
+# Реплики для чтения: DB_REPLICA_HOSTS=host1:5432,host2 (порт по умолчанию – как у основной базы).
+# Имя базы и учетные данные те же, что у основной. Для проверки локально достаточно указать тот же сервер
+DATABASE_REPLICAS = []
+for number, address in enumerate(env.list('DB_REPLICA_HOSTS', default=[])):
+    replica_host, _, replica_port = address.partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': replica_host,
+        'PORT': replica_port or DATABASES['default']['PORT'],
+        # В тестах реплика смотрит в тестовую базу, а не создает свою
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+# Состояния разговоров бота (BOT_STATE_STORAGE = database) можно держать в отдельном файле SQLite,
+# тогда таблицу создает python manage.py migrate bot --database bot_state
+if env.str('BOT_STATE_SQLITE_PATH', default=''):
+    DATABASES['bot_state'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env.str('BOT_STATE_SQLITE_PATH'),
+    }
+BOT_STATE_DATABASE = 'bot_state' if 'bot_state' in DATABASES else 'default'
+
+DATABASE_ROUTERS = ['bot.routers.BotStateRouter', 'core.routers.ReplicaRouter']
+
+# Сколько секунд после изменяющего запроса пользователь читает с основной базы, а не с реплики
+READ_REPLICA_STICKY_SECONDS = env.int('READ_REPLICA_STICKY_SECONDS', default=10)
+
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+# Для нескольких процессов нужен общий кеш, например dbcache://cache_table или memcache://127.0.0.1:11211
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
@@ -190,3 +238,44 @@ SOCIAL_AUTH_VK_EXTRA_DATA = [
 
 # Telegram token
 TG_TOKEN = env.str('TG_TOKEN')
+# Адрес Bot API, для локальной проверки можно указать свой сервер
+TG_API_URL = env.str('TG_API_URL', default='https://api.telegram.org')
+# Сколько сообщений разных чатов бот обрабатывает одновременно (потоки с соединениями к базе)
+BOT_WORKERS = env.int('BOT_WORKERS', default=8)
+# Сколько полученных и еще не обработанных сообщений держать в памяти, дальше бот перестает опрашивать Telegram
+BOT_MAX_PENDING = env.int('BOT_MAX_PENDING', default=100)
+# Где хранить состояние разговоров с ботом: memory – в памяти процесса, database – в таблице, общей для всех
+# процессов бота (нужно для нескольких воркеров webhook и чтобы разговор пережил перезапуск)
+BOT_STATE_STORAGE = env.str('BOT_STATE_STORAGE', default='memory')
+# Сколько секунд процесс доверяет прочитанному из базы состоянию, не перечитывая его
+BOT_STATE_CACHE_TTL = env.float('BOT_STATE_CACHE_TTL', default=2)
+# Через сколько секунд без сообщений забывать незаконченный разговор с ботом (например, /create)
+BOT_STATE_TTL = env.int('BOT_STATE_TTL', default=3600)
+# Сколько незаконченных разговоров держать в памяти, при переполнении забываются самые давние
+BOT_STATE_MAX_CHATS = env.int('BOT_STATE_MAX_CHATS', default=10000)
+# Секрет webhook (bot/webhook), без него webhook выключен и бот работает через runbot
+TG_WEBHOOK_SECRET = env.str('TG_WEBHOOK_SECRET', default='')
+# Сколько часов помнить id принятых через webhook обновлений, чтобы не обработать повтор
+TG_WEBHOOK_RETENTION_HOURS = env.int('TG_WEBHOOK_RETENTION_HOURS', default=24)
+
+# Metrics settings
+# Доля запросов, для которых собираются метрики (0 – middleware отключен)
+METRICS_SAMPLE_RATE = env.float('METRICS_SAMPLE_RATE', default=0.1)
+# Токен для /metrics, без него эндпоинт недоступен
+METRICS_TOKEN = env.str('METRICS_TOKEN', default='')
+
+# Goals settings
+# Сколько секунд хранить в кеше роли пользователя на досках, 0 – только в пределах запроса
+BOARD_ROLES_CACHE_TIMEOUT = env.int('BOARD_ROLES_CACHE_TIMEOUT', default=0)
+# Сколько дней хранить журнал изменений досок, клиенты с токеном старше этого перечитывают списки целиком
+SYNC_EVENTS_RETENTION_DAYS = env.int('SYNC_EVENTS_RETENTION_DAYS', default=30)
+# Шина событий досок для SSE (goals/events), LocalBus работает только в пределах одного процесса
+GOALS_EVENT_BUS = env.str('GOALS_EVENT_BUS', default='goals.broker.LocalBus')
+# Сколько непрочитанных событий держать на одно соединение, при переполнении клиент получает reset
+GOALS_EVENTS_QUEUE_SIZE = env.int('GOALS_EVENTS_QUEUE_SIZE', default=100)
+# Через сколько секунд тишины отправлять в поток пустой комментарий
+GOALS_EVENTS_HEARTBEAT = env.int('GOALS_EVENTS_HEARTBEAT', default=15)
+# Через сколько дней после архивации archive_goals переносит цель с комментариями в холодные таблицы
+GOALS_ARCHIVE_AFTER_DAYS = env.int('GOALS_ARCHIVE_AFTER_DAYS', default=90)
+# Сколько целей переносить одной транзакцией
+GOALS_ARCHIVE_BATCH_SIZE = env.int('GOALS_ARCHIVE_BATCH_SIZE', default=1000)
@@ -18,6 +18,8 @@ from django.urls import path, include
 from django.contrib.auth import views as auth_views
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from core.views import metrics_view
+
 urlpatterns = [
     path("admin/", admin.site.urls),
     path('admin/password_reset/',
@@ -38,5 +40,6 @@ urlpatterns = [
     #API swagger section
     path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
     path('api/schema/swagger-ui/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger-ui'),
-    path("oauth/", include("social_django.urls", namespace="social"))
+    path("oauth/", include("social_django.urls", namespace="social")),
+    path('metrics', metrics_view, name='metrics'),
 ]
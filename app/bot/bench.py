@@ -0,0 +1,134 @@
+import asyncio
+import json
+import multiprocessing
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bot.tg.dispatcher import Dispatcher
+
+# Чаты замеров: до и после прогона их TgUser удаляются. Id в Telegram укладываются в 52 бита,
+# поэтому чатов с id от -2**62 у настоящих пользователей и групп быть не может
+CHAT_ID_START = -2 ** 62
+# Столько обновлений Telegram отдает за один getUpdates
+BATCH_SIZE = 100
+
+
+def make_updates(messages: int, chats: int) -> list[dict]:
+    # Сообщения от чатов без привязанного пользователя: на каждое бот пишет код верификации в базу
+    # и отправляет ровно один ответ
+    updates = []
+    for i in range(messages):
+        chat_id = CHAT_ID_START + i % chats
+        user = {'id': chat_id, 'is_bot': False, 'username': f'bench_{i % chats}', 'first_name': 'bench'}
+        updates.append({'update_id': i + 1, 'message': {
+            'message_id': i + 1, 'chat': {'id': chat_id, 'username': user['username'], 'type': 'private'},
+            'from': user, 'text': 'hello'}})
+    return updates
+
+
+class FakeBotApiHandler(BaseHTTPRequestHandler):
+    # keep-alive, как у настоящего Bot API, иначе замеряем установку соединений
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, data: dict) -> None:
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        offset = int(parse_qs(urlparse(self.path).query).get('offset', ['0'])[0])
+        batch = self.server.updates[max(offset - 1, 0):max(offset - 1, 0) + BATCH_SIZE]
+        if not batch:
+            # Вместо long polling – короткая пауза, чтобы бот не крутился вхолостую
+            time.sleep(0.05)
+        self._send_json({'ok': True, 'result': batch})
+
+    def do_POST(self):
+        data = json.loads(self.rfile.read(int(self.headers['Content-Length'])) or b'{}')
+        time.sleep(self.server.latency)
+        self.server.count_sent()
+        self._send_json({'ok': True, 'result': {
+            'message_id': 1, 'chat': {'id': data.get('chat_id', 0), 'username': 'bench', 'type': 'private'},
+            'from': {'id': 1, 'is_bot': True, 'username': 'bot', 'first_name': 'bot'}, 'text': data.get('text', '')}})
+
+
+class FakeBotApi(ThreadingHTTPServer):
+    '''
+    Поддельный Bot API для замеров бота: getUpdates отдает заготовленные сообщения пачками по BATCH_SIZE,
+    sendMessage отвечает через latency секунд. Когда ответов отправлено столько же, сколько было сообщений,
+    выставляется done.
+    '''
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, port: int, updates: list[dict], latency: float, done):
+        super().__init__(('127.0.0.1', port), FakeBotApiHandler)
+        self.updates = updates
+        self.latency = latency
+        self.done = done
+        self.sent = 0
+        self.lock = threading.Lock()
+
+    def count_sent(self) -> None:
+        with self.lock:
+            self.sent += 1
+            if self.sent == len(self.updates):
+                self.done.set()
+
+
+def serve(port: int, messages: int, chats: int, latency: float, ready, done) -> None:
+    server = FakeBotApi(port, make_updates(messages, chats), latency, done)
+    ready.set()
+    server.serve_forever()
+
+
+def start_server(port: int, messages: int, chats: int, latency: float) -> tuple[multiprocessing.Process, object]:
+    # Сервер в отдельном процессе, чтобы не делить GIL с потоками бота. Возвращает процесс и событие done
+    ready, done = multiprocessing.Event(), multiprocessing.Event()
+    process = multiprocessing.Process(target=serve, args=(port, messages, chats, latency, ready, done), daemon=True)
+    process.start()
+    if not ready.wait(10):
+        process.kill()
+        raise RuntimeError('Поддельный Bot API не запустился')
+    return process, done
+
+
+def run_sequential(command, done, timeout: float) -> None:
+    # Прежний цикл runbot: сообщения по одному, ответ Telegram ждем до следующего сообщения
+    offset = 0
+    deadline = time.monotonic() + timeout
+    while not done.is_set() and time.monotonic() < deadline:
+        for update in command.tg_client.get_updates(offset=offset).result:
+            offset = update.update_id + 1
+            command.handle_message(message=update.message)
+
+
+def run_dispatcher(command, done, timeout: float, workers: int, max_pending: int) -> None:
+    async def main():
+        dispatcher = Dispatcher(
+            get_updates=lambda offset: command.tg_client.get_updates(offset=offset).result,
+            handle=command.handle_message,
+            workers=workers,
+            max_pending=max_pending,
+        )
+        task = asyncio.create_task(dispatcher.run())
+        await asyncio.get_running_loop().run_in_executor(None, done.wait, timeout)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        # Дожидаемся последнего getUpdates, пока сервер еще работает
+        dispatcher.poller.shutdown(wait=True)
+
+    asyncio.run(main())
@@ -0,0 +1,58 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from bot.bench import CHAT_ID_START, run_dispatcher, run_sequential, start_server
+from bot.management.commands.runbot import Command as BotCommand
+from bot.models import TgUser
+from bot.tg.clients import TgClient
+
+
+class Command(BaseCommand):
+    help = 'Замер пропускной способности runbot на поддельном Bot API, результат в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=400)
+        parser.add_argument('--chats', type=int, default=40)
+        parser.add_argument('--latency', type=float, default=0.03, help='Время ответа sendMessage, с')
+        parser.add_argument('--workers', type=int, default=settings.BOT_WORKERS)
+        parser.add_argument('--max-pending', type=int, default=settings.BOT_MAX_PENDING)
+        parser.add_argument('--sequential', action='store_true',
+                            help='Прежний цикл runbot: по одному сообщению, без Dispatcher')
+        parser.add_argument('--port', type=int, default=8765, help='Порт поддельного Bot API')
+        parser.add_argument('--timeout', type=float, default=300)
+        parser.add_argument('--label', default='', help='Метка прогона, например хеш коммита')
+
+    def handle(self, *args, **options):
+        chats = TgUser.objects.filter(chat_id__gte=CHAT_ID_START, chat_id__lt=CHAT_ID_START + options['chats'])
+        chats.delete()
+        process, done = start_server(options['port'], options['messages'], options['chats'], options['latency'])
+        bot = BotCommand()
+        bot.tg_client = TgClient('bench', f'http://127.0.0.1:{options["port"]}', pool_size=options['workers'] + 1)
+        try:
+            start = time.perf_counter()
+            if options['sequential']:
+                run_sequential(bot, done, options['timeout'])
+            else:
+                run_dispatcher(bot, done, options['timeout'], options['workers'], options['max_pending'])
+            elapsed = time.perf_counter() - start
+        finally:
+            process.kill()
+            chats.delete()
+        if not done.is_set():
+            raise CommandError(f'Бот не ответил на все сообщения за {options["timeout"]} с')
+
+        report = {
+            'label': options['label'],
+            'mode': 'sequential' if options['sequential'] else 'dispatcher',
+            'workers': None if options['sequential'] else options['workers'],
+            'messages': options['messages'],
+            'chats': options['chats'],
+            'latency': options['latency'],
+            'engine': settings.DATABASES['default']['ENGINE'],
+            'seconds': round(elapsed, 3),
+            'messages_per_second': round(options['messages'] / elapsed, 1),
+        }
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True))
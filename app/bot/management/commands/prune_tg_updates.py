@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bot.models import TgUpdate
+
+
+class Command(BaseCommand):
+    help = 'Удаляет id принятых через webhook обновлений старше TG_WEBHOOK_RETENTION_HOURS часов'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(hours=settings.TG_WEBHOOK_RETENTION_HOURS)
+        deleted, _ = TgUpdate.objects.filter(received__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено обновлений: {deleted}'))
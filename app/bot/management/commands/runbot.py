@@ -1,15 +1,18 @@
+import asyncio
 import logging
 import secrets
 from datetime import datetime, timedelta
 from enum import IntEnum, auto
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
 from pydantic import BaseModel
 
-from ToDoList import settings
 from bot.models import TgUser
 from bot.tg.clients import TgClient
 from bot.tg.dc import Message
+from bot.tg.dispatcher import Dispatcher
+from bot.tg.state_machine.db_storage import DatabaseStorage
 from bot.tg.state_machine.memory_storage import MemoryStorage
 from goals.models import Goal, GoalCategory, BoardParticipant
 
@@ -38,16 +41,33 @@ class Command(BaseCommand):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.tg_client = TgClient(settings.TG_TOKEN)
-        self.storage = MemoryStorage()
+        # Соединения к Bot API: по одному на поток обработчиков и одно для long polling
+        self.tg_client = TgClient(settings.TG_TOKEN, settings.TG_API_URL, pool_size=settings.BOT_WORKERS + 1)
+        if settings.BOT_STATE_STORAGE == 'database':
+            self.storage = DatabaseStorage(StateEnum, ttl=settings.BOT_STATE_TTL,
+                                           cache_ttl=settings.BOT_STATE_CACHE_TTL)
+        else:
+            self.storage = MemoryStorage(ttl=settings.BOT_STATE_TTL, max_entries=settings.BOT_STATE_MAX_CHATS)
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.BOT_WORKERS,
+                            help='Сколько сообщений разных чатов обрабатывать одновременно')
+        parser.add_argument('--max-pending', type=int, default=settings.BOT_MAX_PENDING,
+                            help='Сколько полученных, но еще не обработанных сообщений держать в памяти')
 
     def handle(self, *args, **options):
-        offset = 0
-        while True:
-            res = self.tg_client.get_updates(offset=offset)
-            for item in res.result:
-                offset = item.update_id + 1
-                self.handle_message(message=item.message)
+        # --workers может отличаться от BOT_WORKERS, под которое клиент создан в __init__
+        self.tg_client.set_pool_size(options['workers'] + 1)
+        dispatcher = Dispatcher(
+            get_updates=lambda offset: self.tg_client.get_updates(offset=offset).result,
+            handle=self.handle_message,
+            workers=options['workers'],
+            max_pending=options['max_pending'],
+        )
+        try:
+            asyncio.run(dispatcher.run())
+        except KeyboardInterrupt:
+            pass
 
     def _get_and_send_verification_code(self, message: Message, telegram_user: TgUser):
         # Создаем код, сохраняем его в БД, отправляем пользователю, чтобы он авторизовался
@@ -69,8 +89,7 @@ class Command(BaseCommand):
     def _get_categories_list(self, message: Message, telegram_user: TgUser):
         category_list: list[str] = [
             f'№{category.id} - {category.title}'
-            for category in GoalCategory.objects.filter(board__participants__user_id=telegram_user.user_id,
-                                                        is_deleted=False).order_by('id')
+            for category in GoalCategory.objects.filter(board__participants__user_id=telegram_user.user_id).order_by('id')
         ]
         if category_list:
             self.tg_client.send_message(chat_id=message.chat.id, text='Выберите категорию\n'+'\n'.join(category_list))
@@ -84,18 +103,21 @@ class Command(BaseCommand):
             if GoalCategory.objects.filter(
                         board__participants__user_id=telegram_user.user_id,
                         board__participants__role__in=[BoardParticipant.Roles.writer, BoardParticipant.Roles.owner],
-                        is_deleted=False,
                         id=category_id
                         ).exists():
-                self.storage.update_data(chat_id=message.chat.id, cat_id=category_id)
-                self.tg_client.send_message(chat_id=message.chat.id, text='Создайте цель цель')
-                self.storage.set_state(chat_id=message.chat.id, state=StateEnum.CHOSEN_CATEGORY)
+                # Одним переходом: сообщение этого чата могло уже обработать другой процесс бота
+                if self.storage.compare_and_set(message.chat.id, expected=StateEnum.CREATE_CATEGORY_SELECT,
+                                                state=StateEnum.CHOSEN_CATEGORY, cat_id=category_id):
+                    self.tg_client.send_message(chat_id=message.chat.id, text='Создайте цель цель')
             else:
                 self.tg_client.send_message(chat_id=message.chat.id, text='Категория не найдена')
         else:
             self.tg_client.send_message(chat_id=message.chat.id, text='Введено неверное значение')
 
     def _save_new_category(self, message: Message, telegram_user: TgUser):
+        # Забираем разговор себе, иначе два процесса бота могут создать одну цель дважды
+        if not self.storage.compare_and_set(telegram_user.chat_id, expected=StateEnum.CHOSEN_CATEGORY, state=None):
+            return
         goal = NewGoal(**self.storage.get_data(telegram_user.chat_id))
         goal.goal_title = message.text
         if goal.is_completed:
@@ -148,6 +170,8 @@ class Command(BaseCommand):
                                                             defaults={'username': message.from_.username}
                                                             )
         if user_object.user:
+            # Предыдущее сообщение чата мог обработать другой процесс бота
+            self.storage.invalidate(message.chat.id)
             self.handle_verified_user(message, telegram_user=user_object)
         # Авторизуем пользователя
         else:
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from ToDoList import settings
+from bot.tg.clients import TgClient
+
+
+class Command(BaseCommand):
+    help = 'Переводит бота на webhook (обновления приходят в bot/webhook веб-приложения) или обратно на runbot'
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', nargs='?', help='Полный адрес bot/webhook, например https://example.com/bot/webhook')
+        parser.add_argument('--max-connections', type=int, default=40,
+                            help='Сколько запросов Telegram отправляет одновременно')
+        parser.add_argument('--delete', action='store_true', help='Удалить webhook и вернуться к long polling')
+
+    def handle(self, *args, **options):
+        client = TgClient(settings.TG_TOKEN, settings.TG_API_URL)
+        if options['delete']:
+            client.delete_webhook()
+            self.stdout.write(self.style.SUCCESS('Webhook удален, запустите runbot'))
+            return
+        if not options['url']:
+            raise CommandError('Укажите адрес webhook или --delete')
+        if not settings.TG_WEBHOOK_SECRET:
+            raise CommandError('Не задан TG_WEBHOOK_SECRET')
+        client.set_webhook(options['url'], settings.TG_WEBHOOK_SECRET, options['max_connections'])
+        self.stdout.write(self.style.SUCCESS(f'Webhook установлен: {options["url"]}'))
@@ -0,0 +1,39 @@
+# Generated by Django 4.1 on 2026-10-18 19:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TgUpdate",
+            fields=[
+                (
+                    "update_id",
+                    models.BigIntegerField(
+                        primary_key=True, serialize=False, verbose_name="Update Id"
+                    ),
+                ),
+                (
+                    "received",
+                    models.DateTimeField(db_index=True, verbose_name="Получено"),
+                ),
+            ],
+            options={
+                "verbose_name": "Обновление телеграм",
+                "verbose_name_plural": "Обновления телеграм",
+            },
+        ),
+        migrations.AlterModelOptions(
+            name="tguser",
+            options={
+                "verbose_name": "Телеграм пользователь",
+                "verbose_name_plural": "Телеграм пользователи",
+            },
+        ),
+    ]
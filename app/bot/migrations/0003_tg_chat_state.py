@@ -0,0 +1,43 @@
+# Generated by Django 4.1 on 2026-10-18 19:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("bot", "0002_tg_update"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TgChatState",
+            fields=[
+                (
+                    "chat_id",
+                    models.BigIntegerField(
+                        primary_key=True, serialize=False, verbose_name="Chat Id"
+                    ),
+                ),
+                (
+                    "state",
+                    models.PositiveSmallIntegerField(
+                        null=True, verbose_name="Состояние"
+                    ),
+                ),
+                ("data", models.JSONField(default=dict, verbose_name="Данные")),
+                (
+                    "version",
+                    models.PositiveIntegerField(default=0, verbose_name="Версия"),
+                ),
+                (
+                    "expires",
+                    models.DateTimeField(db_index=True, verbose_name="Истекает"),
+                ),
+            ],
+            options={
+                "verbose_name": "Состояние чата",
+                "verbose_name_plural": "Состояния чатов",
+            },
+        ),
+    ]
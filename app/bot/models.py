@@ -1,5 +1,6 @@
 from django.core.validators import MinLengthValidator
-from django.db import models
+from django.db import models, connection
+from django.utils import timezone
 
 from core.admin import User
 
@@ -27,3 +28,58 @@ class TgUser(models.Model):
     class Meta:
         verbose_name = 'Телеграм пользователь'
         verbose_name_plural = 'Телеграм пользователи'
+
+
+class TgUpdateManager(models.Manager):
+    def claim(self, update_id: int) -> bool:
+        # Одним запросом и без гонок между воркерами: True только у того, кто вставил запись первым
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {self.model._meta.db_table} (update_id, received) VALUES (%s, now()) '
+                           f'ON CONFLICT DO NOTHING RETURNING update_id', [update_id])
+            return cursor.fetchone() is not None
+
+
+class TgUpdate(models.Model):
+    '''
+    Принятые через webhook обновления: Telegram повторяет доставку, пока не получит ответ,
+    и одно обновление может прийти в разные воркеры. Записи старше TG_WEBHOOK_RETENTION_HOURS удаляет prune_tg_updates.
+    '''
+    update_id = models.BigIntegerField(verbose_name='Update Id', primary_key=True)
+    received = models.DateTimeField(verbose_name='Получено', db_index=True)
+
+    objects = TgUpdateManager()
+
+    class Meta:
+        verbose_name = 'Обновление телеграм'
+        verbose_name_plural = 'Обновления телеграм'
+
+
+class TgChatStateManager(models.Manager):
+    def delete_expired(self, batch_size: int) -> int:
+        # Пачками, чтобы не держать долгую блокировку и не раздувать одну транзакцию
+        deleted = 0
+        while True:
+            now = timezone.now()
+            chat_ids = list(self.filter(expires__lt=now).values_list('chat_id', flat=True)[:batch_size])
+            if chat_ids:
+                deleted += self.filter(chat_id__in=chat_ids, expires__lt=now).delete()[0]
+            if len(chat_ids) < batch_size:
+                return deleted
+
+
+class TgChatState(models.Model):
+    '''
+    Состояние разговора с ботом для DatabaseStorage. version растет при каждом изменении,
+    запись меняется только при совпадении версии (см. bot/tg/state_machine/db_storage.py).
+    '''
+    chat_id = models.BigIntegerField(verbose_name='Chat Id', primary_key=True)
+    state = models.PositiveSmallIntegerField(verbose_name='Состояние', null=True)
+    data = models.JSONField(verbose_name='Данные', default=dict)
+    version = models.PositiveIntegerField(verbose_name='Версия', default=0)
+    expires = models.DateTimeField(verbose_name='Истекает', db_index=True)
+
+    objects = TgChatStateManager()
+
+    class Meta:
+        verbose_name = 'Состояние чата'
+        verbose_name_plural = 'Состояния чатов'
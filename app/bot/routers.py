@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+
+class BotStateRouter:
+    '''
+    Таблица состояний разговоров бота может жить в отдельной базе BOT_STATE_DATABASE (например, файл SQLite):
+    туда идут все запросы к TgChatState и только ее миграции.
+    '''
+
+    def _is_state(self, app_label: str, model_name: str | None) -> bool:
+        return app_label == 'bot' and model_name == 'tgchatstate'
+
+    def db_for_read(self, model, **hints):
+        if self._is_state(model._meta.app_label, model._meta.model_name):
+            return settings.BOT_STATE_DATABASE
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if settings.BOT_STATE_DATABASE == DEFAULT_DB_ALIAS:
+            return None
+        if db == settings.BOT_STATE_DATABASE:
+            return self._is_state(app_label, model_name)
+        if self._is_state(app_label, model_name):
+            return False
+        return None
@@ -0,0 +1,350 @@
+import asyncio
+import io
+import json
+from enum import IntEnum
+import threading
+from unittest import mock
+
+import requests
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from urllib3.exceptions import MaxRetryError, NewConnectionError, ProtocolError
+
+from core.models import User
+from goals.models import Board, BoardParticipant, GoalCategory, Goal
+
+from bot.management.commands.runbot import Command, StateEnum
+from bot.models import TgUpdate, TgUser, TgChatState
+from bot.tg.clients import TgClient, TG_REQUEST_DURATION
+from bot.tg.dc import Message, Chat, MessageFrom
+from bot.tg.dispatcher import Dispatcher, BackgroundDispatcher
+from bot.tg.state_machine.db_storage import DatabaseStorage
+from bot.tg.state_machine.memory_storage import MemoryStorage, collect_storage_metrics
+
+
+def connect_error() -> requests.ConnectionError:
+    # Так requests сообщает, что соединение не удалось установить
+    return requests.ConnectionError(MaxRetryError(None, '/', NewConnectionError(None, 'Connection refused')))
+
+
+def make_message(chat_id: int, message_id: int, text: str | None = None) -> Message:
+    return Message(message_id=message_id, chat=Chat(id=chat_id, username='user', type='private'),
+                   from_=MessageFrom(id=chat_id, is_bot=False, username='user', first_name=None),
+                   text=str(message_id) if text is None else text)
+
+
+def make_response(status_code: int, data: dict) -> requests.Response:
+    response = requests.Response()
+    response.status_code = status_code
+    response._content = json.dumps(data).encode()
+    return response
+
+
+class DispatcherTest(SimpleTestCase):
+
+    def _run(self, handle, messages: list[Message], workers: int = 4) -> None:
+        async def main():
+            dispatcher = Dispatcher(get_updates=lambda offset: [], handle=handle, workers=workers, max_pending=10)
+            for message in messages:
+                await dispatcher.dispatch(message)
+            await dispatcher.join()
+            dispatcher.executor.shutdown()
+
+        asyncio.run(main())
+
+    def test_slow_chat_does_not_block_others(self):
+        handled = []
+        other_chat_done = threading.Event()
+
+        def handle(message: Message):
+            # Первое сообщение чата 1 ждет, пока обработается чат 2
+            if message.chat.id == 1 and message.message_id == 1:
+                self.assertTrue(other_chat_done.wait(5))
+            handled.append((message.chat.id, message.message_id))
+            if message.chat.id == 2:
+                other_chat_done.set()
+
+        self._run(handle, [make_message(1, 1), make_message(1, 2), make_message(2, 3)])
+        self.assertEqual(handled, [(2, 3), (1, 1), (1, 2)])
+
+    def test_chat_messages_in_order(self):
+        handled = {1: [], 2: []}
+        messages = [make_message(chat_id, number) for number in range(20) for chat_id in (1, 2)]
+        self._run(lambda message: handled[message.chat.id].append(message.message_id), messages)
+        self.assertEqual(handled, {1: list(range(20)), 2: list(range(20))})
+
+    def test_error_does_not_stop_chat(self):
+        handled = []
+
+        def handle(message: Message):
+            if message.message_id == 1:
+                raise ValueError
+            handled.append(message.message_id)
+
+        with self.assertLogs('bot.tg.dispatcher', 'ERROR'):
+            self._run(handle, [make_message(1, 1), make_message(1, 2)])
+        self.assertEqual(handled, [2])
+
+
+class TgClientTest(SimpleTestCase):
+    sent = {'ok': True, 'result': {'message_id': 1, 'chat': {'id': 1, 'username': 'user', 'type': 'private'},
+                                   'from': {'id': 2, 'is_bot': True, 'username': 'bot'}, 'text': 'text'}}
+
+    def setUp(self) -> None:
+        self.client = TgClient('token', max_retries=2, backoff=0.5)
+
+    def test_retry_after_and_backoff(self):
+        responses = [
+            make_response(429, {'ok': False, 'error_code': 429, 'parameters': {'retry_after': 3}}),
+            connect_error(),
+            make_response(200, self.sent),
+        ]
+        before = TG_REQUEST_DURATION.series.get(('sendMessage', '200'), [None, 0.0, 0])[2]
+        with mock.patch.object(self.client.session, 'request', side_effect=responses) as request, \
+                mock.patch('bot.tg.clients.time.sleep') as sleep, self.assertLogs('bot.tg.clients', 'WARNING'):
+            result = self.client.send_message(chat_id=1, text='text')
+        self.assertEqual(result.result.text, 'text')
+        self.assertEqual(request.call_count, 3)
+        # retry_after из ответа Telegram, затем пауза второй попытки
+        self.assertEqual([call.args[0] for call in sleep.call_args_list], [3.0, 1.0])
+        self.assertEqual(TG_REQUEST_DURATION.series[('sendMessage', '200')][2], before + 1)
+
+    def test_dropped_connection_not_resent(self):
+        # Соединение оборвалось после отправки: сообщение могло дойти, повтор отправил бы его дважды
+        dropped = requests.ConnectionError(ProtocolError('Connection aborted.', ConnectionResetError()))
+        with mock.patch.object(self.client.session, 'request', side_effect=dropped) as request, \
+                mock.patch('bot.tg.clients.time.sleep') as sleep, self.assertRaises(requests.ConnectionError):
+            self.client.send_message(chat_id=1, text='text')
+        self.assertEqual(request.call_count, 1)
+        sleep.assert_not_called()
+
+        # getUpdates повторять безопасно
+        with mock.patch.object(self.client.session, 'request', side_effect=[dropped, make_response(200, {
+                    'ok': True, 'result': []})]) as request, \
+                mock.patch('bot.tg.clients.time.sleep'), self.assertLogs('bot.tg.clients', 'WARNING'):
+            self.client.get_updates()
+        self.assertEqual(request.call_count, 2)
+
+    def test_set_pool_size_closes_previous_adapter(self):
+        previous = self.client.session.get_adapter('https://')
+        with mock.patch.object(previous, 'close') as close:
+            self.client.set_pool_size(5)
+        close.assert_called_once()
+
+    def test_connection_error_rendered_with_status(self):
+        with mock.patch.object(self.client.session, 'request', side_effect=connect_error()), \
+                mock.patch('bot.tg.clients.time.sleep'), self.assertLogs('bot.tg.clients', 'WARNING'), \
+                self.assertRaises(requests.ConnectionError):
+            self.client.send_message(chat_id=1, text='text')
+        with mock.patch.object(self.client.session, 'request', return_value=make_response(200, self.sent)):
+            self.client.send_message(chat_id=1, text='text')
+        content = '\n'.join(TG_REQUEST_DURATION.render())
+        self.assertIn('todolist_tg_request_duration_seconds_count{method="sendMessage",status="error"}', content)
+        self.assertIn('todolist_tg_request_duration_seconds_count{method="sendMessage",status="200"}', content)
+
+    def test_runbot_pool_follows_workers(self):
+        command = Command()
+        with mock.patch('bot.management.commands.runbot.Dispatcher'), \
+                mock.patch('bot.management.commands.runbot.asyncio.run'):
+            call_command(command, workers=20)
+        self.assertEqual(command.tg_client.session.get_adapter('https://').poolmanager.connection_pool_kw['maxsize'],
+                         21)
+
+    def test_client_error_not_retried(self):
+        with mock.patch.object(self.client.session, 'request',
+                               return_value=make_response(403, {'ok': False, 'error_code': 403})) as request, \
+                mock.patch('bot.tg.clients.time.sleep') as sleep, self.assertRaises(requests.HTTPError):
+            self.client.send_message(chat_id=1, text='text')
+        self.assertEqual(request.call_count, 1)
+        sleep.assert_not_called()
+
+    def test_retries_exhausted(self):
+        with mock.patch.object(self.client.session, 'request',
+                               return_value=make_response(502, {'ok': False})) as request, \
+                mock.patch('bot.tg.clients.time.sleep'), self.assertLogs('bot.tg.clients', 'WARNING'), \
+                self.assertRaises(requests.HTTPError):
+            self.client.get_updates(offset=5)
+        self.assertEqual(request.call_count, 3)
+        self.assertEqual(request.call_args.kwargs['params'], {'offset': 5, 'timeout': 60})
+
+
+@override_settings(TG_WEBHOOK_SECRET='secret')
+class WebhookTest(APITestCase):
+    update = {'update_id': 10, 'message': {'message_id': 1, 'chat': {'id': 5, 'username': 'user', 'type': 'private'},
+                                           'from': {'id': 5, 'is_bot': False, 'username': 'user'}, 'text': '/goals'}}
+
+    def setUp(self) -> None:
+        self.url = reverse('bot-webhook')
+        self.handled = []
+        self.dispatcher = BackgroundDispatcher(self.handled.append, workers=2, max_pending=10)
+        patcher = mock.patch('bot.views.get_webhook_dispatcher', return_value=self.dispatcher)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _post(self, data: dict, secret: str = 'secret'):
+        return self.client.post(self.url, data, format='json', HTTP_X_TELEGRAM_BOT_API_SECRET_TOKEN=secret)
+
+    def test_secret_required(self):
+        self.assertEqual(self._post(self.update, secret='wrong').status_code, status.HTTP_403_FORBIDDEN)
+        with override_settings(TG_WEBHOOK_SECRET=''):
+            self.assertEqual(self._post(self.update).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertFalse(TgUpdate.objects.exists())
+
+    def test_duplicate_handled_once(self):
+        for _ in range(2):
+            self.assertEqual(self._post(self.update).status_code, status.HTTP_200_OK)
+        self.dispatcher.join(5)
+        self.assertEqual([(message.chat.id, message.text) for message in self.handled], [(5, '/goals')])
+        self.assertTrue(TgUpdate.objects.filter(update_id=10).exists())
+
+    def test_update_without_message_ignored(self):
+        response = self._post({'update_id': 11, 'edited_message': self.update['message']})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(TgUpdate.objects.exists())
+
+    def test_overloaded_worker_asks_for_retry(self):
+        with mock.patch.object(self.dispatcher, 'submit', return_value=False), \
+                self.assertLogs('bot.views', 'WARNING'):
+            response = self._post(self.update)
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        # Повтор от Telegram должен быть принят
+        self.assertFalse(TgUpdate.objects.exists())
+
+
+class State(IntEnum):
+    first = 1
+    second = 2
+
+
+class MemoryStorageTest(SimpleTestCase):
+
+    def test_read_does_not_create_record(self):
+        storage = MemoryStorage()
+        self.assertIsNone(storage.get_state(1))
+        self.assertEqual(storage.get_data(1), {})
+        storage.destroy_state(1)
+        storage.destroy_data(1)
+        self.assertEqual(storage.stats()['size'], 0)
+
+        storage.set_state(1, State.first)
+        storage.update_data(1, cat_id=5)
+        self.assertEqual((storage.get_state(1), storage.get_data(1)), (State.first, {'cat_id': 5}))
+        self.assertTrue(storage.destroy(1))
+        self.assertEqual(storage.stats()['size'], 0)
+
+    def test_ttl_eviction(self):
+        storage = MemoryStorage(ttl=10)
+        with mock.patch('bot.tg.state_machine.memory_storage.time.monotonic', return_value=100):
+            storage.set_state(1, State.first)
+            storage.set_state(2, State.first)
+        with mock.patch('bot.tg.state_machine.memory_storage.time.monotonic', return_value=105):
+            # Обращение продлевает жизнь разговора
+            storage.get_state(2)
+        with mock.patch('bot.tg.state_machine.memory_storage.time.monotonic', return_value=112):
+            self.assertIsNone(storage.get_state(1))
+            self.assertEqual(storage.get_state(2), State.first)
+            self.assertEqual(storage.stats(), {'size': 1, 'max_entries': 10000, 'ttl': 1, 'lru': 0})
+
+    def test_lru_eviction(self):
+        storage = MemoryStorage(max_entries=2)
+        storage.set_state(1, State.first)
+        storage.set_state(2, State.first)
+        storage.get_state(1)
+        storage.set_state(3, State.second)
+        self.assertEqual((storage.get_state(1), storage.get_state(2), storage.get_state(3)),
+                         (State.first, None, State.second))
+        self.assertEqual(storage.stats()['lru'], 1)
+        self.assertIn('todolist_bot_storage_evictions_total{reason="lru"}', '\n'.join(collect_storage_metrics()))
+
+
+class DatabaseStorageTest(TestCase):
+
+    def setUp(self) -> None:
+        self.storage = DatabaseStorage(State, ttl=60, cache_ttl=60)
+
+    def test_state_and_data(self):
+        self.assertIsNone(self.storage.get_state(1))
+        self.storage.destroy_state(1)
+        self.assertFalse(TgChatState.objects.exists())
+
+        self.storage.set_state(1, State.first)
+        self.storage.update_data(1, cat_id=5)
+        # Другой процесс видит то же состояние
+        other = DatabaseStorage(State)
+        self.assertEqual((other.get_state(1), other.get_data(1)), (State.first, {'cat_id': 5}))
+        self.assertEqual(TgChatState.objects.get(chat_id=1).version, 2)
+
+        self.assertTrue(self.storage.destroy(1))
+        self.assertIsNone(self.storage.get_state(1))
+
+    def test_compare_and_set(self):
+        other = DatabaseStorage(State, cache_ttl=60)
+        self.storage.set_state(1, State.first)
+        self.assertEqual(other.get_state(1), State.first)
+
+        self.assertTrue(self.storage.compare_and_set(1, expected=State.first, state=State.second, cat_id=5))
+        # Устаревший кеш other не мешает: переход проверяется по базе
+        self.assertEqual(other.get_state(1), State.first)
+        self.assertFalse(other.compare_and_set(1, expected=State.first, state=None))
+        self.assertEqual(other.get_state(1), State.second)
+        self.assertTrue(other.compare_and_set(1, expected=State.second, state=None))
+        self.assertEqual((self.storage.get_state(1), other.get_data(1)), (State.second, {'cat_id': 5}))
+
+    def test_expired_state(self):
+        self.storage.set_state(1, State.first)
+        self.storage.set_state(2, State.first)
+        TgChatState.objects.filter(chat_id=1).update(expires=timezone.now())
+        self.assertIsNone(DatabaseStorage(State).get_state(1))
+        # Просроченная запись переиспользуется, а не вставляется заново
+        self.assertTrue(self.storage.compare_and_set(1, expected=None, state=State.second))
+        self.assertEqual(DatabaseStorage(State).get_state(1), State.second)
+
+        TgChatState.objects.update(expires=timezone.now())
+        self.assertEqual(TgChatState.objects.delete_expired(batch_size=1), 2)
+
+
+@override_settings(BOT_STATE_STORAGE='database')
+class BotDialogTest(TestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        board = Board.objects.create(title='board')
+        BoardParticipant.objects.create(board=board, user=self.user, role=BoardParticipant.Roles.owner)
+        self.category = GoalCategory.objects.create(board=board, title='category', user=self.user)
+        TgUser.objects.create(chat_id=7, username='user', user=self.user)
+
+    def _command(self) -> Command:
+        command = Command()
+        command.tg_client = mock.Mock()
+        return command
+
+    def test_goal_created_once_by_several_workers(self):
+        # Сообщения одного разговора попадают в разные процессы бота
+        first, second = self._command(), self._command()
+        first.handle_message(make_message(7, 1, '/create'))
+        second.handle_message(make_message(7, 2, str(self.category.id)))
+        self.assertEqual(TgChatState.objects.get(chat_id=7).state, StateEnum.CHOSEN_CATEGORY)
+
+        # Повтор одного и того же сообщения в обоих процессах
+        first.handle_message(make_message(7, 3, 'goal'))
+        second.handle_message(make_message(7, 3, 'goal'))
+        self.assertEqual(list(Goal.objects.values_list('title', 'category_id', 'user_id')),
+                         [('goal', self.category.id, self.user.id)])
+        self.assertFalse(TgChatState.objects.exists())
+        first.tg_client.send_message.assert_called_with(7, text='Создана новая цель: goal')
+
+
+class BenchBotTest(TransactionTestCase):
+
+    def test_bench(self):
+        real_user = TgUser.objects.create(chat_id=900000, username='real_user')
+        stdout = io.StringIO()
+        call_command('bench_bot', messages=20, chats=4, workers=2, latency=0, port=8766, timeout=30, stdout=stdout)
+        report = json.loads(stdout.getvalue())
+        self.assertEqual(report['mode'], 'dispatcher')
+        self.assertGreater(report['messages_per_second'], 0)
+        self.assertListEqual(list(TgUser.objects.values_list('id', flat=True)), [real_user.id])
@@ -1,26 +1,116 @@
+import logging
+import time
+
 import marshmallow_dataclass
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from bot.tg.dc import SendMessageResponse, GetUpdatesResponse, UpdateObj
+from core.metrics import Histogram, HISTOGRAMS
+
+logger = logging.getLogger(__name__)
 
-from bot.tg.dc import SendMessageResponse, GetUpdatesResponse
+# Схемы строятся рефлексией по dataclass, это дорого – создаем один раз на модуль
+GetUpdatesSchema = marshmallow_dataclass.class_schema(GetUpdatesResponse)()
+SendMessageSchema = marshmallow_dataclass.class_schema(SendMessageResponse)()
+UpdateSchema = marshmallow_dataclass.class_schema(UpdateObj)()
+
+TG_REQUEST_DURATION = Histogram('todolist_tg_request_duration_seconds', 'Время запроса к Bot API с повторами',
+                                (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 90), ('method', 'status'))
+HISTOGRAMS.append(TG_REQUEST_DURATION)
 
 
 class TgClient:
+    '''
+    Клиент Bot API. Соединения держатся в пуле сессии (keep-alive), пул рассчитан на pool_size потоков.
+    На 429 и 5xx, а также при ошибке соединения запрос повторяется до max_retries раз: после 429 ждем
+    retry_after из ответа Telegram, в остальных случаях – экспоненциально растущую паузу.
+    Неидемпотентный sendMessage после обрыва уже установленного соединения не повторяется: запрос мог дойти,
+    и сообщение ушло бы дважды. Повторяем его, только если соединение не удалось установить.
+    '''
 
-    def __init__(self, token: str):
+    def __init__(self, token: str, base_url: str = 'https://api.telegram.org', pool_size: int = 10,
+                 max_retries: int = 3, backoff: float = 0.5, connect_timeout: float = 5, read_timeout: float = 30):
         self.token = token
+        self.base_url = base_url
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.session = requests.Session()
+        self.set_pool_size(pool_size)
+
+    def set_pool_size(self, pool_size: int) -> None:
+        # Размер пула задается при создании адаптера, поэтому адаптер заменяем целиком, а соединения старого закрываем
+        previous = {self.session.adapters[prefix] for prefix in ('http://', 'https://')}
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        for old_adapter in previous:
+            old_adapter.close()
 
     def get_url(self, method):
-        return f'https://api.telegram.org/bot{self.token}/{method}'
+        return f'{self.base_url}/bot{self.token}/{method}'
+
+    def _retry_delay(self, attempt: int, response: requests.Response | None) -> float:
+        if response is not None and response.status_code == 429:
+            try:
+                return float(response.json()['parameters']['retry_after'])
+            except (ValueError, KeyError, TypeError):
+                pass
+        return self.backoff * 2 ** attempt
+
+    @staticmethod
+    def _not_sent(exc: requests.ConnectionError) -> bool:
+        # Соединение не установилось, значит запрос до Telegram точно не дошел
+        if isinstance(exc, requests.ConnectTimeout):
+            return True
+        reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def _request(self, http_method: str, method: str, read_timeout: float, idempotent: bool = True,
+                 **kwargs) -> dict:
+        start = time.perf_counter()
+        response = None
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    response = self.session.request(http_method, self.get_url(method),
+                                                    timeout=(self.connect_timeout, read_timeout), **kwargs)
+                except requests.ConnectionError as exc:
+                    if attempt == self.max_retries or not idempotent and not self._not_sent(exc):
+                        raise
+                    response = None
+                else:
+                    if response.status_code != 429 and response.status_code < 500 or attempt == self.max_retries:
+                        break
+                delay = self._retry_delay(attempt, response)
+                logger.warning('Повтор %s через %.1f с: %s', method, delay,
+                               response.status_code if response is not None else 'нет соединения')
+                time.sleep(delay)
+            response.raise_for_status()
+            return response.json()
+        finally:
+            # Метки одной серии сортируются при выводе, поэтому код ответа – тоже строка
+            status = str(response.status_code) if response is not None else 'error'
+            TG_REQUEST_DURATION.observe((method, status), time.perf_counter() - start)
 
     def get_updates(self, offset: int=0, timeout: int=60) -> GetUpdatesResponse:
-        actual_url = self.get_url('getUpdates')
-        response = requests.get(url=actual_url, params={'offset': offset, 'timeout': timeout})
-        GetUpdatesSchema = marshmallow_dataclass.class_schema(GetUpdatesResponse)
-        return GetUpdatesSchema().load(response.json())
+        # Long polling: Telegram держит запрос до timeout секунд, ждем ответа чуть дольше
+        data = self._request('get', 'getUpdates', timeout + self.read_timeout,
+                             params={'offset': offset, 'timeout': timeout})
+        return GetUpdatesSchema.load(data)
 
     def send_message(self, chat_id: int, text: str) -> SendMessageResponse:
-        actual_url = self.get_url('sendMessage')
-        response = requests.post(url=actual_url, json={'chat_id': chat_id, 'text': text})
-        SendMessageSchema = marshmallow_dataclass.class_schema(SendMessageResponse)
-        return SendMessageSchema().load(response.json())
+        data = self._request('post', 'sendMessage', self.read_timeout, idempotent=False,
+                             json={'chat_id': chat_id, 'text': text})
+        return SendMessageSchema.load(data)
+
+    def set_webhook(self, url: str, secret_token: str, max_connections: int) -> dict:
+        return self._request('post', 'setWebhook', self.read_timeout, json={
+            'url': url, 'secret_token': secret_token, 'max_connections': max_connections,
+            'allowed_updates': ['message']})
 
+    def delete_webhook(self) -> dict:
+        return self._request('post', 'deleteWebhook', self.read_timeout)
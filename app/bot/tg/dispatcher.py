@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+from django.db import close_old_connections
+
+from bot.tg.dc import UpdateObj, Message
+
+logger = logging.getLogger(__name__)
+
+
+class Dispatcher:
+    '''
+    Обработка обновлений бота на asyncio: разные чаты обрабатываются параллельно, сообщения одного чата –
+    строго по порядку. Обработчик синхронный (ORM и запросы к Telegram), выполняется в пуле из workers потоков,
+    long polling идет в отдельном потоке и не ждет обработчиков.
+    Необработанных сообщений держим не больше max_pending, дальше опрос Telegram приостанавливается.
+    '''
+
+    def __init__(self, get_updates: Callable[[int], list[UpdateObj]], handle: Callable[[Message], None],
+                 workers: int, max_pending: int):
+        self.get_updates = get_updates
+        self.handle = handle
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bot-handler')
+        self.poller = ThreadPoolExecutor(max_workers=1, thread_name_prefix='bot-poller')
+        self.pending = asyncio.Semaphore(max_pending)
+        # Очереди чатов, у которых есть необработанные сообщения, на каждую очередь одна задача
+        self.queues: dict[int, deque[Message]] = {}
+        self.tasks: set[asyncio.Task] = set()
+
+    async def run(self, offset: int = 0) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                updates = await loop.run_in_executor(self.poller, self.get_updates, offset)
+                for update in updates:
+                    offset = update.update_id + 1
+                    await self.dispatch(update.message)
+        finally:
+            await self.join()
+            self.executor.shutdown()
+            self.poller.shutdown(wait=False)
+
+    async def dispatch(self, message: Message) -> None:
+        await self.pending.acquire()
+        queue = self.queues.get(message.chat.id)
+        if queue is not None:
+            queue.append(message)
+            return
+        self.queues[message.chat.id] = deque([message])
+        task = asyncio.create_task(self._drain(message.chat.id))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def try_dispatch(self, message: Message) -> bool:
+        # Без ожидания: если очередь полна, сообщение не принимаем
+        if self.pending.locked():
+            return False
+        await self.dispatch(message)
+        return True
+
+    async def join(self) -> None:
+        while self.tasks:
+            await asyncio.gather(*self.tasks)
+
+    async def _drain(self, chat_id: int) -> None:
+        # Между проверкой очереди и ее удалением нет await, поэтому dispatch не может положить сообщение
+        # в уже брошенную очередь
+        loop = asyncio.get_running_loop()
+        queue = self.queues[chat_id]
+        try:
+            while queue:
+                await loop.run_in_executor(self.executor, self._handle, queue.popleft())
+                self.pending.release()
+        finally:
+            del self.queues[chat_id]
+
+    def _handle(self, message: Message) -> None:
+        try:
+            self.handle(message)
+        except Exception:
+            # Ошибка в одном сообщении не должна останавливать чат и бота
+            logger.exception('Ошибка обработки сообщения %s чата %s', message.message_id, message.chat.id)
+        finally:
+            # У каждого потока свое соединение: возвращаем его в пул или закрываем по CONN_MAX_AGE
+            close_old_connections()
+
+
+class BackgroundDispatcher:
+    '''
+    Dispatcher в отдельном потоке со своим циклом событий – для обновлений, которые приходят через webhook
+    в потоки веб-сервера. submit отдает управление сразу, обработка идет в пуле потоков Dispatcher.
+    '''
+
+    def __init__(self, handle: Callable[[Message], None], workers: int, max_pending: int):
+        self.loop = asyncio.new_event_loop()
+        self.dispatcher = Dispatcher(get_updates=lambda offset: [], handle=handle, workers=workers,
+                                     max_pending=max_pending)
+        threading.Thread(target=self.loop.run_forever, name='bot-dispatcher', daemon=True).start()
+
+    def submit(self, message: Message) -> bool:
+        return asyncio.run_coroutine_threadsafe(self.dispatcher.try_dispatch(message), self.loop).result()
+
+    def join(self, timeout: float | None = None) -> None:
+        asyncio.run_coroutine_threadsafe(self.dispatcher.join(), self.loop).result(timeout)
@@ -4,6 +4,10 @@ from enum import Enum
 
 class Storage(ABC):
 
+    def invalidate(self, chat_id: int) -> None:
+        # Сбросить закешированное состояние чата, если хранилище общее для нескольких процессов
+        pass
+
     @abstractmethod
     def get_state(self, chat_id: int) -> Enum | None:
         raise NotImplementedError
@@ -34,4 +38,9 @@ class Storage(ABC):
 
     @abstractmethod
     def update_data(self, chat_id: int, **kwargs):
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    @abstractmethod
+    def compare_and_set(self, chat_id: int, expected: Enum | None, state: Enum | None, **data) -> bool:
+        # Переводит чат в state и дополняет данные, только если текущее состояние равно expected
+        raise NotImplementedError
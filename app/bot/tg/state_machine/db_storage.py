@@ -0,0 +1,128 @@
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from enum import Enum
+from typing import Callable
+
+from django.db import IntegrityError, router, transaction
+from django.utils import timezone
+
+from bot.models import TgChatState
+from bot.tg.state_machine.base import Storage
+
+# Сколько раз перечитывать запись, если ее успел изменить другой процесс
+MAX_ATTEMPTS = 5
+
+
+class DatabaseStorage(Storage):
+    '''
+    Состояние разговоров в таблице TgChatState: переживает перезапуск и общее для нескольких процессов бота.
+    Запись меняется только при совпадении версии, поэтому compare_and_set атомарен и на PostgreSQL, и на SQLite.
+    Чтения идут через небольшой кеш процесса на cache_ttl секунд, свои записи процесс кладет в кеш сразу,
+    compare_and_set всегда читает из базы. Следующее сообщение чата может прийти в другой процесс,
+    поэтому обработчик сбрасывает кеш чата (invalidate) в начале каждого сообщения.
+    Разговоры старше ttl считаются законченными и удаляются пачками не чаще раза в cleanup_interval секунд.
+    '''
+
+    def __init__(self, state_type: type[Enum], ttl: float = 3600, cache_ttl: float = 2, cache_size: int = 1000,
+                 cleanup_interval: float = 60, cleanup_batch_size: int = 1000):
+        self.state_type = state_type
+        self.ttl = ttl
+        self.cache_ttl = cache_ttl
+        self.cache_size = cache_size
+        self.cleanup_interval = cleanup_interval
+        self.cleanup_batch_size = cleanup_batch_size
+        self.cache: OrderedDict[int, tuple[float, Enum | None, dict]] = OrderedDict()
+        self.lock = threading.Lock()
+        self.cleaned = time.monotonic()
+
+    def _load(self, chat_id: int) -> tuple[Enum | None, dict, int | None]:
+        row = TgChatState.objects.filter(chat_id=chat_id).values_list('state', 'data', 'version', 'expires').first()
+        if row is None:
+            return None, {}, None
+        state, data, version, expires = row
+        if expires <= timezone.now():
+            return None, {}, version
+        return (None if state is None else self.state_type(state)), data, version
+
+    def _cache(self, chat_id: int, state: Enum | None, data: dict) -> None:
+        with self.lock:
+            self.cache[chat_id] = (time.monotonic() + self.cache_ttl, state, data)
+            self.cache.move_to_end(chat_id)
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+
+    def _read(self, chat_id: int) -> tuple[Enum | None, dict]:
+        with self.lock:
+            cached = self.cache.get(chat_id)
+        if cached is not None and cached[0] > time.monotonic():
+            return cached[1], cached[2]
+        state, data, _ = self._load(chat_id)
+        self._cache(chat_id, state, data)
+        return state, data
+
+    def _modify(self, chat_id: int, change: Callable[[Enum | None, dict], tuple[Enum | None, dict] | None]) -> bool:
+        # change получает текущие состояние и данные и возвращает новые, None – ничего не менять
+        for _ in range(MAX_ATTEMPTS):
+            state, data, version = self._load(chat_id)
+            result = change(state, dict(data))
+            if result is None:
+                self._cache(chat_id, state, data)
+                return False
+            new_state, new_data = result
+            values = {'state': None if new_state is None else new_state.value, 'data': new_data,
+                      'expires': timezone.now() + timedelta(seconds=self.ttl)}
+            if version is None:
+                try:
+                    with transaction.atomic(using=router.db_for_write(TgChatState)):
+                        TgChatState.objects.create(chat_id=chat_id, version=1, **values)
+                except IntegrityError:
+                    continue
+            elif not TgChatState.objects.filter(chat_id=chat_id, version=version).update(version=version + 1,
+                                                                                          **values):
+                continue
+            self._cache(chat_id, new_state, new_data)
+            self._cleanup()
+            return True
+        raise RuntimeError(f'Состояние чата {chat_id} меняется слишком часто, запись не удалась')
+
+    def _cleanup(self) -> None:
+        with self.lock:
+            if time.monotonic() - self.cleaned < self.cleanup_interval:
+                return
+            self.cleaned = time.monotonic()
+        TgChatState.objects.delete_expired(self.cleanup_batch_size)
+
+    def invalidate(self, chat_id: int) -> None:
+        with self.lock:
+            self.cache.pop(chat_id, None)
+
+    def get_state(self, chat_id: int) -> Enum | None:
+        return self._read(chat_id)[0]
+
+    def get_data(self, chat_id: int) -> dict:
+        return dict(self._read(chat_id)[1])
+
+    def set_state(self, chat_id: int, state: Enum) -> None:
+        self._modify(chat_id, lambda current, data: (state, data))
+
+    def set_data(self, chat_id: int, data: dict) -> None:
+        self._modify(chat_id, lambda current, _: (current, dict(data)))
+
+    def destroy_state(self, chat_id: int) -> None:
+        self._modify(chat_id, lambda current, data: (None, data) if current is not None else None)
+
+    def destroy_data(self, chat_id: int) -> None:
+        self._modify(chat_id, lambda current, data: (current, {}) if data else None)
+
+    def destroy(self, chat_id: int) -> bool:
+        deleted, _ = TgChatState.objects.filter(chat_id=chat_id).delete()
+        self.invalidate(chat_id)
+        return bool(deleted)
+
+    def update_data(self, chat_id: int, **kwargs):
+        self._modify(chat_id, lambda current, data: (current, {**data, **kwargs}))
+
+    def compare_and_set(self, chat_id: int, expected: Enum | None, state: Enum | None, **data) -> bool:
+        return self._modify(chat_id, lambda current, old: (state, {**old, **data}) if current == expected else None)
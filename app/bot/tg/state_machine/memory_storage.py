@@ -1,47 +1,138 @@
+import threading
+import time
+import weakref
+from collections import OrderedDict
 from enum import Enum
-from pydantic import BaseModel
+
 from bot.tg.state_machine.base import Storage
+from core.metrics import COLLECTORS, format_labels
+
 
+class ChatState:
+    __slots__ = ('state', 'data', 'touched')
 
-class DataStorage(BaseModel):
-    state: Enum | None = None
-    data: dict = {}
+    def __init__(self, touched: float):
+        self.state: Enum | None = None
+        self.data: dict = {}
+        self.touched = touched
 
 
 class MemoryStorage(Storage):
     '''
     Класс для хранения данных о состоянии в памяти в памяти.
-    При перезапуске приложения все данные будут затираться
+    При перезапуске приложения все данные будут затираться.
+    Запись о чате появляется только при записи состояния или данных. Разговор, который не трогали ttl секунд,
+    удаляется, при переполнении max_entries удаляется самый давний. Хранилище общее для потоков обработчиков.
     '''
 
-    def __init__(self):
-        self.data: dict[int, DataStorage] = {}
+    def __init__(self, ttl: float = 3600, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # Порядок – по последнему обращению, самые давние в начале
+        self.data: OrderedDict[int, ChatState] = OrderedDict()
+        self.lock = threading.Lock()
+        self.evicted = {'ttl': 0, 'lru': 0}
+        storages.add(self)
+
+    def _evict_expired(self, now: float) -> None:
+        border = now - self.ttl
+        while self.data:
+            chat_id, record = next(iter(self.data.items()))
+            if record.touched >= border:
+                break
+            del self.data[chat_id]
+            self.evicted['ttl'] += 1
 
-    def _resolve_data(self, chat_id: int):
-        if chat_id not in self.data:
-            self.data[chat_id] = DataStorage()
-        return self.data[chat_id]
+    def _get(self, chat_id: int) -> ChatState | None:
+        # Вызывается под блокировкой
+        now = time.monotonic()
+        self._evict_expired(now)
+        record = self.data.get(chat_id)
+        if record is not None:
+            record.touched = now
+            self.data.move_to_end(chat_id)
+        return record
+
+    def _resolve_data(self, chat_id: int) -> ChatState:
+        # Вызывается под блокировкой
+        record = self._get(chat_id)
+        if record is None:
+            record = self.data[chat_id] = ChatState(time.monotonic())
+            while len(self.data) > self.max_entries:
+                self.data.popitem(last=False)
+                self.evicted['lru'] += 1
+        return record
 
     def get_state(self, chat_id: int) -> Enum | None:
-        return self._resolve_data(chat_id).state
+        with self.lock:
+            record = self._get(chat_id)
+            return record.state if record else None
 
     def get_data(self, chat_id: int) -> dict:
-        return self._resolve_data(chat_id).data
+        with self.lock:
+            record = self._get(chat_id)
+            return record.data if record else {}
 
     def set_state(self, chat_id: int, state: Enum) -> None:
-        self._resolve_data(chat_id).state = state
+        with self.lock:
+            self._resolve_data(chat_id).state = state
 
     def set_data(self, chat_id: int, data: dict) -> None:
-        self._resolve_data(chat_id).data = data
+        with self.lock:
+            self._resolve_data(chat_id).data = data
 
     def destroy_state(self, chat_id: int) -> None:
-        self._resolve_data(chat_id).state = None
+        with self.lock:
+            if record := self._get(chat_id):
+                record.state = None
 
     def destroy_data(self, chat_id: int) -> None:
-        self._resolve_data(chat_id).data.clear()
+        with self.lock:
+            if record := self._get(chat_id):
+                record.data.clear()
 
     def destroy(self, chat_id: int) -> bool:
-        return bool(self.data.pop(chat_id, None))
+        with self.lock:
+            return bool(self.data.pop(chat_id, None))
 
     def update_data(self, chat_id: int, **kwargs):
-        self._resolve_data(chat_id).data.update(**kwargs)
+        with self.lock:
+            self._resolve_data(chat_id).data.update(**kwargs)
+
+    def compare_and_set(self, chat_id: int, expected: Enum | None, state: Enum | None, **data) -> bool:
+        with self.lock:
+            record = self._get(chat_id)
+            if (record.state if record else None) != expected:
+                return False
+            record = record or self._resolve_data(chat_id)
+            record.state = state
+            record.data.update(data)
+            return True
+
+    def stats(self) -> dict:
+        with self.lock:
+            self._evict_expired(time.monotonic())
+            return {'size': len(self.data), 'max_entries': self.max_entries, **self.evicted}
+
+
+storages: weakref.WeakSet[MemoryStorage] = weakref.WeakSet()
+
+
+def collect_storage_metrics() -> list[str]:
+    totals = {'size': 0, 'ttl': 0, 'lru': 0}
+    for storage in list(storages):
+        for name, value in storage.stats().items():
+            if name in totals:
+                totals[name] += value
+    return [
+        '# HELP todolist_bot_storage_chats Чаты с сохраненным состоянием разговора',
+        '# TYPE todolist_bot_storage_chats gauge',
+        f'todolist_bot_storage_chats {totals["size"]}',
+        '# HELP todolist_bot_storage_evictions_total Удаленные из памяти разговоры',
+        '# TYPE todolist_bot_storage_evictions_total counter',
+        *(f'todolist_bot_storage_evictions_total{{{format_labels(("reason",), (reason,))}}} {totals[reason]}'
+          for reason in ('ttl', 'lru')),
+    ]
+
+
+COLLECTORS.append(collect_storage_metrics)
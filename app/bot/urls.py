@@ -1,6 +1,7 @@
 from django.urls import path
-from bot.views import VerificationBotView
+from bot.views import VerificationBotView, webhook_view
 
 urlpatterns=[
     path('verify', VerificationBotView.as_view(), name='user verification'),
+    path('webhook', webhook_view, name='bot-webhook'),
 ]
\ No newline at end of file
@@ -1,11 +1,23 @@
-from rest_framework import generics, permissions
+import hmac
+import json
+import logging
+import threading
+
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from marshmallow import ValidationError
+from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.status import HTTP_200_OK
 
-from ToDoList import settings
-from bot.models import TgUser
+from bot.models import TgUser, TgUpdate
 from bot.serializers import VerificationBotSerializer
-from bot.tg.clients import TgClient
+from bot.tg.clients import TgClient, UpdateSchema
+from bot.tg.dispatcher import BackgroundDispatcher
+
+logger = logging.getLogger(__name__)
 
 
 class VerificationBotView(generics.UpdateAPIView):
@@ -22,9 +34,45 @@ class VerificationBotView(generics.UpdateAPIView):
         tg_user.save(update_fields=('user',))
 
         tg_data = self.get_serializer(tg_user)
-        TgClient(settings.TG_TOKEN).send_message(chat_id=tg_user.chat_id, text='Ура, верификация прошла успешно!')
+        TgClient(settings.TG_TOKEN, settings.TG_API_URL).send_message(chat_id=tg_user.chat_id, text='Ура, верификация прошла успешно!')
         return Response(tg_data.data, status=HTTP_200_OK)
 
 
+webhook_dispatcher: BackgroundDispatcher | None = None
+webhook_dispatcher_lock = threading.Lock()
+
+
+def get_webhook_dispatcher() -> BackgroundDispatcher:
+    # Создаем при первом обновлении, то есть уже в воркере после fork
+    global webhook_dispatcher
+    with webhook_dispatcher_lock:
+        if webhook_dispatcher is None:
+            from bot.management.commands.runbot import Command
+            webhook_dispatcher = BackgroundDispatcher(Command().handle_message, workers=settings.BOT_WORKERS,
+                                                      max_pending=settings.BOT_MAX_PENDING)
+        return webhook_dispatcher
+
 
+@csrf_exempt
+@require_POST
+def webhook_view(request):
+    # Без TG_WEBHOOK_SECRET webhook выключен, Telegram передает секрет в X-Telegram-Bot-Api-Secret-Token
+    if not settings.TG_WEBHOOK_SECRET:
+        raise Http404
+    if not hmac.compare_digest(request.headers.get('X-Telegram-Bot-Api-Secret-Token', ''),
+                               settings.TG_WEBHOOK_SECRET):
+        return HttpResponse(status=status.HTTP_403_FORBIDDEN)
+    try:
+        update = UpdateSchema.load(json.loads(request.body))
+    except (ValueError, ValidationError):
+        # Обновления без текстового сообщения бот не обрабатывает, повторять их Telegram незачем
+        return HttpResponse()
 
+    if not TgUpdate.objects.claim(update.update_id):
+        return HttpResponse()
+    if not get_webhook_dispatcher().submit(update.message):
+        # Воркер перегружен: снимаем отметку, Telegram повторит доставку позже, возможно в другой воркер
+        TgUpdate.objects.filter(update_id=update.update_id).delete()
+        logger.warning('Обновление %s отклонено: очередь бота заполнена', update.update_id)
+        return HttpResponse(status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return HttpResponse()
@@ -0,0 +1,42 @@
+from django.db.backends.postgresql import base, creation
+
+from core.db.pooled.pool import get_pool, close_idle_connections
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+    # DROP DATABASE и CREATE DATABASE ... TEMPLATE не выполняются, пока к базе есть соединения,
+    # а пул держит их открытыми после close()
+    def _destroy_test_db(self, test_database_name, verbosity):
+        close_idle_connections()
+        return super()._destroy_test_db(test_database_name, verbosity)
+
+    def _clone_test_db(self, suffix, verbosity, keepdb=False):
+        close_idle_connections()
+        return super()._clone_test_db(suffix, verbosity, keepdb)
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    '''
+    PostgreSQL с пулом соединений внутри процесса: ENGINE = 'core.db.pooled'.
+    close() возвращает соединение в пул, а не закрывает его, поэтому при CONN_MAX_AGE = 0 запрос
+    берет готовое соединение и отдает его по окончании. Настройки пула – ключ POOL в DATABASES (см. pool.DEFAULTS).
+    Пул общий для всех потоков процесса, поэтому подходит и для WSGI/ASGI воркеров, и для runbot.
+    '''
+    creation_class = DatabaseCreation
+
+    def get_new_connection(self, conn_params):
+        self.pool = get_pool(self.alias, conn_params, self.settings_dict.get('POOL', {}))
+        connection = self.pool.get(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        # Для нового соединения isolation_level выставил родительский метод, для взятого из пула – выставляем сами
+        self.isolation_level = self.settings_dict['OPTIONS'].get('isolation_level', connection.isolation_level)
+        return connection
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # Закрытие внутри atomic: Django еще держит ссылку на соединение до выхода из блока,
+        # отдать его другому потоку нельзя
+        if self.in_atomic_block:
+            self.pool.discard(self.connection)
+        else:
+            self.pool.put(self.connection)
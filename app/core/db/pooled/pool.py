@@ -0,0 +1,211 @@
+import os
+import threading
+import time
+from collections import deque
+
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN
+
+from core.metrics import Histogram, HISTOGRAMS, COLLECTORS, format_labels
+
+POOL_WAIT = Histogram('todolist_db_pool_wait_seconds', 'Ожидание соединения из пула',
+                      (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5), ('alias', 'pid'))
+HISTOGRAMS.append(POOL_WAIT)
+
+DEFAULTS = {
+    'MAX_SIZE': 10,
+    'TIMEOUT': 5,
+    'MAX_IDLE': 300,
+    'HEALTH_CHECK_INTERVAL': 30,
+}
+
+
+class PoolTimeout(OperationalError):
+    pass
+
+
+class ConnectionPool:
+    '''
+    Ограниченный пул соединений psycopg2 одного процесса, общий для всех потоков.
+    Берется последнее возвращенное соединение (оно "теплое"), простаивающие дольше MAX_IDLE закрываются.
+    Соединение, которое простояло дольше HEALTH_CHECK_INTERVAL, перед выдачей проверяется запросом SELECT 1.
+    Если все MAX_SIZE соединений заняты, ждем не дольше TIMEOUT секунд и отдаем ошибку соединения.
+    '''
+
+    def __init__(self, alias: str, options: dict):
+        options = {**DEFAULTS, **options}
+        self.alias = alias
+        self.max_size = options['MAX_SIZE']
+        self.timeout = options['TIMEOUT']
+        self.max_idle = options['MAX_IDLE']
+        self.health_check_interval = options['HEALTH_CHECK_INTERVAL']
+        self.pid = os.getpid()
+        self.idle = deque()
+        self.size = 0
+        self.condition = threading.Condition()
+        self.counters = dict.fromkeys(('created', 'reused', 'evicted', 'broken', 'timeout'), 0)
+
+    def get(self, connect):
+        # connect – функция подключения вызывающей обертки Django, новое соединение создается ею
+        while True:
+            connection, returned = self._checkout()
+            if connection is None:
+                return self._create(connect)
+            if self._is_healthy(connection, returned):
+                return connection
+            self._discard(connection, 'broken')
+
+    def _checkout(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self.condition:
+            while True:
+                self._evict_idle()
+                if self.idle:
+                    self.counters['reused'] += 1
+                    connection, returned = self.idle.pop()
+                    break
+                if self.size < self.max_size:
+                    # Место под новое соединение занимаем сразу, а подключаемся уже без блокировки
+                    self.size += 1
+                    connection, returned = None, None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.counters['timeout'] += 1
+                    raise PoolTimeout(f'Нет свободных соединений в пуле {self.alias} за {self.timeout} с')
+                self.condition.wait(remaining)
+        POOL_WAIT.observe((self.alias, self.pid), time.monotonic() - start)
+        return connection, returned
+
+    def _create(self, connect):
+        try:
+            connection = connect()
+        except Exception:
+            with self.condition:
+                self.size -= 1
+                self.condition.notify()
+            raise
+        with self.condition:
+            self.counters['created'] += 1
+        return connection
+
+    def _is_healthy(self, connection, returned: float) -> bool:
+        if connection.closed:
+            return False
+        if time.monotonic() - returned < self.health_check_interval:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            return True
+        except Exception:
+            return False
+
+    def put(self, connection) -> None:
+        # Незавершенную транзакцию откатываем, чтобы следующий владелец получил чистое соединение
+        status = TRANSACTION_STATUS_UNKNOWN if connection.closed else connection.get_transaction_status()
+        if status not in (TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_UNKNOWN):
+            try:
+                connection.rollback()
+                status = connection.get_transaction_status()
+            except Exception:
+                status = TRANSACTION_STATUS_UNKNOWN
+        if status != TRANSACTION_STATUS_IDLE or os.getpid() != self.pid:
+            self._discard(connection, 'broken')
+            return
+        with self.condition:
+            self.idle.append((connection, time.monotonic()))
+            self.condition.notify()
+
+    def discard(self, connection) -> None:
+        self._discard(connection, 'evicted')
+
+    def _discard(self, connection, reason: str) -> None:
+        close_quietly(connection)
+        with self.condition:
+            self.size -= 1
+            self.counters[reason] += 1
+            self.condition.notify()
+
+    def _evict_idle(self) -> None:
+        # Вызывается под блокировкой, самые старые соединения в начале очереди
+        border = time.monotonic() - self.max_idle
+        while self.idle and self.idle[0][1] < border:
+            connection, _ = self.idle.popleft()
+            close_quietly(connection)
+            self.size -= 1
+            self.counters['evicted'] += 1
+
+    def close_idle(self) -> None:
+        with self.condition:
+            while self.idle:
+                connection, _ = self.idle.popleft()
+                close_quietly(connection)
+                self.size -= 1
+                self.counters['evicted'] += 1
+
+    def stats(self) -> dict:
+        with self.condition:
+            return {'idle': len(self.idle), 'in_use': self.size - len(self.idle), 'max_size': self.max_size,
+                    **self.counters}
+
+
+def close_quietly(connection) -> None:
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+# Пулы процесса по параметрам подключения: тестовая база и основная не смешиваются
+pools: dict[tuple, ConnectionPool] = {}
+pools_lock = threading.Lock()
+
+
+def get_pool(alias: str, conn_params: dict, options: dict) -> ConnectionPool:
+    key = (alias, tuple(sorted((name, str(value)) for name, value in conn_params.items())))
+    with pools_lock:
+        pool = pools.get(key)
+        # После fork соединения родителя не трогаем: они закроются вместе с ним, у потомка свой пул
+        if pool is None or pool.pid != os.getpid():
+            pool = pools[key] = ConnectionPool(alias, options)
+        return pool
+
+
+def close_idle_connections() -> None:
+    with pools_lock:
+        current = [pool for pool in pools.values() if pool.pid == os.getpid()]
+    for pool in current:
+        pool.close_idle()
+
+
+def collect_pool_metrics() -> list[str]:
+    with pools_lock:
+        current = [pool for pool in pools.values() if pool.pid == os.getpid()]
+    lines = [
+        '# HELP todolist_db_pool_connections Соединения пула по состоянию',
+        '# TYPE todolist_db_pool_connections gauge',
+    ]
+    events = [
+        '# HELP todolist_db_pool_events_total События пула: создано, выдано повторно, закрыто, таймауты',
+        '# TYPE todolist_db_pool_events_total counter',
+    ]
+    totals = {}
+    for pool in current:
+        # Несколько пулов одного alias (например после смены базы в тестах) складываем
+        stats = pool.stats()
+        total = totals.setdefault((pool.alias, pool.pid), dict.fromkeys(stats, 0))
+        for name, value in stats.items():
+            total[name] += value
+    for (alias, pid), stats in sorted(totals.items()):
+        for state in ('idle', 'in_use', 'max_size'):
+            labels = format_labels(('alias', 'pid', 'state'), (alias, pid, state))
+            lines.append(f'todolist_db_pool_connections{{{labels}}} {stats[state]}')
+        for event in ('created', 'reused', 'evicted', 'broken', 'timeout'):
+            labels = format_labels(('alias', 'pid', 'event'), (alias, pid, event))
+            events.append(f'todolist_db_pool_events_total{{{labels}}} {stats[event]}')
+    return lines + events
+
+
+COLLECTORS.append(collect_pool_metrics)
@@ -0,0 +1,14 @@
+from django.db import models
+
+
+class LiveManager(models.Manager):
+    '''
+    Менеджер по умолчанию для моделей с мягким удалением: отдает только живые записи.
+    Условие берется из атрибута модели live_condition и должно совпадать с условием ее частичных индексов,
+    тогда запросы через менеджер попадают в них. Все записи доступны через второй менеджер модели (with_archived).
+    '''
+
+    # Условие читаем из модели, а не передаем в конструктор: Django создает менеджеры связей (board.categories)
+    # от класса менеджера по умолчанию без аргументов
+    def get_queryset(self):
+        return super().get_queryset().filter(self.model.live_condition)
@@ -0,0 +1,126 @@
+import bisect
+import threading
+import time
+from contextvars import ContextVar
+
+# Границы корзин гистограмм
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+
+
+class Histogram:
+    '''
+    Гистограмма в формате Prometheus: накопительные корзины, сумма и количество наблюдений по набору меток.
+    '''
+
+    def __init__(self, name: str, documentation: str, buckets: tuple, label_names: tuple):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = buckets
+        self.label_names = label_names
+        self.series: dict[tuple, list] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float) -> None:
+        # Корзины храним не накопительными, накопительные считаем при выводе – наблюдение меняет одну ячейку
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self.lock:
+            series = {labels: (list(counts), total, count) for labels, (counts, total, count) in self.series.items()}
+        for labels, (counts, total, count) in sorted(series.items()):
+            base = format_labels(self.label_names, labels)
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{base},le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{base}}} {total}')
+            lines.append(f'{self.name}_count{{{base}}} {count}')
+        return lines
+
+
+def escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(names: tuple, values: tuple) -> str:
+    return ','.join(f'{name}="{escape(str(value))}"' for name, value in zip(names, values))
+
+
+LABELS = ('view', 'method')
+REQUEST_DURATION = Histogram('todolist_request_duration_seconds', 'Время обработки запроса', DURATION_BUCKETS,
+                             LABELS)
+REQUEST_QUERIES = Histogram('todolist_request_db_queries', 'Количество SQL запросов на запрос', QUERY_COUNT_BUCKETS,
+                            LABELS)
+REQUEST_DB_DURATION = Histogram('todolist_request_db_duration_seconds', 'Время SQL запросов за запрос',
+                                DURATION_BUCKETS, LABELS)
+REQUEST_SERIALIZER_DURATION = Histogram('todolist_request_serializer_duration_seconds',
+                                        'Время сериализации ответа за запрос', DURATION_BUCKETS, LABELS)
+HISTOGRAMS = [REQUEST_DURATION, REQUEST_QUERIES, REQUEST_DB_DURATION, REQUEST_SERIALIZER_DURATION]
+# Функции, которые отдают готовые строки метрик (счетчики и текущие значения других модулей)
+COLLECTORS = []
+
+
+class RequestMetrics:
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializer_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    # Обертка connection.execute_wrapper: считает каждый запрос, в том числе executemany
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+    def observe(self, labels: tuple, duration: float) -> None:
+        REQUEST_DURATION.observe(labels, duration)
+        REQUEST_QUERIES.observe(labels, self.queries)
+        REQUEST_DB_DURATION.observe(labels, self.db_time)
+        REQUEST_SERIALIZER_DURATION.observe(labels, self.serializer_time)
+
+
+# Метрики текущего запроса, None – запрос не попал в выборку
+current_metrics: ContextVar[RequestMetrics | None] = ContextVar('current_metrics', default=None)
+
+
+class TimedSerializerMixin:
+    '''
+    Учитывает время to_representation в метриках запроса.
+    Вложенные сериализаторы не считаются повторно: время копится только на верхнем уровне.
+    '''
+
+    def to_representation(self, instance):
+        metrics = current_metrics.get()
+        if metrics is None or metrics.serializer_depth:
+            return super().to_representation(instance)
+        metrics.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            metrics.serializer_time += time.perf_counter() - start
+            metrics.serializer_depth -= 1
+
+
+def render_metrics() -> str:
+    lines = []
+    for histogram in HISTOGRAMS:
+        lines.extend(histogram.render())
+    for collector in COLLECTORS:
+        lines.extend(collector())
+    return '\n'.join(lines) + '\n'
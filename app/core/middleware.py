@@ -0,0 +1,98 @@
+import random
+import re
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.metrics import RequestMetrics, current_metrics
+from core.routers import replica_alias
+
+
+class MetricsMiddleware:
+    '''
+    Собирает по имени маршрута (list-goal, retrieve-update-delete-board, ...) время запроса,
+    количество и время SQL запросов и время сериализации. Измеряется доля запросов METRICS_SAMPLE_RATE,
+    остальные проходят без оберток. При METRICS_SAMPLE_RATE = 0 middleware отключается целиком.
+    Гистограммы живут в памяти процесса, каждый воркер отдает на /metrics свои.
+    '''
+
+    def __init__(self, get_response):
+        if settings.METRICS_SAMPLE_RATE <= 0:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = settings.METRICS_SAMPLE_RATE
+
+    def __call__(self, request):
+        if self.sample_rate < 1 and random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        # Запросы мимо маршрутов (404) собираем под одной меткой, чтобы не плодить серии по произвольным путям
+        match = request.resolver_match
+        view = match.url_name or match.view_name if match else 'unmatched'
+        metrics.observe((view, request.method), time.perf_counter() - start)
+        return response
+
+
+# Запросы, которые меняют данные, в том числе через CTE (WITH moved AS (DELETE ...) INSERT ...)
+WRITE_SQL = re.compile(r'\s*(INSERT|UPDATE|DELETE|WITH\b.*\b(INSERT|UPDATE|DELETE))\b', re.IGNORECASE | re.DOTALL)
+
+
+class ReplicaMiddleware:
+    '''
+    Разрешает безопасным запросам (GET, HEAD, OPTIONS) читать с реплики, см. core.routers.ReplicaRouter.
+    Реплика выбирается случайно один раз на запрос.
+    После изменяющего запроса или запроса, который что-то записал в основную базу (например, вход через
+    oauth/complete – это GET), клиент получает cookie и READ_REPLICA_STICKY_SECONDS секунд читает с основной базы,
+    чтобы не увидеть свои же изменения еще не дошедшими до реплики.
+    Без реплик (DATABASE_REPLICAS пуст) middleware отключается.
+    '''
+
+    cookie_name = 'read_primary_until'
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sticky_seconds = settings.READ_REPLICA_STICKY_SECONDS
+
+    def _is_pinned(self, request) -> bool:
+        try:
+            return float(request.COOKIES.get(self.cookie_name, 0)) > time.time()
+        except ValueError:
+            return False
+
+    def __call__(self, request):
+        safe = request.method in ('GET', 'HEAD', 'OPTIONS')
+        alias = random.choice(settings.DATABASE_REPLICAS) if safe and not self._is_pinned(request) else None
+        wrote = []
+
+        def track_writes(execute, sql, params, many, context):
+            if not wrote and WRITE_SQL.match(sql):
+                wrote.append(True)
+            return execute(sql, params, many, context)
+
+        token = replica_alias.set(alias)
+        try:
+            with connections[DEFAULT_DB_ALIAS].execute_wrapper(track_writes):
+                response = self.get_response(request)
+        finally:
+            replica_alias.reset(token)
+        # Метку ставим при любом ответе: часть изменений могла записаться и при ошибке.
+        # Изменяющие запросы метим всегда, COPY (импорт целей) идет мимо execute_wrapper
+        if (wrote or not safe) and self.sticky_seconds > 0:
+            response.set_cookie(self.cookie_name, str(int(time.time()) + self.sticky_seconds),
+                                max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
@@ -0,0 +1,37 @@
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Реплика, с которой читает текущий запрос, выбирает ReplicaMiddleware один раз на запрос,
+# чтобы все таблицы читались с одинаковым отставанием. None – читаем с основной базы,
+# в том числе вне запросов (команды, runbot)
+replica_alias: ContextVar[str | None] = ContextVar('replica_alias', default=None)
+
+
+class ReplicaRouter:
+    '''
+    Чтение безопасных запросов – с выбранной для запроса реплики, запись и все остальное – в основную базу.
+    Внутри транзакции основной базы читаем из нее же: реплика не видит незакоммиченных изменений.
+    '''
+
+    def db_for_read(self, model, **hints):
+        alias = replica_alias.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        # Явно, иначе Django пишет туда, откуда объект был прочитан
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
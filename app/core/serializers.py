@@ -5,16 +5,17 @@ from django.contrib.auth import authenticate
 from rest_framework import serializers
 from rest_framework.exceptions import AuthenticationFailed, NotAuthenticated
 
+from core.metrics import TimedSerializerMixin
 from core.models import User
 
 
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'first_name', 'last_name', 'email']
 
 
-class UserRegistrationSerializer(serializers.ModelSerializer):
+class UserRegistrationSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     password = serializers.CharField(required=True,
                                      write_only=True,
                                      style={'input_type': 'password', 'placeholder': 'Password'},
@@ -40,7 +41,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
-class UserLoginSerializer(serializers.ModelSerializer):
+class UserLoginSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     username = serializers.CharField(required=True)
     password = serializers.CharField(required=True,
                                      write_only=True,
@@ -64,13 +65,13 @@ class UserLoginSerializer(serializers.ModelSerializer):
 
 
 
-class GetAndUpdateUserSerializer(serializers.ModelSerializer):
+class GetAndUpdateUserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ["id", "username", "first_name", "last_name", "email"]
 
 
-class UpdatePasswordSerializer(serializers.ModelSerializer):
+class UpdatePasswordSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     #user = serializers.HiddenField(default=serializers.CurrentUserDefault())
     new_password = serializers.CharField(required=True,
                                          write_only=True,
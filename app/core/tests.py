@@ -1,9 +1,19 @@
+from unittest import mock
+
 from django.contrib.auth.hashers import make_password
+from django.http import HttpResponse
+from django.test import override_settings, SimpleTestCase, RequestFactory, TestCase
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
+from core.db.pooled.pool import ConnectionPool, PoolTimeout
+from core.metrics import REQUEST_QUERIES
+from core.middleware import ReplicaMiddleware
 from core.models import User
+from core.routers import ReplicaRouter
 
 
 class SignUpTest(APITestCase):
@@ -252,3 +262,174 @@ class UpdatePasswordTest(APITestCase):
         self.assertNotEqual(self.user.password, '!@#qwe123!@#')
         self.assertTrue(self.user.check_password('!@#qwe123!@#'))
 
+
+
+@override_settings(METRICS_SAMPLE_RATE=1, METRICS_TOKEN='secret')
+class MetricsTest(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.client.force_login(self.user)
+
+    def test_request_is_measured(self):
+        before = REQUEST_QUERIES.series.get(('profile', 'GET'), [None, 0.0, 0])
+        before_sum, before_count = before[1], before[2]
+        self.client.get(reverse('profile'))
+        _, queries, count = REQUEST_QUERIES.series[('profile', 'GET')]
+        self.assertEqual(count, before_count + 1)
+        # Сессия и пользователь
+        self.assertEqual(queries - before_sum, 2)
+
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        content = response.content.decode()
+        self.assertIn('# TYPE todolist_request_duration_seconds histogram', content)
+        self.assertIn(f'todolist_request_db_queries_count{{view="profile",method="GET"}} {count}', content)
+        self.assertIn('todolist_request_serializer_duration_seconds_bucket{view="profile",method="GET",le="+Inf"}',
+                      content)
+
+    def test_metrics_token_required(self):
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer wrong')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        with override_settings(METRICS_TOKEN=''):
+            response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class FakeConnection:
+    # Соединение psycopg2 без базы: пулу нужны только состояние транзакции, rollback, close и cursor
+    def __init__(self):
+        self.closed = 0
+        self.status = TRANSACTION_STATUS_IDLE
+        self.fail_check = False
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.status = TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+    def cursor(self):
+        if self.fail_check:
+            raise OperationalError('server closed the connection unexpectedly')
+        return mock.MagicMock()
+
+
+class ConnectionPoolTest(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.pool = ConnectionPool('default', {'MAX_SIZE': 2, 'TIMEOUT': 0.05, 'HEALTH_CHECK_INTERVAL': 0})
+
+    def test_connection_reused(self):
+        first = self.pool.get(FakeConnection)
+        # Незавершенная транзакция откатывается при возврате
+        first.status = TRANSACTION_STATUS_INTRANS
+        self.pool.put(first)
+        self.assertEqual(first.status, TRANSACTION_STATUS_IDLE)
+        self.assertIs(self.pool.get(FakeConnection), first)
+        self.assertEqual(self.pool.stats(), {'idle': 0, 'in_use': 1, 'max_size': 2, 'created': 1, 'reused': 1,
+                                             'evicted': 0, 'broken': 0, 'timeout': 0})
+
+    def test_pool_is_bounded(self):
+        self.pool.get(FakeConnection)
+        second = self.pool.get(FakeConnection)
+        with self.assertRaises(PoolTimeout):
+            self.pool.get(FakeConnection)
+        self.pool.discard(second)
+        self.assertIsNot(self.pool.get(FakeConnection), second)
+        self.assertEqual(self.pool.stats()['timeout'], 1)
+
+    def test_broken_connection_replaced(self):
+        connection = self.pool.get(FakeConnection)
+        self.pool.put(connection)
+        connection.fail_check = True
+        self.assertIsNot(self.pool.get(FakeConnection), connection)
+        self.assertTrue(connection.closed)
+        stats = self.pool.stats()
+        self.assertEqual((stats['in_use'], stats['created'], stats['broken']), (1, 2, 1))
+
+    def test_idle_connection_evicted(self):
+        self.pool.max_idle = 0
+        connection = self.pool.get(FakeConnection)
+        self.pool.put(connection)
+        self.assertIsNot(self.pool.get(FakeConnection), connection)
+        self.assertTrue(connection.closed)
+        self.assertEqual(self.pool.stats()['evicted'], 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], READ_REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTest(SimpleTestCase):
+
+    def setUp(self) -> None:
+        self.router = ReplicaRouter()
+        self.used = []
+
+        def view(request):
+            self.used.append((self.router.db_for_read(User), self.router.db_for_write(User)))
+            return HttpResponse()
+
+        self.middleware = ReplicaMiddleware(view)
+        self.factory = RequestFactory()
+
+    def test_safe_request_reads_replica(self):
+        response = self.middleware(self.factory.get('/'))
+        self.assertEqual(self.used, [('replica_0', 'default')])
+        self.assertNotIn(ReplicaMiddleware.cookie_name, response.cookies)
+        # Вне запроса – только основная база
+        self.assertEqual(self.router.db_for_read(User), 'default')
+
+    def test_write_sticks_to_primary(self):
+        response = self.middleware(self.factory.post('/'))
+        cookie = response.cookies[ReplicaMiddleware.cookie_name]
+        self.assertEqual(cookie['max-age'], 10)
+
+        request = self.factory.get('/')
+        request.COOKIES[ReplicaMiddleware.cookie_name] = cookie.value
+        self.middleware(request)
+        self.assertEqual(self.used, [('default', 'default'), ('default', 'default')])
+
+    @override_settings(DATABASE_REPLICAS=['replica_0', 'replica_1'])
+    def test_one_replica_per_request(self):
+        def view(request):
+            self.used.append({self.router.db_for_read(User) for _ in range(20)})
+            return HttpResponse()
+
+        middleware = ReplicaMiddleware(view)
+        for _ in range(20):
+            middleware(self.factory.get('/'))
+        self.assertTrue(all(len(aliases) == 1 for aliases in self.used))
+        self.assertEqual(set.union(*self.used), {'replica_0', 'replica_1'})
+
+    def test_expired_pin_ignored(self):
+        for value in ('1', 'garbage'):
+            request = self.factory.get('/')
+            request.COOKIES[ReplicaMiddleware.cookie_name] = value
+            self.middleware(request)
+        self.assertEqual(self.used, [('replica_0', 'default'), ('replica_0', 'default')])
+
+
+@override_settings(DATABASE_REPLICAS=['replica_0'], READ_REPLICA_STICKY_SECONDS=10)
+class ReplicaWriteTrackingTest(TestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.factory = RequestFactory()
+
+    def test_write_during_get_sticks_to_primary(self):
+        def view(request):
+            User.objects.filter(id=self.user.id).update(first_name='name')
+            return HttpResponse()
+
+        response = ReplicaMiddleware(view)(self.factory.get('/'))
+        self.assertEqual(response.cookies[ReplicaMiddleware.cookie_name]['max-age'], 10)
+
+    def test_read_only_get_not_pinned(self):
+        def view(request):
+            User.objects.using('default').filter(id=self.user.id).exists()
+            return HttpResponse()
+
+        response = ReplicaMiddleware(view)(self.factory.get('/'))
+        self.assertNotIn(ReplicaMiddleware.cookie_name, response.cookies)
@@ -1,11 +1,17 @@
+import hmac
+
+from django.conf import settings
 from django.contrib.auth import login, logout
+from django.http import HttpResponse, Http404
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import ensure_csrf_cookie
+from django.views.decorators.http import require_GET
 from drf_spectacular.utils import extend_schema_view, extend_schema
 from rest_framework import generics, status
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
+from core.metrics import render_metrics
 from core.models import User
 from core.serializers import UserRegistrationSerializer, UserLoginSerializer, GetAndUpdateUserSerializer, \
     UpdatePasswordSerializer
@@ -58,3 +64,13 @@ class UpdateUserPasswordView(generics.UpdateAPIView):
 
 
 
+
+
+@require_GET
+def metrics_view(request):
+    # Без METRICS_TOKEN эндпоинт выключен, токен передается как Authorization: Bearer <token>
+    if not settings.METRICS_TOKEN:
+        raise Http404
+    if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'):
+        return HttpResponse(status=status.HTTP_401_UNAUTHORIZED)
+    return HttpResponse(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
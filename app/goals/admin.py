@@ -2,8 +2,18 @@ from django.contrib.auth.admin import *
 from goals.models import GoalCategory, Goal, GoalComment, Board
 
 
+class WithArchivedAdmin(admin.ModelAdmin):
+    # В админке нужны и удаленные записи, менеджер по умолчанию их скрывает
+    def get_queryset(self, request):
+        queryset = self.model.with_archived.get_queryset()
+        ordering = self.get_ordering(request)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        return queryset
+
+
 @admin.register(GoalCategory)
-class GoalCategoryAdmin(admin.ModelAdmin):
+class GoalCategoryAdmin(WithArchivedAdmin):
     list_display = ('title', 'user', 'created', 'updated')
     search_fields = ('title', 'user')
     list_filter = ('is_deleted',)
@@ -11,7 +21,7 @@ class GoalCategoryAdmin(admin.ModelAdmin):
 
 
 @admin.register(Goal)
-class GoalAdmin(admin.ModelAdmin):
+class GoalAdmin(WithArchivedAdmin):
     list_display = (
                     'title', 'description', 'category', 'status', 'priority', 'due_date',
                     'user', 'created', 'updated')
@@ -27,7 +37,7 @@ class GoalCommentAdmin(admin.ModelAdmin):
     readonly_fields = ('created', 'updated')
 
 @admin.register(Board)
-class BoardAdmin(admin.ModelAdmin):
+class BoardAdmin(WithArchivedAdmin):
     readonly_fields = ('created', 'updated')
     search_fields = ('title',)
 
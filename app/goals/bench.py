@@ -0,0 +1,214 @@
+import itertools
+import math
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+from dataclasses import dataclass
+from typing import Callable
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connections, transaction
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core import urls as core_urls
+from core.metrics import RequestMetrics
+from core.models import User
+from goals import urls as goals_urls
+from goals.models import Board, BoardParticipant, GoalCategory, Goal, GoalComment, GoalArchive
+
+
+class Rollback(Exception):
+    pass
+
+
+@dataclass
+class Fixture:
+    user: User
+    password: str | None
+    board: Board
+    category: GoalCategory
+    goal: Goal
+    comment: GoalComment
+    archived_goal_id: int
+
+    @classmethod
+    def prepare(cls, user: User, password: str | None) -> 'Fixture':
+        # Объекты, на которых гоняются запросы: доска, где пользователь владелец, и его живые категория и цель.
+        # Недостающие комментарий и архивную цель создаем, они остаются в базе
+        board = Board.objects.filter(participants__user=user, participants__role=BoardParticipant.Roles.owner,
+                                     categories__user=user).order_by('id').first()
+        if board is None:
+            raise ValueError(f'У пользователя {user.username} нет доски с его категорией')
+        category = GoalCategory.objects.filter(board=board, user=user).order_by('id').first()
+        goal = Goal.objects.filter(category=category, user=user).order_by('id').first() or Goal.objects.create(
+            title='Цель для замеров', category=category, user=user, due_date=timezone.now())
+        comment = GoalComment.objects.filter(goal=goal, user=user).order_by('id').first() or \
+            GoalComment.objects.create(goal=goal, user=user, text='Комментарий для замеров')
+        archived = GoalArchive.objects.filter(board=board, user=user).order_by('id').first() or \
+            Goal.objects.create(title='Архивная цель для замеров', category=category, user=user,
+                                status=Goal.Status.archived, due_date=timezone.now())
+        return cls(user, password, board, category, goal, comment, archived.id)
+
+
+@dataclass
+class Request:
+    method: str
+    path: str
+    data: dict | None = None
+    format: str | None = None
+
+
+# Счетчик для уникальных имен создаваемых объектов, next() на itertools.count потокобезопасен
+sequence = itertools.count()
+
+
+def import_file(fixture: Fixture) -> SimpleUploadedFile:
+    due_date = timezone.now().isoformat()
+    rows = ''.join(f'Импорт {i},{fixture.category.id},1,2,{due_date}\n' for i in range(20))
+    return SimpleUploadedFile('goals.csv', f'title,category,status,priority,due_date\n{rows}'.encode('utf-8'))
+
+
+# Сценарий на каждый маршрут goals/urls.py и core/urls.py: какой запрос отправить.
+# Изменяющие запросы безопасны – каждый запрос выполняется в транзакции, которая откатывается
+SCENARIOS: dict[str, Callable[[Fixture], Request]] = {
+    'signup': lambda f: Request('post', reverse('signup'), {
+        'username': f'bench_signup_{next(sequence)}', 'password': 'Bench!2024pass',
+        'password_repeat': 'Bench!2024pass'}),
+    'login': lambda f: Request('post', reverse('login'), {'username': f.user.username, 'password': f.password}),
+    'profile': lambda f: Request('get', reverse('profile')),
+    'update-password': lambda f: Request('patch', reverse('update-password'), {
+        'old_password': f.password, 'new_password': f'{f.password}_new'}),
+
+    'create-board': lambda f: Request('post', reverse('create-board'), {'title': f'Доска {next(sequence)}'}),
+    'list-board': lambda f: Request('get', reverse('list-board')),
+    'summary-board': lambda f: Request('get', reverse('summary-board')),
+    'retrieve-update-delete-board': lambda f: Request(
+        'get', reverse('retrieve-update-delete-board', kwargs={'pk': f.board.id})),
+    'export-board': lambda f: Request('get', reverse('export-board', kwargs={'pk': f.board.id})),
+
+    'create-category': lambda f: Request('post', reverse('create-category'), {
+        'board': f.board.id, 'title': f'Категория {next(sequence)}'}),
+    'list-category': lambda f: Request('get', reverse('list-category'), {'board': f.board.id}),
+    'retrieve-update-delete-category': lambda f: Request(
+        'get', reverse('retrieve-update-delete-category', kwargs={'pk': f.category.id})),
+
+    'create-goal': lambda f: Request('post', reverse('create-goal'), {
+        'title': f'Цель {next(sequence)}', 'category': f.category.id, 'due_date': timezone.now().isoformat()}),
+    'list-goal': lambda f: Request('get', reverse('list-goal')),
+    'batch-goal': lambda f: Request('post', reverse('batch-goal'), {
+        'create': [{'title': f'Цель {next(sequence)}', 'category': f.category.id,
+                    'due_date': timezone.now().isoformat()} for _ in range(10)],
+        'patch': [{'id': f.goal.id, 'title': f'Цель {next(sequence)}'}],
+    }),
+    'import-goal': lambda f: Request('post', reverse('import-goal'), {'file': import_file(f)}, 'multipart'),
+    'list-archived-goal': lambda f: Request('get', reverse('list-archived-goal')),
+    'retrieve-archived-goal': lambda f: Request(
+        'get', reverse('retrieve-archived-goal', kwargs={'pk': f.archived_goal_id})),
+    'restore-archived-goal': lambda f: Request(
+        'post', reverse('restore-archived-goal', kwargs={'pk': f.archived_goal_id})),
+    'retrieve-update-delete-goal': lambda f: Request(
+        'get', reverse('retrieve-update-delete-goal', kwargs={'pk': f.goal.id})),
+
+    'create-comment': lambda f: Request('post', reverse('create-comment'), {
+        'goal': f.goal.id, 'text': f'Комментарий {next(sequence)}'}),
+    'list-comment': lambda f: Request('get', reverse('list-comment'), {'goal': f.goal.id}),
+    'retrieve-update-delete-comment': lambda f: Request(
+        'get', reverse('retrieve-update-delete-comment', kwargs={'pk': f.comment.id})),
+
+    'sync': lambda f: Request('get', reverse('sync')),
+}
+
+
+def route_names() -> list[str]:
+    return [pattern.name for urls in (core_urls, goals_urls) for pattern in urls.urlpatterns]
+
+
+def percentile(values: list[float], percent: float) -> float:
+    # Ближайший ранг: значение, не меньше которого percent% наблюдений
+    return values[max(math.ceil(percent / 100 * len(values)) - 1, 0)]
+
+
+class Benchmark:
+    '''
+    Нагрузочный прогон API в процессе, без HTTP сервера: запросы идут через тестовый клиент DRF
+    в concurrency потоках, у каждого потока свое соединение с базой.
+    Каждый запрос выполняется в транзакции, которая затем откатывается, поэтому данные от прогона к прогону
+    одинаковые и результаты разных коммитов на одной базе можно сравнивать.
+    '''
+
+    def __init__(self, fixture: Fixture, concurrency: int, requests: int, warmup: int):
+        self.fixture = fixture
+        self.concurrency = concurrency
+        self.requests = requests
+        self.warmup = warmup
+        self.clients = [self._login() for _ in range(concurrency)]
+
+    def _login(self) -> APIClient:
+        client = APIClient()
+        client.force_login(self.fixture.user)
+        return client
+
+    def _send(self, client: APIClient, name: str) -> tuple[float, int, int]:
+        request = SCENARIOS[name](self.fixture)
+        metrics = RequestMetrics()
+        try:
+            with transaction.atomic(), ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                start = time.perf_counter()
+                response = getattr(client, request.method)(request.path, request.data, format=request.format)
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - start
+                raise Rollback
+        except Rollback:
+            pass
+        return elapsed, metrics.queries, response.status_code
+
+    def _worker(self, client: APIClient, name: str, count: int, results: list) -> None:
+        try:
+            for _ in range(count):
+                results.append(self._send(client, name))
+        finally:
+            connections.close_all()
+
+    def run_route(self, name: str) -> dict:
+        for _ in range(self.warmup):
+            self._send(self.clients[0], name)
+
+        results = []
+        shares = [self.requests // self.concurrency + (i < self.requests % self.concurrency)
+                  for i in range(self.concurrency)]
+        threads = [threading.Thread(target=self._worker, args=(client, name, share, results))
+                   for client, share in zip(self.clients, shares) if share]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - start
+
+        latencies = sorted(elapsed * 1000 for elapsed, _, _ in results)
+        queries = [count for _, count, _ in results]
+        statuses = Counter(code for _, _, code in results)
+        return {
+            'method': SCENARIOS[name](self.fixture).method.upper(),
+            'requests': len(results),
+            'errors': sum(count for code, count in statuses.items() if code >= 400),
+            'status': {str(code): count for code, count in sorted(statuses.items())},
+            'rps': round(len(results) / wall, 1),
+            'latency_ms': {
+                'p50': round(percentile(latencies, 50), 3),
+                'p95': round(percentile(latencies, 95), 3),
+                'p99': round(percentile(latencies, 99), 3),
+                'mean': round(sum(latencies) / len(latencies), 3),
+                'max': round(latencies[-1], 3),
+            },
+            'queries': {'mean': round(sum(queries) / len(queries), 2), 'max': max(queries)},
+        }
+
+    def run(self, names: list[str]) -> dict:
+        return {name: self.run_route(name) for name in names}
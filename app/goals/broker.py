@@ -0,0 +1,141 @@
+import asyncio
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+# Сообщение, после которого клиент должен перечитать изменения через goals/sync
+RESET = {'entity': 'reset'}
+
+
+class Subscription:
+    __slots__ = ('user_id', 'board_ids', 'queue', 'loop')
+
+    def __init__(self, user_id: int, board_ids, maxsize: int):
+        self.user_id = user_id
+        self.board_ids = frozenset(board_ids)
+        self.queue = asyncio.Queue(maxsize=maxsize)
+        self.loop = asyncio.get_running_loop()
+
+    def put(self, message: dict) -> None:
+        # Вызывается только в цикле событий подписчика
+        if self.queue.full():
+            # Клиент не успевает читать: сбрасываем очередь, он догонит через синхронизацию
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = RESET
+        self.queue.put_nowait(message)
+
+
+class EventBus(ABC):
+    '''
+    Шина событий досок. publish вызывается из синхронного кода после коммита,
+    подписки живут в цикле событий ASGI воркера.
+    '''
+
+    @abstractmethod
+    def subscribe(self, user_id: int, board_ids) -> Subscription:
+        raise NotImplementedError
+
+    @abstractmethod
+    def resubscribe(self, subscription: Subscription, board_ids) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def unsubscribe(self, subscription: Subscription) -> None:
+        raise NotImplementedError
+
+    @abstractmethod
+    def publish(self, message: dict) -> None:
+        raise NotImplementedError
+
+
+class LocalBus(EventBus):
+    '''
+    Шина в памяти процесса.
+    События из других процессов (второй воркер, бот, manage.py) до нее не доходят,
+    для нескольких процессов нужна реализация EventBus поверх общего канала (например, LISTEN/NOTIFY).
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_board = defaultdict(set)
+        self._by_user = defaultdict(set)
+
+    def subscribe(self, user_id: int, board_ids) -> Subscription:
+        subscription = Subscription(user_id, board_ids, settings.GOALS_EVENTS_QUEUE_SIZE)
+        with self._lock:
+            self._by_user[user_id].add(subscription)
+            for board_id in subscription.board_ids:
+                self._by_board[board_id].add(subscription)
+        return subscription
+
+    def resubscribe(self, subscription: Subscription, board_ids) -> None:
+        with self._lock:
+            self._remove_boards(subscription)
+            subscription.board_ids = frozenset(board_ids)
+            for board_id in subscription.board_ids:
+                self._by_board[board_id].add(subscription)
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._remove_boards(subscription)
+            self._discard(self._by_user, subscription.user_id, subscription)
+
+    def publish(self, message: dict) -> None:
+        with self._lock:
+            receivers = set(self._by_board.get(message['board'], ()))
+            for user_id in message.get('users', ()):
+                receivers.update(self._by_user.get(user_id, ()))
+        for subscription in receivers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, message)
+            except RuntimeError:
+                # Цикл событий уже закрыт, подписка уйдет при отключении
+                pass
+
+    def _remove_boards(self, subscription: Subscription) -> None:
+        for board_id in subscription.board_ids:
+            self._discard(self._by_board, board_id, subscription)
+
+    @staticmethod
+    def _discard(index: dict, key: int, subscription: Subscription) -> None:
+        subscriptions = index.get(key)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del index[key]
+
+
+@lru_cache(maxsize=None)
+def get_bus() -> EventBus:
+    return import_string(settings.GOALS_EVENT_BUS)()
+
+
+def publish_changes(entity: str, pairs) -> None:
+    # pairs – пары (board_id, object_id), в шину уходит одно сообщение на доску
+    # Отправляем после коммита, чтобы клиент не пришел за изменениями раньше, чем их станет видно
+    ids = defaultdict(set)
+    for board_id, object_id in pairs:
+        ids[board_id].add(object_id)
+    messages = [{'board': board_id, 'entity': entity, 'ids': sorted(object_ids)}
+                for board_id, object_ids in ids.items()]
+
+    def send():
+        bus = get_bus()
+        for message in messages:
+            bus.publish(message)
+
+    if messages:
+        transaction.on_commit(send)
+
+
+def publish_participants(board_id: int, user_ids) -> None:
+    # Сообщение получают и сами участники, даже если они еще не подписаны на доску
+    message = {'board': board_id, 'entity': 'participant', 'ids': sorted(user_ids), 'users': sorted(user_ids)}
+    if user_ids:
+        transaction.on_commit(lambda: get_bus().publish(message))
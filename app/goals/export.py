@@ -0,0 +1,90 @@
+import csv
+import zlib
+from typing import Iterable, Iterator
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+
+from goals.models import GoalCategory, Goal, GoalComment, ArchivedGoal, ArchivedGoalComment
+
+# Поля выгрузки: имя колонки -> поле в values_list. Выгружается все: удаленные категории, архивные цели,
+# в том числе перенесенные archive_goals в холодные таблицы, и их комментарии
+ENTITIES = {
+    'categories': ((GoalCategory,), {
+        'id': 'id', 'board': 'board_id', 'title': 'title', 'user': 'user__username', 'is_deleted': 'is_deleted',
+        'created': 'created', 'updated': 'updated',
+    }),
+    'goals': ((Goal, ArchivedGoal), {
+        'id': 'id', 'board': 'board_id', 'category': 'category_id', 'title': 'title', 'description': 'description',
+        'status': 'status', 'priority': 'priority', 'due_date': 'due_date', 'user': 'user__username',
+        'created': 'created', 'updated': 'updated',
+    }),
+    'comments': ((GoalComment, ArchivedGoalComment), {
+        'id': 'id', 'board': 'board_id', 'goal': 'goal_id', 'text': 'text', 'user': 'user__username',
+        'created': 'created', 'updated': 'updated',
+    }),
+}
+FORMATS = ('ndjson', 'csv')
+CHUNK_SIZE = 2000
+# Сколько байт копить перед отдачей клиенту, чтобы не писать в сокет по одной строке
+BUFFER_SIZE = 64 * 1024
+
+
+class Echo:
+    # csv.writer пишет в объект с методом write, нам нужна сама строка
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_rows(board_id: int, entity: str) -> Iterator[tuple]:
+    # Серверный курсор: в памяти одновременно не больше CHUNK_SIZE строк, модели не создаются.
+    # _base_manager не скрывает удаленные записи, выгрузка должна быть полной. Горячая и холодная таблицы
+    # читаются одним UNION ALL, id у записи при переносе не меняется
+    models, fields = ENTITIES[entity]
+    first, *rest = [model._base_manager.filter(board_id=board_id).values_list(*fields.values()) for model in models]
+    queryset = first.union(*rest, all=True) if rest else first
+    return queryset.order_by('id').iterator(chunk_size=CHUNK_SIZE)
+
+
+def iter_ndjson(board_id: int, entities: Iterable[str]) -> Iterator[str]:
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(',', ':'))
+    for entity in entities:
+        columns = ['type', *ENTITIES[entity][1]]
+        for row in iter_rows(board_id, entity):
+            yield encoder.encode(dict(zip(columns, (entity, *row)))) + '\n'
+
+
+def iter_csv(board_id: int, entity: str) -> Iterator[str]:
+    writer = csv.writer(Echo())
+    yield writer.writerow(ENTITIES[entity][1].keys())
+    for row in iter_rows(board_id, entity):
+        yield writer.writerow(row)
+
+
+def iter_export(board_id: int, output: str, entities: list[str], compress: bool = False) -> Iterator[bytes]:
+    lines = iter_ndjson(board_id, entities) if output == 'ndjson' else iter_csv(board_id, entities[0])
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16) if compress else None
+
+    def flush(data: bytes) -> bytes:
+        return compressor.compress(data) if compressor else data
+
+    # Все сущности читаем из одного снимка, чтобы комментарии не ссылались на цели, которых нет в выгрузке.
+    # Уровень изоляции можно сменить только до первого запроса транзакции, то есть если она наша
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        if outermost:
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ')
+        buffer, size = [], 0
+        for line in lines:
+            buffer.append(line.encode('utf-8'))
+            size += len(buffer[-1])
+            if size >= BUFFER_SIZE:
+                if chunk := flush(b''.join(buffer)):
+                    yield chunk
+                buffer, size = [], 0
+        tail = flush(b''.join(buffer))
+        if compressor:
+            tail += compressor.flush()
+        if tail:
+            yield tail
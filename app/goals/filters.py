@@ -1,7 +1,11 @@
 import django_filters
 
+from django.contrib.postgres.search import SearchQuery, SearchRank
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Cast
 from django_filters import rest_framework
+from rest_framework import filters
 
 from goals.models import Goal
 
@@ -17,3 +21,25 @@ class GoalDateFilter(rest_framework.FilterSet):
         }
     filter_overrides = {models.DateTimeField:
                              {"filter_class": django_filters.IsoDateTimeFilter}}
+
+
+class GoalSearchFilter(filters.SearchFilter):
+    '''
+    Полнотекстовый поиск по целям через search_vector с GIN индексом.
+    Если сортировка не задана явно, результаты сортируются по релевантности.
+    '''
+    search_config = 'russian'
+
+    def filter_queryset(self, request, queryset, view):
+        search = request.query_params.get(self.search_param, '').strip()
+        if not search:
+            return queryset
+
+        query = SearchQuery(search, config=self.search_config, search_type='websearch')
+        # Ранг приводим к numeric, чтобы курсор пагинации сравнивал его точно, а не как float
+        queryset = queryset.filter(search_vector=query).annotate(
+            search_rank=Cast(SearchRank(F('search_vector'), query),
+                             output_field=models.DecimalField(max_digits=12, decimal_places=8)))
+        if not request.query_params.get(filters.OrderingFilter.ordering_param):
+            queryset = queryset.order_by('-search_rank')
+        return queryset
@@ -0,0 +1,165 @@
+import csv
+import io
+import json
+from collections import Counter
+from tempfile import SpooledTemporaryFile
+from typing import IO, Iterator
+
+from django.db import connection, transaction
+from rest_framework.exceptions import ValidationError
+
+from goals.membership import WRITE_ROLES
+from goals.models import GoalCategory, Goal, BoardEvent, BoardGoalStats
+from goals.serializers import BatchGoalItemSerializer
+
+FIELDS = BatchGoalItemSerializer.Meta.fields
+STAGING_TABLE = 'goals_import_staging'
+
+
+def read_ndjson(text: IO[str]) -> Iterator[dict]:
+    for line in text:
+        if line.strip():
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield row if isinstance(row, dict) else {}
+
+
+def read_rows(file: IO[bytes], name: str) -> Iterator[dict]:
+    # CSV с заголовком или NDJSON, лишние колонки (например из выгрузки export_board) игнорируются.
+    # Файл читается по ходу импорта, поэтому ошибки кодировки и формата всплывают здесь, а не при загрузке
+    text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+    try:
+        if name.endswith(('.ndjson', '.jsonl')):
+            yield from read_ndjson(text)
+        else:
+            yield from csv.DictReader(text)
+    except UnicodeDecodeError:
+        raise ValidationError({'file': ['Файл должен быть в кодировке UTF-8']})
+    except csv.Error as exc:
+        raise ValidationError({'file': [f'Неверный формат CSV: {exc}']})
+
+
+class GoalImporter:
+    '''
+    Импорт целей пачкой.
+    Строки проверяются сериализатором без запросов и копируются через COPY во временную таблицу,
+    категории и права проверяются один раз на каждую категорию, а не на каждую строку,
+    затем все строки переносятся в goals_goal одним INSERT ... SELECT.
+    '''
+
+    def __init__(self, user, roles: dict[int, int]):
+        self.user = user
+        self.roles = roles
+        self.errors = []
+
+    def run(self, rows: Iterator[dict], dry_run: bool = False) -> dict:
+        with transaction.atomic(), connection.cursor() as cursor:
+            self._create_staging(cursor)
+            with SpooledTemporaryFile(max_size=8 * 1024 * 1024, mode='w+', encoding='utf-8', newline='') as buffer:
+                staged = self._stage(rows, buffer)
+                buffer.seek(0)
+                cursor.copy_expert(f'COPY {STAGING_TABLE} (row_no, {", ".join(self._columns())}) '
+                                   f'FROM STDIN WITH (FORMAT csv)', buffer)
+
+            self._check_categories(cursor)
+            created = []
+            if not dry_run:
+                created = self._merge(cursor)
+            cursor.execute(f'DROP TABLE {STAGING_TABLE}')
+
+        self.errors.sort(key=lambda error: error['row'])
+        return {
+            'rows': staged,
+            'created': len(created),
+            'dry_run': dry_run,
+            'errors': self.errors,
+        }
+
+    @staticmethod
+    def _columns() -> list[str]:
+        return [f'{field}_id' if field == 'category' else field for field in FIELDS]
+
+    @staticmethod
+    def _create_staging(cursor) -> None:
+        cursor.execute(f'''
+            CREATE TEMP TABLE {STAGING_TABLE} (
+                row_no integer PRIMARY KEY,
+                title text NOT NULL,
+                description text,
+                category_id bigint NOT NULL,
+                status smallint NOT NULL,
+                priority smallint NOT NULL,
+                due_date timestamptz NOT NULL
+            ) ON COMMIT DROP
+        ''')
+
+    def _stage(self, rows: Iterator[dict], buffer) -> int:
+        # Один экземпляр сериализатора на весь файл, как делает ListSerializer: поля строятся один раз
+        serializer = BatchGoalItemSerializer()
+        writer = csv.writer(buffer)
+        row_no = 0
+        for row_no, raw in enumerate(rows, start=1):
+            # Пустые значения в CSV означают "по умолчанию", как отсутствующее поле в JSON
+            data = {field: raw[field] for field in FIELDS if raw.get(field) not in ('', None)}
+            try:
+                item = serializer.run_validation(data)
+            except ValidationError as exc:
+                self.errors.append({'row': row_no, 'errors': exc.detail})
+                continue
+            item.setdefault('status', Goal.Status.to_do)
+            item.setdefault('priority', Goal.Priority.medium)
+            writer.writerow([row_no, *(self._to_csv(item.get(field)) for field in FIELDS)])
+        return row_no
+
+    @staticmethod
+    def _to_csv(value):
+        return value.isoformat() if hasattr(value, 'isoformat') else value
+
+    def _check_categories(self, cursor) -> None:
+        # Категории блокируем до конца транзакции, чтобы их не удалили и не перенесли между проверкой и вставкой.
+        # FOR NO KEY UPDATE не мешает параллельно создавать в них цели
+        cursor.execute(f'SELECT DISTINCT category_id FROM {STAGING_TABLE}')
+        category_ids = [category_id for category_id, in cursor.fetchall()]
+        categories = GoalCategory.objects.select_for_update(no_key=True).order_by('id').in_bulk(category_ids)
+
+        rejected = {}
+        for category_id in category_ids:
+            category = categories.get(category_id)
+            if category is None:
+                rejected[category_id] = 'Категория не найдена'
+            elif self.roles.get(category.board_id) not in WRITE_ROLES:
+                rejected[category_id] = 'Отсутствуют требуемые права'
+            elif category.user_id != self.user.id:
+                rejected[category_id] = 'Запрещено работать не владельцам категории'
+        if not rejected:
+            return
+
+        cursor.execute(f'DELETE FROM {STAGING_TABLE} WHERE category_id = ANY(%s) RETURNING row_no, category_id',
+                       [list(rejected)])
+        self.errors.extend({'row': row_no, 'errors': {'category': [rejected[category_id]]}}
+                           for row_no, category_id in cursor.fetchall())
+
+    def _merge(self, cursor) -> list[tuple[int, int]]:
+        columns = self._columns()
+        cursor.execute(f'''
+            INSERT INTO {Goal._meta.db_table} ({", ".join(columns)}, board_id, user_id, created, updated)
+            SELECT {", ".join(f"s.{column}" for column in columns)}, c.board_id, %s, now(), now()
+            FROM {STAGING_TABLE} s JOIN {GoalCategory._meta.db_table} c ON c.id = s.category_id
+            ORDER BY s.row_no
+            RETURNING id, board_id
+        ''', [self.user.id])
+        created = cursor.fetchall()
+
+        # Вставка мимо ORM: журнал изменений и счетчики досок обновляем сами
+        BoardEvent.objects.record(BoardEvent.Entity.goal, [(board_id, goal_id) for goal_id, board_id in created])
+        cursor.execute(f'''
+            SELECT c.board_id, s.status, s.priority, count(*)
+            FROM {STAGING_TABLE} s JOIN {GoalCategory._meta.db_table} c ON c.id = s.category_id
+            WHERE s.status <> %s
+            GROUP BY c.board_id, s.status, s.priority
+        ''', [Goal.Status.archived])
+        BoardGoalStats.objects.apply(Counter({
+            (board_id, status, priority): count for board_id, status, priority, count in cursor.fetchall()}))
+        return created
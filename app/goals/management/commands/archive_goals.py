@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from goals.models import ArchivedGoal
+
+
+class Command(BaseCommand):
+    help = 'Переносит цели, архивные дольше GOALS_ARCHIVE_AFTER_DAYS дней, и их комментарии в холодные таблицы'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.GOALS_ARCHIVE_AFTER_DAYS)
+        parser.add_argument('--batch-size', type=int, default=settings.GOALS_ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        # Короткие транзакции по пачкам, чтобы не держать блокировки на всех архивных целях сразу
+        goals_total = comments_total = 0
+        while True:
+            goals, comments = ArchivedGoal.objects.archive(before, options['batch_size'])
+            goals_total += goals
+            comments_total += comments
+            if goals < options['batch_size']:
+                break
+        self.stdout.write(self.style.SUCCESS(f'Перенесено целей: {goals_total}, комментариев: {comments_total}'))
@@ -0,0 +1,79 @@
+import json
+import logging
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import User
+from goals.bench import Benchmark, Fixture, SCENARIOS, route_names
+from goals.models import Board, Goal, GoalComment
+from goals.seed import SeedOptions, busiest_user
+
+
+class Command(BaseCommand):
+    help = 'Прогоняет все маршруты goals и core в процессе и выводит p50/p95/p99 и число SQL запросов в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=100, help='Запросов на маршрут')
+        parser.add_argument('--warmup', type=int, default=3, help='Запросов на маршрут до замеров')
+        parser.add_argument('--prefix', default=SeedOptions.prefix,
+                            help='Пользователи из seed_data, берется тот, у кого больше всего досок')
+        parser.add_argument('--username', help='Конкретный пользователь вместо --prefix')
+        parser.add_argument('--password', help='Пароль пользователя для login и update-password')
+        parser.add_argument('--routes', help='Имена маршрутов через запятую, по умолчанию все')
+        parser.add_argument('--label', default='', help='Метка прогона, например хеш коммита')
+        parser.add_argument('--output', help='Файл для JSON, по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        # Новый маршрут без сценария – ошибка, а не тихий пропуск
+        routes = route_names()
+        missing = sorted(set(routes) - SCENARIOS.keys())
+        if missing:
+            raise CommandError(f'Нет сценариев для маршрутов: {", ".join(missing)}')
+        if options['routes']:
+            names = options['routes'].split(',')
+            unknown = sorted(set(names) - set(routes))
+            if unknown:
+                raise CommandError(f'Неизвестные маршруты: {", ".join(unknown)}')
+            routes = [name for name in routes if name in names]
+
+        if options['username']:
+            user = User.objects.filter(username=options['username']).first()
+        else:
+            user = busiest_user(list(User.objects.filter(username__startswith=f'{options["prefix"]}_')))
+        if user is None:
+            raise CommandError('Пользователь не найден, сначала заполните базу через seed_data')
+        try:
+            fixture = Fixture.prepare(user, options['password'])
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        # Ответы 4xx попадают в отчет, предупреждение на каждый из них в консоли не нужно
+        logging.getLogger('django.request').setLevel(logging.ERROR)
+        benchmark = Benchmark(fixture, options['concurrency'], options['requests'], options['warmup'])
+        report = {
+            'meta': {
+                'label': options['label'],
+                'concurrency': options['concurrency'],
+                'requests': options['requests'],
+                'warmup': options['warmup'],
+                'debug': settings.DEBUG,
+                'dataset': {
+                    'users': User.objects.count(),
+                    'boards': Board.objects.count(),
+                    'goals': Goal.with_archived.count(),
+                    'comments': GoalComment.objects.count(),
+                    'user_boards': user.participants.count(),
+                },
+            },
+            'routes': benchmark.run(routes),
+        }
+
+        # Ключи сортируем и время в отчет не пишем, чтобы отчеты разных коммитов сравнивались diff'ом
+        output = json.dumps(report, ensure_ascii=False, indent=2, sort_keys=True)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
@@ -0,0 +1,96 @@
+from datetime import timedelta
+
+from django.contrib.postgres.search import SearchQuery
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction, models
+from django.utils import timezone
+
+from core.models import User
+from goals.models import Board, BoardParticipant, GoalCategory, Goal, GoalComment
+from goals.seed import SeedOptions, seed, busiest_user
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Планы горячих запросов к целям до и после добавления индексов на тестовых данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--boards', type=int, default=300)
+        parser.add_argument('--goals', type=int, default=50000)
+        parser.add_argument('--comments', type=int, default=50000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--no-analyze', action='store_true', help='Только EXPLAIN, без выполнения запросов')
+
+    def handle(self, *args, **options):
+        # Все делаем в транзакции и откатываем ее, в базе ничего не остается
+        try:
+            with transaction.atomic():
+                user = busiest_user(seed(SeedOptions(
+                    users=options['users'], boards=options['boards'], goals=options['goals'],
+                    comments=options['comments'], seed=options['seed'], prefix='explain_user')))
+                with connection.cursor() as cursor:
+                    # Проверяем отложенные внешние ключи сразу, иначе ALTER TABLE ниже не выполнится
+                    cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+                    for model in (Board, BoardParticipant, GoalCategory, Goal, GoalComment):
+                        cursor.execute(f'ANALYZE {model._meta.db_table}')
+
+                queries = self._get_queries(user)
+                analyze = not options['no_analyze']
+
+                sid = transaction.savepoint()
+                self._drop_index_pack()
+                before = {name: queryset.explain(analyze=analyze) for name, queryset in queries.items()}
+                transaction.savepoint_rollback(sid)
+                after = {name: queryset.explain(analyze=analyze) for name, queryset in queries.items()}
+
+                for name in queries:
+                    self.stdout.write(self.style.MIGRATE_HEADING(f'=== {name}'))
+                    self.stdout.write(self.style.WARNING('--- до'))
+                    self.stdout.write(before[name])
+                    self.stdout.write(self.style.SUCCESS('--- после'))
+                    self.stdout.write(after[name])
+                raise Rollback
+        except Rollback:
+            pass
+
+    @staticmethod
+    def _get_queries(user: User) -> dict:
+        board = Board.objects.filter(participants__user=user).first()
+        goal = Goal.objects.filter(board=board).first()
+        now = timezone.now()
+        user_boards = BoardParticipant.objects.filter(user_id=user.id).values('board_id')
+        goals = Goal.objects.filter(board_id__in=user_boards)
+        return {
+            'Список досок': Board.objects.filter(participants__user_id=user.id)
+                                         .order_by('title', 'id')[:21],
+            'Роль участника': BoardParticipant.objects.filter(user_id=user.id, board_id=board.id).values('role'),
+            'Список категорий': GoalCategory.objects.filter(board_id__in=user_boards)
+                                                   .order_by('title', 'id')[:21],
+            'Список целей': goals.order_by('title', 'id')[:21],
+            'Цели по сроку и статусу': goals.filter(due_date__gte=now, due_date__lte=now + timedelta(days=7),
+                                                    status__in=[Goal.Status.to_do, Goal.Status.in_progress])
+                                            .order_by('due_date', 'id')[:21],
+            'Поиск целей': goals.filter(search_vector=SearchQuery('цель 123', config='russian',
+                                                                   search_type='websearch'))[:21],
+            'Цели по приоритету': goals.filter(priority=Goal.Priority.critical).order_by('-priority', '-id')[:21],
+            'Цели пользователя в боте': Goal.objects.filter(user_id=user.id).order_by('id'),
+            'Комментарии цели': GoalComment.objects.filter(goal_id=goal.id).order_by('-created', '-id')[:21],
+            'Лента комментариев': GoalComment.objects.filter(board_id__in=user_boards)
+                                                     .order_by('-created', '-id')[:21],
+        }
+
+    @staticmethod
+    def _drop_index_pack():
+        # Возвращаем схему к состоянию до добавления индексов
+        with connection.schema_editor() as schema_editor:
+            for model in (Board, GoalCategory, Goal, GoalComment):
+                for index in model._meta.indexes:
+                    schema_editor.remove_index(model, index)
+            for constraint in BoardParticipant._meta.constraints:
+                schema_editor.remove_constraint(BoardParticipant, constraint)
+            schema_editor.add_constraint(BoardParticipant, models.UniqueConstraint(
+                fields=['user', 'board'], name='goals_part_user_board_before'))
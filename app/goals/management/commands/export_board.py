@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from goals.export import iter_export, ENTITIES, FORMATS
+from goals.models import Board
+
+
+class Command(BaseCommand):
+    help = 'Потоковая выгрузка категорий, целей и комментариев доски в NDJSON или CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument('board_id', type=int)
+        parser.add_argument('--output', choices=FORMATS, default='ndjson')
+        parser.add_argument('--entity', choices=list(ENTITIES), help='Только одна сущность, для CSV обязательно')
+        parser.add_argument('--gzip', action='store_true')
+        parser.add_argument('--file', help='Куда писать, по умолчанию stdout')
+
+    def handle(self, *args, **options):
+        if not Board.objects.filter(id=options['board_id']).exists():
+            raise CommandError(f'Доска {options["board_id"]} не найдена')
+        if options['output'] == 'csv' and options['entity'] is None:
+            raise CommandError('Для CSV нужно выбрать одну сущность: --entity')
+
+        entities = [options['entity']] if options['entity'] else list(ENTITIES)
+        chunks = iter_export(options['board_id'], options['output'], entities, options['gzip'])
+        if options['file']:
+            with open(options['file'], 'wb') as file:
+                file.writelines(chunks)
+        else:
+            sys.stdout.buffer.writelines(chunks)
+            sys.stdout.buffer.flush()
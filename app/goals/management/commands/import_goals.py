@@ -0,0 +1,26 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import User
+from goals.importer import GoalImporter, read_rows
+from goals.membership import load_board_roles
+
+
+class Command(BaseCommand):
+    help = 'Импорт целей из CSV или NDJSON от имени пользователя, отчет об ошибках выводится в JSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('file')
+        parser.add_argument('--user', required=True, help='Имя пользователя, от которого создаются цели')
+        parser.add_argument('--dry-run', action='store_true', help='Только проверить файл, ничего не сохранять')
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['user']).first()
+        if user is None:
+            raise CommandError(f'Пользователь {options["user"]} не найден')
+
+        with open(options['file'], 'rb') as file:
+            report = GoalImporter(user, load_board_roles(user.id)).run(read_rows(file, options['file']),
+                                                                        dry_run=options['dry_run'])
+        self.stdout.write(json.dumps(report, ensure_ascii=False, indent=2))
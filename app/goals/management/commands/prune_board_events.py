@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from goals.models import BoardEvent
+
+
+class Command(BaseCommand):
+    help = 'Удаляет из журнала изменений досок записи старше SYNC_EVENTS_RETENTION_DAYS дней'
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=settings.SYNC_EVENTS_RETENTION_DAYS)
+        deleted, _ = BoardEvent.objects.filter(created__lt=cutoff).delete()
+        self.stdout.write(self.style.SUCCESS(f'Удалено событий: {deleted}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from goals.models import BoardGoalStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику целей по доскам (BoardGoalStats) по таблице целей'
+
+    def handle(self, *args, **options):
+        BoardGoalStats.objects.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Строк статистики: {BoardGoalStats.objects.count()}'))
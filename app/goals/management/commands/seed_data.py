@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from goals.seed import SeedOptions, seed, busiest_user
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу синтетическими пользователями, досками, категориями, целями и комментариями'
+
+    def add_arguments(self, parser):
+        defaults = SeedOptions()
+        parser.add_argument('--users', type=int, default=defaults.users)
+        parser.add_argument('--boards', type=int, default=defaults.boards)
+        parser.add_argument('--categories-per-board', type=int, default=defaults.categories_per_board)
+        parser.add_argument('--goals', type=int, default=defaults.goals)
+        parser.add_argument('--comments', type=int, default=defaults.comments)
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--prefix', default=defaults.prefix, help='Начало имени пользователей')
+        parser.add_argument('--password', help='Общий пароль пользователей, без него войти по паролю нельзя')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = seed(SeedOptions(
+                users=options['users'], boards=options['boards'],
+                categories_per_board=options['categories_per_board'], goals=options['goals'],
+                comments=options['comments'], seed=options['seed'], prefix=options['prefix'],
+                password=options['password']))
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(users)}, больше всего досок у {busiest_user(users).username}'))
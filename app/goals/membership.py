@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from goals.models import BoardParticipant
+
+READ_ROLES = frozenset(BoardParticipant.Roles.values)
+WRITE_ROLES = frozenset((BoardParticipant.Roles.owner, BoardParticipant.Roles.writer))
+OWNER_ROLES = frozenset((BoardParticipant.Roles.owner,))
+
+CACHE_KEY = 'goals:board-roles:{user_id}'
+
+
+# Комментарий для себя
+# Карта {board_id: role} пользователя загружается одним запросом и хранится на объекте запроса,
+# поэтому права, get_queryset и сериализаторы не ходят в BoardParticipant каждый сам по себе.
+# Если BOARD_ROLES_CACHE_TIMEOUT > 0, карта живет еще и в кеше между запросами,
+# а записи в BoardParticipant сбрасывают ее (см. goals/signals.py).
+# Кеш должен быть общим для всех процессов, иначе сброс дойдет только до одного из них.
+def load_board_roles(user_id: int) -> dict[int, int]:
+    timeout = settings.BOARD_ROLES_CACHE_TIMEOUT
+    key = CACHE_KEY.format(user_id=user_id)
+    if timeout:
+        roles = cache.get(key)
+        if roles is not None:
+            return roles
+
+    queryset = BoardParticipant.objects.filter(user_id=user_id)
+    if timeout:
+        # Карту из общего кеша увидят и следующие запросы, поэтому читаем ее с основной базы: отстающая реплика
+        # вернула бы права, которые только что сбросил invalidate_board_roles
+        queryset = queryset.using(DEFAULT_DB_ALIAS)
+    roles = dict(queryset.values_list('board_id', 'role'))
+    if timeout:
+        cache.set(key, roles, timeout)
+    return roles
+
+
+def get_board_roles(request) -> dict[int, int]:
+    # DRF Request оборачивает HttpRequest, храним карту на исходном объекте, чтобы она была общей для всех
+    http_request = getattr(request, '_request', request)
+    roles = getattr(http_request, '_board_roles', None)
+    if roles is None:
+        roles = http_request._board_roles = load_board_roles(request.user.id)
+    return roles
+
+
+def has_board_role(request, board_id: int, roles: frozenset = READ_ROLES) -> bool:
+    return get_board_roles(request).get(board_id) in roles
+
+
+def invalidate_board_roles(*user_ids: int) -> None:
+    if not settings.BOARD_ROLES_CACHE_TIMEOUT or not user_ids:
+        return
+    keys = [CACHE_KEY.format(user_id=user_id) for user_id in set(user_ids)]
+    # Сбрасываем после коммита, иначе параллельный запрос успеет положить в кеш старые данные
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,87 @@
+# Generated by Django 4.1 on 2026-10-18 17:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goals", "0009_alter_goalcategory_board"),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name="boardparticipant",
+            unique_together=set(),
+        ),
+        migrations.AddIndex(
+            model_name="board",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["title", "id"],
+                name="goals_board_live_title_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="goal",
+            index=models.Index(
+                condition=models.Q(("status", 4), _negated=True),
+                fields=["category", "title"],
+                name="goals_goal_live_cat_title_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="goal",
+            index=models.Index(
+                condition=models.Q(("status", 4), _negated=True),
+                fields=["category", "due_date"],
+                name="goals_goal_live_cat_due_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="goal",
+            index=models.Index(
+                condition=models.Q(("status", 4), _negated=True),
+                fields=["category", "priority"],
+                name="goals_goal_live_cat_prio_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="goal",
+            index=models.Index(
+                condition=models.Q(("status", 4), _negated=True),
+                fields=["category", "status"],
+                name="goals_goal_live_cat_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="goalcategory",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["board", "title"],
+                name="goals_cat_live_board_title_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="goalcategory",
+            index=models.Index(
+                condition=models.Q(("is_deleted", False)),
+                fields=["board", "created"],
+                name="goals_cat_live_board_crt_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="goalcomment",
+            index=models.Index(
+                fields=["goal", "-created"], name="goals_comment_goal_created_idx"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="boardparticipant",
+            constraint=models.UniqueConstraint(
+                fields=("user", "board"),
+                include=("role",),
+                name="goals_part_user_board_uniq",
+            ),
+        ),
+    ]
@@ -0,0 +1,136 @@
+# Generated by Django 4.1 on 2026-10-18 17:51
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+import django.db.models.deletion
+
+
+def fill_board(apps, schema_editor):
+    # Заполняем доску одним UPDATE на таблицу, без загрузки объектов в память
+    GoalCategory = apps.get_model("goals", "GoalCategory")
+    Goal = apps.get_model("goals", "Goal")
+    GoalComment = apps.get_model("goals", "GoalComment")
+
+    Goal.objects.update(
+        board_id=Subquery(
+            GoalCategory.objects.filter(id=OuterRef("category_id")).values("board_id")[
+                :1
+            ]
+        )
+    )
+    GoalComment.objects.update(
+        board_id=Subquery(
+            Goal.objects.filter(id=OuterRef("goal_id")).values("board_id")[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goals", "0010_index_pack"),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="goal",
+            name="goals_goal_live_cat_title_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="goal",
+            name="goals_goal_live_cat_due_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="goal",
+            name="goals_goal_live_cat_prio_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="goal",
+            name="goals_goal_live_cat_status_idx",
+        ),
+        migrations.AddField(
+            model_name="goal",
+            name="board",
+            field=models.ForeignKey(
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="goals",
+                to="goals.board",
+                verbose_name="Доска",
+            ),
+        ),
+        migrations.AddField(
+            model_name="goalcomment",
+            name="board",
+            field=models.ForeignKey(
+                editable=False,
+                null=True,
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="comments",
+                to="goals.board",
+                verbose_name="Доска",
+            ),
+        ),
+        migrations.RunPython(fill_board, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="goal",
+            name="board",
+            field=models.ForeignKey(
+                editable=False,
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="goals",
+                to="goals.board",
+                verbose_name="Доска",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="goalcomment",
+            name="board",
+            field=models.ForeignKey(
+                editable=False,
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="comments",
+                to="goals.board",
+                verbose_name="Доска",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="goal",
+            index=models.Index(
+                condition=models.Q(("status", 4), _negated=True),
+                fields=["board", "title"],
+                name="goals_goal_live_board_ttl_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="goal",
+            index=models.Index(
+                condition=models.Q(("status", 4), _negated=True),
+                fields=["board", "due_date"],
+                name="goals_goal_live_board_due_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="goal",
+            index=models.Index(
+                condition=models.Q(("status", 4), _negated=True),
+                fields=["board", "priority"],
+                name="goals_goal_live_board_prio_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="goal",
+            index=models.Index(
+                condition=models.Q(("status", 4), _negated=True),
+                fields=["board", "status"],
+                name="goals_goal_live_board_st_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="goalcomment",
+            index=models.Index(
+                fields=["board", "-created"], name="goals_comment_board_crt_idx"
+            ),
+        ),
+    ]
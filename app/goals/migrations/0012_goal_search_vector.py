@@ -0,0 +1,57 @@
+# Generated by Django 4.1 on 2026-10-18 17:57
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+# Вектор поддерживает триггер, а не save(), чтобы bulk_create/bulk_update и импорт тоже его обновляли.
+# Конфигурация russian соответствует LANGUAGE_CODE = "ru-ru"
+CREATE_TRIGGER = """
+CREATE FUNCTION goals_goal_search_vector_update() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('russian', coalesce(NEW.title, '')), 'A') ||
+        setweight(to_tsvector('russian', coalesce(NEW.description, '')), 'B');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER goals_goal_search_vector_trigger
+    BEFORE INSERT OR UPDATE OF title, description ON goals_goal
+    FOR EACH ROW EXECUTE FUNCTION goals_goal_search_vector_update();
+
+UPDATE goals_goal SET search_vector =
+    setweight(to_tsvector('russian', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('russian', coalesce(description, '')), 'B');
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER goals_goal_search_vector_trigger ON goals_goal;
+DROP FUNCTION goals_goal_search_vector_update();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goals", "0011_goal_board"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="goal",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+        migrations.AddIndex(
+            model_name="goal",
+            index=django.contrib.postgres.indexes.GinIndex(
+                condition=models.Q(("status", 4), _negated=True),
+                fields=["search_vector"],
+                name="goals_goal_live_search_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 4.1 on 2026-10-18 18:08
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Номер транзакции проставляет триггер, чтобы его получали и вставки через bulk_create и INSERT ... SELECT
+CREATE_TRIGGER = """
+CREATE FUNCTION goals_boardevent_set_txid() RETURNS trigger AS $$
+BEGIN
+    NEW.txid := pg_current_xact_id()::text::bigint;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER goals_boardevent_txid_trigger
+    BEFORE INSERT ON goals_boardevent
+    FOR EACH ROW EXECUTE FUNCTION goals_boardevent_set_txid();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER goals_boardevent_txid_trigger ON goals_boardevent;
+DROP FUNCTION goals_boardevent_set_txid();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goals", "0012_goal_search_vector"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BoardEvent",
+            fields=[
+                ("id", models.BigAutoField(primary_key=True, serialize=False)),
+                (
+                    "entity",
+                    models.PositiveSmallIntegerField(
+                        choices=[(1, "Категория"), (2, "Цель"), (3, "Комментарий")],
+                        verbose_name="Тип объекта",
+                    ),
+                ),
+                ("object_id", models.IntegerField(verbose_name="Id объекта")),
+                (
+                    "txid",
+                    models.BigIntegerField(
+                        editable=False, null=True, verbose_name="Транзакция"
+                    ),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="Дата создания"
+                    ),
+                ),
+                (
+                    "board",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="events",
+                        to="goals.board",
+                        verbose_name="Доска",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Событие доски",
+                "verbose_name_plural": "События досок",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="boardevent",
+            index=models.Index(
+                fields=["board", "txid", "id"], name="goals_event_board_txid_idx"
+            ),
+        ),
+        migrations.RunSQL(CREATE_TRIGGER, DROP_TRIGGER),
+    ]
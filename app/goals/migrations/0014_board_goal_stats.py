@@ -0,0 +1,82 @@
+# Generated by Django 4.1 on 2026-10-18 18:14
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Заполняем счетчики по уже существующим целям, архивные (status = 4) не учитываются
+FILL_STATS = """
+INSERT INTO goals_boardgoalstats (board_id, status, priority, count)
+SELECT board_id, status, priority, count(*) FROM goals_goal
+WHERE status <> 4
+GROUP BY board_id, status, priority
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goals", "0013_board_event"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BoardGoalStats",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "status",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (1, "К выполнению"),
+                            (2, "В процессе"),
+                            (3, "Выполнено"),
+                            (4, "Архив"),
+                        ],
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "priority",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (1, "Низкий"),
+                            (2, "Средний"),
+                            (3, "Высокий"),
+                            (4, "Критический"),
+                        ],
+                        verbose_name="Приоритет",
+                    ),
+                ),
+                ("count", models.IntegerField(default=0, verbose_name="Количество")),
+                (
+                    "board",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="goal_stats",
+                        to="goals.board",
+                        verbose_name="Доска",
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "Статистика доски",
+                "verbose_name_plural": "Статистика досок",
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="boardgoalstats",
+            constraint=models.UniqueConstraint(
+                fields=("board", "status", "priority"),
+                name="goals_stats_board_key_uniq",
+            ),
+        ),
+        migrations.RunSQL(FILL_STATS, migrations.RunSQL.noop),
+    ]
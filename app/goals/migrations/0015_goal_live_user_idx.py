@@ -0,0 +1,21 @@
+# Generated by Django 4.1 on 2026-10-18 18:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goals", "0014_board_goal_stats"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="goal",
+            index=models.Index(
+                condition=models.Q(("status", 4), _negated=True),
+                fields=["user", "id"],
+                name="goals_goal_live_user_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,219 @@
+# Generated by Django 4.1 on 2026-10-18 18:31
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+# Архивные цели из горячей и холодной таблиц, модель GoalArchive
+CREATE_VIEW = """
+CREATE VIEW goals_goal_archive AS
+SELECT id, created, updated, user_id, title, description, category_id, board_id, status, priority, due_date,
+       NULL::timestamp with time zone AS archived
+FROM goals_goal WHERE status = 4
+UNION ALL
+SELECT id, created, updated, user_id, title, description, category_id, board_id, status, priority, due_date, archived
+FROM goals_archivedgoal
+"""
+
+DROP_VIEW = "DROP VIEW goals_goal_archive"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ("goals", "0015_goal_live_user_idx"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GoalArchive",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("created", models.DateTimeField(verbose_name="Дата создания")),
+                (
+                    "updated",
+                    models.DateTimeField(verbose_name="Дата последнего обновления"),
+                ),
+                ("title", models.CharField(max_length=255, verbose_name="Название")),
+                ("description", models.TextField(null=True, verbose_name="Описание")),
+                (
+                    "status",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (1, "К выполнению"),
+                            (2, "В процессе"),
+                            (3, "Выполнено"),
+                            (4, "Архив"),
+                        ],
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "priority",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (1, "Низкий"),
+                            (2, "Средний"),
+                            (3, "Высокий"),
+                            (4, "Критический"),
+                        ],
+                        verbose_name="Приоритет",
+                    ),
+                ),
+                ("due_date", models.DateTimeField(verbose_name="Дата дедлайна")),
+                (
+                    "archived",
+                    models.DateTimeField(
+                        null=True, verbose_name="Дата переноса в архив"
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "goals_goal_archive",
+                "managed": False,
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedGoal",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("created", models.DateTimeField(verbose_name="Дата создания")),
+                (
+                    "updated",
+                    models.DateTimeField(verbose_name="Дата последнего обновления"),
+                ),
+                ("title", models.CharField(max_length=255, verbose_name="Название")),
+                (
+                    "description",
+                    models.TextField(
+                        blank=True, max_length=2000, null=True, verbose_name="Описание"
+                    ),
+                ),
+                (
+                    "status",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (1, "К выполнению"),
+                            (2, "В процессе"),
+                            (3, "Выполнено"),
+                            (4, "Архив"),
+                        ],
+                        verbose_name="Статус",
+                    ),
+                ),
+                (
+                    "priority",
+                    models.PositiveSmallIntegerField(
+                        choices=[
+                            (1, "Низкий"),
+                            (2, "Средний"),
+                            (3, "Высокий"),
+                            (4, "Критический"),
+                        ],
+                        verbose_name="Приоритет",
+                    ),
+                ),
+                ("due_date", models.DateTimeField(verbose_name="Дата дедлайна")),
+                (
+                    "archived",
+                    models.DateTimeField(verbose_name="Дата переноса в архив"),
+                ),
+            ],
+            options={
+                "verbose_name": "Цель в архиве",
+                "verbose_name_plural": "Цели в архиве",
+            },
+        ),
+        migrations.CreateModel(
+            name="ArchivedGoalComment",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("created", models.DateTimeField(verbose_name="Дата создания")),
+                (
+                    "updated",
+                    models.DateTimeField(verbose_name="Дата последнего обновления"),
+                ),
+                ("text", models.TextField(max_length=255, verbose_name="Текст")),
+            ],
+            options={
+                "verbose_name": "Комментарий в архиве",
+                "verbose_name_plural": "Комментарии в архиве",
+            },
+        ),
+        migrations.AddIndex(
+            model_name="goal",
+            index=models.Index(
+                condition=models.Q(("status", 4)),
+                fields=["updated"],
+                name="goals_goal_archived_upd_idx",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedgoalcomment",
+            name="board",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="+",
+                to="goals.board",
+                verbose_name="Доска",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedgoalcomment",
+            name="goal",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="comments",
+                to="goals.archivedgoal",
+                verbose_name="цель",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedgoalcomment",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Автор",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedgoal",
+            name="board",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="archived_goals",
+                to="goals.board",
+                verbose_name="Доска",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedgoal",
+            name="category",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="archived_goals",
+                to="goals.goalcategory",
+                verbose_name="Категория",
+            ),
+        ),
+        migrations.AddField(
+            model_name="archivedgoal",
+            name="user",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.RESTRICT,
+                related_name="+",
+                to=settings.AUTH_USER_MODEL,
+                verbose_name="Автор",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="archivedgoal",
+            index=models.Index(
+                fields=["board", "-updated"], name="goals_argoal_board_upd_idx"
+            ),
+        ),
+        migrations.RunSQL(CREATE_VIEW, DROP_VIEW),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1 on 2026-10-18 19:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("goals", "0016_goal_cold_storage"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="boardevent",
+            name="object_id",
+            field=models.BigIntegerField(verbose_name="Id объекта"),
+        ),
+    ]
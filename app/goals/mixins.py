@@ -0,0 +1,56 @@
+import hashlib
+
+from django.db.models import Max, Count
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+
+
+def make_etag(*parts) -> str:
+    return quote_etag(hashlib.md5('|'.join(map(str, parts)).encode('utf-8')).hexdigest())
+
+
+class ConditionalListMixin:
+    '''
+    Условный GET для списков.
+    До сериализации считаем по видимому набору строк max(updated) и количество,
+    и если клиент прислал тот же ETag в If-None-Match, отвечаем 304 без выборки страницы.
+    Количество нужно, чтобы заметить удаление строк, которое max(updated) не меняет.
+    Last-Modified для списков не отдаем: по одной дате удаление не отличить от отсутствия изменений.
+    Если ответ зависит еще от чего-то, кроме updated и набора строк, вьюшка добавляет агрегаты в etag_aggregates.
+    '''
+    etag_aggregates: dict = {}
+
+    def get_list_etag(self, queryset) -> str:
+        state = queryset.aggregate(last_updated=Max('updated'), count=Count('id'), **self.etag_aggregates)
+        return make_etag(self.request.get_full_path(), self.request.user.id, self.request.accepted_renderer.format,
+                         *(state[key] for key in sorted(state)))
+
+    def list(self, request, *args, **kwargs):
+        etag = self.get_list_etag(self.filter_queryset(self.get_queryset()))
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+            response['ETag'] = etag
+        return response
+
+
+class ConditionalRetrieveMixin:
+    '''
+    Условный GET для одного объекта: ETag и Last-Modified по get_modified, по умолчанию это поле updated.
+    '''
+
+    def get_modified(self, instance):
+        return instance.updated
+
+    def retrieve(self, request, *args, **kwargs):
+        instance = self.get_object()
+        modified = self.get_modified(instance)
+        etag = make_etag(instance.pk, request.accepted_renderer.format, modified.isoformat())
+        last_modified = int(modified.timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = Response(self.get_serializer(instance).data)
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
@@ -1,7 +1,18 @@
+from collections import Counter
+
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.core.validators import MinLengthValidator
-from django.db import models
+from django.db import models, connection, transaction
+from django.db.models import Q
 from django.utils import timezone
+from core.managers import LiveManager
 from core.models import User
+from goals.broker import publish_changes
+
+# Живые записи: одно условие и для менеджеров по умолчанию, и для частичных индексов
+NOT_DELETED = Q(is_deleted=False)
+NOT_ARCHIVED = ~Q(status=4)  # Goal.Status.archived
 
 
 class DatesModelMixin(models.Model):
@@ -23,6 +34,9 @@ class DatesModelMixin(models.Model):
         if not self.id:  # Когда модель только создается – у нее нет id
             self.created = timezone.now()
         self.updated = timezone.now()  # Каждый раз, когда вызывается save, проставляем свежую дату обновления
+        if kwargs.get('update_fields') is not None:
+            # Иначе при save(update_fields=...) новая дата не попадет в базу
+            kwargs['update_fields'] = {*kwargs['update_fields'], 'updated'}
         return super().save(*args, **kwargs)
 
 
@@ -32,9 +46,18 @@ class Board(DatesModelMixin):
                              verbose_name='Название')
     is_deleted = models.BooleanField(default=False, verbose_name='Удалена')
 
+    # Первый менеджер – менеджер по умолчанию, его же используют связи (category.goals, board.categories)
+    live_condition = NOT_DELETED
+    objects = LiveManager()
+    with_archived = models.Manager()
+
     class Meta:
         verbose_name = 'Доска'
         verbose_name_plural = 'Доски'
+        # Частичные индексы не включают удаленные записи, поэтому остаются маленькими
+        indexes = [
+            models.Index(fields=['title', 'id'], condition=NOT_DELETED, name='goals_board_live_title_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -61,7 +84,10 @@ class BoardParticipant(DatesModelMixin):
     class Meta:
         verbose_name = 'Участник'
         verbose_name_plural = 'Участники'
-        unique_together = ('user', 'board')
+        # Роль включена в уникальный индекс, проверка прав читается только из индекса
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'board'], include=['role'], name='goals_part_user_board_uniq'),
+        ]
 
     def __str__(self):
         return self.role
@@ -77,9 +103,17 @@ class GoalCategory(DatesModelMixin):
                               related_name='categories',
                               )
 
+    live_condition = NOT_DELETED
+    objects = LiveManager()
+    with_archived = models.Manager()
+
     class Meta:
         verbose_name = 'Категория'
         verbose_name_plural = 'Категории'
+        indexes = [
+            models.Index(fields=['board', 'title'], condition=NOT_DELETED, name='goals_cat_live_board_title_idx'),
+            models.Index(fields=['board', 'created'], condition=NOT_DELETED, name='goals_cat_live_board_crt_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -108,6 +142,12 @@ class Goal(DatesModelMixin):
                                  on_delete=models.CASCADE,
                                  verbose_name='Категория',
                                  related_name='goals')
+    # Доска дублируется из категории, чтобы проверять видимость цели без join через категорию
+    board = models.ForeignKey(to=Board,
+                              on_delete=models.RESTRICT,
+                              verbose_name='Доска',
+                              related_name='goals',
+                              editable=False)
     status = models.PositiveSmallIntegerField(verbose_name="Статус",
                                               choices=Status.choices,
                                               default=Status.to_do
@@ -118,23 +158,348 @@ class Goal(DatesModelMixin):
                                                 )
 
     due_date = models.DateTimeField(verbose_name='Дата дедлайна')
+    # Заполняется триггером в БД из title (вес A) и description (вес B), см. миграцию 0012
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    live_condition = NOT_ARCHIVED
+    objects = LiveManager()
+    with_archived = models.Manager()
 
     class Meta:
         verbose_name = 'Цель'
         verbose_name_plural = 'Цели'
+        # Индексы под фильтры GoalDateFilter и сортировки списка целей, архивные цели (status=4) не индексируем
+        indexes = [
+            models.Index(fields=['board', 'title'], condition=NOT_ARCHIVED, name='goals_goal_live_board_ttl_idx'),
+            models.Index(fields=['board', 'due_date'], condition=NOT_ARCHIVED, name='goals_goal_live_board_due_idx'),
+            models.Index(fields=['board', 'priority'], condition=NOT_ARCHIVED, name='goals_goal_live_board_prio_idx'),
+            models.Index(fields=['board', 'status'], condition=NOT_ARCHIVED, name='goals_goal_live_board_st_idx'),
+            # Список целей пользователя в боте
+            models.Index(fields=['user', 'id'], condition=NOT_ARCHIVED, name='goals_goal_live_user_idx'),
+            GinIndex(fields=['search_vector'], condition=NOT_ARCHIVED, name='goals_goal_live_search_idx'),
+            # Поиск архивных целей для переноса в холодные таблицы (archive_goals)
+            models.Index(fields=['updated'], condition=Q(status=4), name='goals_goal_archived_upd_idx'),
+        ]
 
     def __str__(self):
         return self.title
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Запоминаем загруженные значения, чтобы при сохранении понять сменилась ли категория
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_category_id = instance.__dict__.get('category_id')
+        instance._loaded_board_id = instance.__dict__.get('board_id')
+        if {'board_id', 'status', 'priority'} <= instance.__dict__.keys():
+            instance._loaded_stats_key = instance.stats_key
+        return instance
+
+    @property
+    def stats_key(self) -> tuple[int, int, int] | None:
+        # Строка BoardGoalStats, в которой учтена цель, архивные цели не учитываются
+        if self.status == Goal.Status.archived:
+            return None
+        return self.board_id, self.status, self.priority
+
+    def save(self, *args, **kwargs):
+        if self.board_id is None or self.category_id != getattr(self, '_loaded_category_id', None):
+            self.board_id = self.category.board_id
+            if kwargs.get('update_fields') is not None and 'category' in kwargs['update_fields']:
+                kwargs['update_fields'] = {*kwargs['update_fields'], 'board'}
+        adding = self._state.adding
+        result = super().save(*args, **kwargs)
+
+        # Счетчики обновляем, только если знаем, в какой строке цель была учтена до сохранения
+        if adding or hasattr(self, '_loaded_stats_key'):
+            BoardGoalStats.objects.move(None if adding else self._loaded_stats_key, self.stats_key)
+            self._loaded_stats_key = self.stats_key
+
+        # Цель переехала на другую доску – комментарии переезжают вместе с ней
+        previous_board_id = getattr(self, '_loaded_board_id', None)
+        if previous_board_id is not None and previous_board_id != self.board_id:
+            comments = self.comments.all()
+            BoardEvent.objects.record_queryset(BoardEvent.Entity.comment, comments)
+            comments.update(board_id=self.board_id, updated=self.updated)
+            BoardEvent.objects.record_queryset(BoardEvent.Entity.comment, comments)
+        self._loaded_category_id, self._loaded_board_id = self.category_id, self.board_id
+        return result
+
 
 class GoalComment(DatesModelMixin):
     goal = models.ForeignKey(to=Goal, verbose_name='цель', on_delete=models.CASCADE, related_name='comments')
+    # Доска цели, поддерживается Goal.save
+    board = models.ForeignKey(to=Board,
+                              on_delete=models.RESTRICT,
+                              verbose_name='Доска',
+                              related_name='comments',
+                              editable=False)
     user = models.ForeignKey(to=User, verbose_name='Автор', on_delete=models.CASCADE, related_name='comments')
     text = models.TextField(max_length=255, verbose_name='Текст')
 
     class Meta:
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['goal', '-created'], name='goals_comment_goal_created_idx'),
+            models.Index(fields=['board', '-created'], name='goals_comment_board_crt_idx'),
+        ]
 
     def __str__(self):
         return self.text
+
+    def save(self, *args, **kwargs):
+        if self.board_id is None:
+            self.board_id = self.goal.board_id
+        return super().save(*args, **kwargs)
+
+
+class BoardEventManager(models.Manager):
+    def record(self, entity: int, pairs) -> None:
+        # pairs – пары (board_id, object_id), вставляем одним запросом из двух массивов
+        pairs = set(pairs)
+        if not pairs:
+            return
+        board_ids, object_ids = zip(*pairs)
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {self.model._meta.db_table} (board_id, entity, object_id, created) '
+                           f'SELECT board_id, %s, object_id, now() '
+                           f'FROM unnest(%s::bigint[], %s::bigint[]) AS changed (board_id, object_id)',
+                           [entity, list(board_ids), list(object_ids)])
+        publish_changes(self.model.Entity(entity).name, pairs)
+
+    def record_queryset(self, entity: int, queryset) -> None:
+        # Одним INSERT ... SELECT, без выгрузки id в Python: каскад по доске может затронуть тысячи строк
+        sql, params = queryset.order_by().values('board_id', 'id').query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {self.model._meta.db_table} (board_id, entity, object_id, created) '
+                           f'SELECT board_id, %s, id, now() FROM ({sql}) AS changed '
+                           f'RETURNING board_id, object_id', [entity, *params])
+            publish_changes(self.model.Entity(entity).name, cursor.fetchall())
+
+
+class BoardEvent(models.Model):
+    '''
+    Журнал изменений на досках для синхронизации клиентов (см. goals/sync.py).
+    Хранится только что изменилось, актуальное состояние берется из самих таблиц.
+    '''
+    class Entity(models.IntegerChoices):
+        category = 1, 'Категория'
+        goal = 2, 'Цель'
+        comment = 3, 'Комментарий'
+
+    id = models.BigAutoField(primary_key=True)
+    board = models.ForeignKey(to=Board, verbose_name='Доска', on_delete=models.CASCADE, related_name='events')
+    entity = models.PositiveSmallIntegerField(verbose_name='Тип объекта', choices=Entity.choices)
+    object_id = models.BigIntegerField(verbose_name='Id объекта')
+    # Номер транзакции, в которой сделано изменение, проставляет триггер
+    txid = models.BigIntegerField(verbose_name='Транзакция', null=True, editable=False)
+    created = models.DateTimeField(verbose_name='Дата создания', auto_now_add=True)
+
+    objects = BoardEventManager()
+
+    class Meta:
+        verbose_name = 'Событие доски'
+        verbose_name_plural = 'События досок'
+        indexes = [
+            models.Index(fields=['board', 'txid', 'id'], name='goals_event_board_txid_idx'),
+        ]
+
+
+class BoardGoalStatsManager(models.Manager):
+    def apply(self, deltas: Counter) -> None:
+        # deltas – {(board_id, status, priority): изменение}, все строки одним INSERT ... ON CONFLICT
+        # Ключи сортируем, чтобы параллельные транзакции блокировали строки в одном порядке
+        rows = [(*key, delta) for key, delta in sorted(deltas.items()) if delta]
+        if not rows:
+            return
+        table = self.model._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(f'INSERT INTO {table} (board_id, status, priority, count) '
+                           f'VALUES {", ".join(["(%s, %s, %s, %s)"] * len(rows))} '
+                           f'ON CONFLICT (board_id, status, priority) '
+                           f'DO UPDATE SET count = {table}.count + EXCLUDED.count',
+                           [value for row in rows for value in row])
+
+    def move(self, old_key: tuple | None, new_key: tuple | None) -> None:
+        if old_key == new_key:
+            return
+        deltas = Counter()
+        if old_key is not None:
+            deltas[old_key] -= 1
+        if new_key is not None:
+            deltas[new_key] += 1
+        self.apply(deltas)
+
+    def subtract_queryset(self, queryset) -> None:
+        # Для массовой архивации: вычитаем цели queryset одним GROUP BY, вызывать до update()
+        counts = queryset.filter(~Q(status=Goal.Status.archived)).order_by().values_list(
+            'board_id', 'status', 'priority').annotate(models.Count('id'))
+        self.apply(Counter({(board_id, status, priority): -count for board_id, status, priority, count in counts}))
+
+    def rebuild(self) -> None:
+        # Пересчет с нуля. Блокировка таблицы ждет транзакции, которые уже изменили счетчики,
+        # а новые ждут конца пересчета и применяют свои изменения уже к пересчитанным строкам
+        table = self.model._meta.db_table
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {table} IN EXCLUSIVE MODE')
+            cursor.execute(f'DELETE FROM {table}')
+            cursor.execute(REBUILD_BOARD_GOAL_STATS_SQL)
+
+
+REBUILD_BOARD_GOAL_STATS_SQL = f"""
+INSERT INTO goals_boardgoalstats (board_id, status, priority, count)
+SELECT board_id, status, priority, count(*) FROM goals_goal
+WHERE status <> {Goal.Status.archived}
+GROUP BY board_id, status, priority
+"""
+
+
+class BoardGoalStats(models.Model):
+    '''
+    Количество неархивных целей доски по статусу и приоритету.
+    Поддерживается при сохранении целей и в массовых операциях, rebuild_board_stats исправляет расхождения.
+    '''
+    board = models.ForeignKey(to=Board, verbose_name='Доска', on_delete=models.CASCADE, related_name='goal_stats')
+    status = models.PositiveSmallIntegerField(verbose_name='Статус', choices=Goal.Status.choices)
+    priority = models.PositiveSmallIntegerField(verbose_name='Приоритет', choices=Goal.Priority.choices)
+    count = models.IntegerField(verbose_name='Количество', default=0)
+
+    objects = BoardGoalStatsManager()
+
+    class Meta:
+        verbose_name = 'Статистика доски'
+        verbose_name_plural = 'Статистика досок'
+        constraints = [
+            models.UniqueConstraint(fields=['board', 'status', 'priority'], name='goals_stats_board_key_uniq'),
+        ]
+
+
+class ArchivedGoalManager(models.Manager):
+    # Колонки, общие для горячих и холодных таблиц
+    GOAL_COLUMNS = 'id, created, updated, title, description, category_id, status, priority, due_date, user_id, board_id'
+    COMMENT_COLUMNS = 'id, created, updated, goal_id, board_id, user_id, text'
+
+    def archive(self, before, limit: int) -> tuple[int, int]:
+        # Переносит пачку целей, архивных дольше before, вместе с комментариями. Возвращает (целей, комментариев).
+        # SKIP LOCKED: цель, которую сейчас восстанавливают или меняют, заберем в следующий раз
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'SELECT id FROM {Goal._meta.db_table} WHERE status = %s AND updated < %s '
+                           f'ORDER BY updated LIMIT %s FOR UPDATE SKIP LOCKED',
+                           [Goal.Status.archived, before, limit])
+            goal_ids = [goal_id for goal_id, in cursor.fetchall()]
+            if not goal_ids:
+                return 0, 0
+
+            cursor.execute(f'''
+                WITH moved AS (DELETE FROM {GoalComment._meta.db_table} WHERE goal_id = ANY(%s) RETURNING *)
+                INSERT INTO {ArchivedGoalComment._meta.db_table} ({self.COMMENT_COLUMNS})
+                SELECT {self.COMMENT_COLUMNS} FROM moved
+                RETURNING board_id, id
+            ''', [goal_ids])
+            # Архивные цели клиенты уже считают удаленными, а их комментарии – нет
+            comments = cursor.fetchall()
+            BoardEvent.objects.record(BoardEvent.Entity.comment, comments)
+
+            cursor.execute(f'''
+                WITH moved AS (DELETE FROM {Goal._meta.db_table} WHERE id = ANY(%s) RETURNING *)
+                INSERT INTO {self.model._meta.db_table} ({self.GOAL_COLUMNS}, archived)
+                SELECT {self.GOAL_COLUMNS}, now() FROM moved
+            ''', [goal_ids])
+        return len(goal_ids), len(comments)
+
+    def restore(self, goal_id: int, status: int) -> Goal:
+        # Обратный перенос с новым статусом. Поисковый вектор заполнит триггер, счетчики и журнал обновляем сами
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'''
+                WITH moved AS (DELETE FROM {self.model._meta.db_table} WHERE id = %s RETURNING *)
+                INSERT INTO {Goal._meta.db_table} ({self.GOAL_COLUMNS})
+                SELECT id, created, now(), title, description, category_id, %s, priority, due_date, user_id, board_id
+                FROM moved
+            ''', [goal_id, status])
+            if not cursor.rowcount:
+                raise self.model.DoesNotExist
+            cursor.execute(f'''
+                WITH moved AS (DELETE FROM {ArchivedGoalComment._meta.db_table} WHERE goal_id = %s RETURNING *)
+                INSERT INTO {GoalComment._meta.db_table} ({self.COMMENT_COLUMNS})
+                SELECT {self.COMMENT_COLUMNS} FROM moved
+                RETURNING board_id, id
+            ''', [goal_id])
+            BoardEvent.objects.record(BoardEvent.Entity.comment, cursor.fetchall())
+
+            restored = Goal.objects.get(id=goal_id)
+            BoardEvent.objects.record(BoardEvent.Entity.goal, [(restored.board_id, restored.id)])
+            BoardGoalStats.objects.move(None, restored.stats_key)
+        return restored
+
+
+class ArchivedGoal(models.Model):
+    '''
+    Холодное хранилище: цели, архивные дольше GOALS_ARCHIVE_AFTER_DAYS дней, переносит сюда archive_goals.
+    Колонки те же, что у Goal, кроме поискового вектора, id сохраняется.
+    '''
+    id = models.BigIntegerField(primary_key=True)
+    created = models.DateTimeField(verbose_name="Дата создания")
+    updated = models.DateTimeField(verbose_name="Дата последнего обновления")
+    user = models.ForeignKey(User, verbose_name='Автор', on_delete=models.RESTRICT, related_name='+')
+    title = models.CharField(verbose_name='Название', max_length=255)
+    description = models.TextField(max_length=2000, verbose_name='Описание', null=True, blank=True)
+    category = models.ForeignKey(to=GoalCategory, on_delete=models.CASCADE, verbose_name='Категория',
+                                 related_name='archived_goals')
+    board = models.ForeignKey(to=Board, on_delete=models.RESTRICT, verbose_name='Доска',
+                              related_name='archived_goals')
+    status = models.PositiveSmallIntegerField(verbose_name="Статус", choices=Goal.Status.choices)
+    priority = models.PositiveSmallIntegerField(verbose_name="Приоритет", choices=Goal.Priority.choices)
+    due_date = models.DateTimeField(verbose_name='Дата дедлайна')
+    archived = models.DateTimeField(verbose_name='Дата переноса в архив')
+
+    objects = ArchivedGoalManager()
+
+    class Meta:
+        verbose_name = 'Цель в архиве'
+        verbose_name_plural = 'Цели в архиве'
+        indexes = [
+            models.Index(fields=['board', '-updated'], name='goals_argoal_board_upd_idx'),
+        ]
+
+
+class ArchivedGoalComment(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    created = models.DateTimeField(verbose_name="Дата создания")
+    updated = models.DateTimeField(verbose_name="Дата последнего обновления")
+    goal = models.ForeignKey(to=ArchivedGoal, verbose_name='цель', on_delete=models.CASCADE, related_name='comments')
+    board = models.ForeignKey(to=Board, on_delete=models.RESTRICT, verbose_name='Доска', related_name='+')
+    user = models.ForeignKey(to=User, verbose_name='Автор', on_delete=models.CASCADE, related_name='+')
+    text = models.TextField(max_length=255, verbose_name='Текст')
+
+    class Meta:
+        verbose_name = 'Комментарий в архиве'
+        verbose_name_plural = 'Комментарии в архиве'
+
+
+class GoalArchive(models.Model):
+    '''
+    Представление goals_goal_archive: архивные цели из обеих таблиц, горячей и холодной.
+    Через него читается список архива, фильтры и сортировки PostgreSQL применяет к каждой части UNION ALL.
+    '''
+    id = models.BigIntegerField(primary_key=True)
+    created = models.DateTimeField(verbose_name="Дата создания")
+    updated = models.DateTimeField(verbose_name="Дата последнего обновления")
+    user = models.ForeignKey(User, verbose_name='Автор', on_delete=models.DO_NOTHING, related_name='+')
+    title = models.CharField(verbose_name='Название', max_length=255)
+    description = models.TextField(verbose_name='Описание', null=True)
+    category = models.ForeignKey(to=GoalCategory, on_delete=models.DO_NOTHING, verbose_name='Категория',
+                                 related_name='+')
+    board = models.ForeignKey(to=Board, on_delete=models.DO_NOTHING, verbose_name='Доска', related_name='+')
+    status = models.PositiveSmallIntegerField(verbose_name="Статус", choices=Goal.Status.choices)
+    priority = models.PositiveSmallIntegerField(verbose_name="Приоритет", choices=Goal.Priority.choices)
+    due_date = models.DateTimeField(verbose_name='Дата дедлайна')
+    # Пусто, пока цель в горячей таблице
+    archived = models.DateTimeField(verbose_name='Дата переноса в архив', null=True)
+
+    class Meta:
+        managed = False
+        db_table = 'goals_goal_archive'
+
+    @property
+    def is_cold(self) -> bool:
+        return self.archived is not None
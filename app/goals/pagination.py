@@ -0,0 +1,171 @@
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from functools import reduce
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, _positive_int
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    '''
+    Курсорная (keyset) пагинация.
+    Вместо OFFSET и COUNT(*) запоминаем значения полей сортировки последней записи страницы
+    и следующую страницу выбираем условием (поле, id) > (значение, id) по индексу.
+    Поэтому 200-я страница стоит столько же, сколько первая, а вставки новых строк не сдвигают страницы.
+    Сортировка берется из queryset (OrderingFilter) и всегда дополняется первичным ключом,
+    чтобы порядок был однозначным. Поля сортировки не должны принимать значение NULL.
+    '''
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'limit'
+    page_size = 20
+    max_page_size = 100
+    ordering = ('-created',)
+    invalid_cursor_message = 'Неверный курсор'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.ordering = self.get_ordering(queryset)
+        cursor = self.decode_cursor(request)
+
+        # Для перехода на предыдущую страницу идем по индексу в обратную сторону
+        is_reverse = bool(cursor) and cursor['r']
+        order_by = [self._invert(field) if is_reverse else field for field in self.ordering]
+        queryset = queryset.order_by(*order_by)
+        if cursor:
+            queryset = queryset.filter(self._build_keyset_filter(order_by, cursor['v']))
+
+        # Берем на одну запись больше, чтобы понять есть ли еще страница
+        results = list(queryset[:self.page_size + 1])
+        has_following = len(results) > self.page_size
+        results = results[:self.page_size]
+
+        if is_reverse:
+            results.reverse()
+            self.has_next, self.has_previous = True, has_following
+        else:
+            self.has_next, self.has_previous = has_following, cursor is not None
+
+        self.page = results
+        return results
+
+    def get_page_size(self, request):
+        if self.page_size_query_param:
+            try:
+                return _positive_int(request.query_params[self.page_size_query_param],
+                                     strict=True,
+                                     cutoff=self.max_page_size)
+            except (KeyError, ValueError):
+                pass
+        return self.page_size
+
+    def get_ordering(self, queryset) -> list[str]:
+        ordering = [field for field in queryset.query.order_by if isinstance(field, str)] or list(self.ordering)
+        if ordering[-1].lstrip('-') not in ('pk', 'id'):
+            # Дополняем сортировку первичным ключом в том же направлении, что и последнее поле
+            ordering.append('-id' if ordering[-1].startswith('-') else 'id')
+        return ordering
+
+    def decode_cursor(self, request) -> dict | None:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            cursor = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            assert isinstance(cursor['r'], bool) and len(cursor['v']) == len(self.ordering)
+        except (TypeError, ValueError, KeyError, AssertionError, BinasciiError, UnicodeError):
+            raise NotFound(self.invalid_cursor_message)
+        # Курсор, выданный для другой сортировки, применять нельзя
+        if cursor.get('o') != self.ordering:
+            raise NotFound(self.invalid_cursor_message)
+        return cursor
+
+    def encode_cursor(self, instance, reverse: bool) -> str:
+        values = [self._serialize_value(self._get_value(instance, field)) for field in self.ordering]
+        cursor = json.dumps({'o': self.ordering, 'v': values, 'r': reverse}, separators=(',', ':'))
+        encoded = b64encode(cursor.encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self) -> str | None:
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self) -> str | None:
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.cursor_query_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Курсор страницы',
+                'schema': {'type': 'string'},
+            },
+            {
+                'name': self.page_size_query_param,
+                'required': False,
+                'in': 'query',
+                'description': f'Количество записей на странице (не более {self.max_page_size})',
+                'schema': {'type': 'integer'},
+            },
+        ]
+
+    @staticmethod
+    def _invert(field: str) -> str:
+        return field[1:] if field.startswith('-') else f'-{field}'
+
+    @staticmethod
+    def _get_value(instance, field: str):
+        return reduce(getattr, field.lstrip('-').split('__'), instance)
+
+    @staticmethod
+    def _serialize_value(value):
+        # Даты сохраняем с микросекундами, иначе сравнение по ключу будет неточным
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        if isinstance(value, Decimal):
+            return str(value)
+        return value
+
+    @staticmethod
+    def _build_keyset_filter(order_by: list[str], values: list) -> Q:
+        # (a, b, id) > (x, y, z) раскладываем в a > x OR (a = x AND b > y) OR (a = x AND b = y AND id > z)
+        # Направление сравнения берется отдельно для каждого поля
+        condition = Q()
+        equal_prefix = Q()
+        for field, value in zip(order_by, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= equal_prefix & Q(**{f'{name}__{lookup}': value})
+            equal_prefix &= Q(**{name: value})
+        return condition
@@ -1,6 +1,7 @@
 from rest_framework.permissions import BasePermission, SAFE_METHODS, IsAuthenticated
 
-from goals.models import BoardParticipant, GoalCategory, Board, Goal
+from goals.membership import has_board_role, READ_ROLES, WRITE_ROLES, OWNER_ROLES
+from goals.models import GoalCategory, Board, Goal
 
 
 class IsAnAuthor(BasePermission):
@@ -17,10 +18,8 @@ class BoardPermission(IsAuthenticated):
 
     def has_object_permission(self, request, view, obj: Board):
         # Если метод безопасный, то возвращаем состояние да\нет существует ли юзер в участниках
-        if request.method in SAFE_METHODS:
-            return BoardParticipant.objects.filter(user=request.user, board=obj).exists()
-        # При попытке удаления\изменения выполняем запрос и проверяем владелец ли это
-        return BoardParticipant.objects.filter(user=request.user, board=obj, role=BoardParticipant.Roles.owner).exists()
+        # При попытке удаления\изменения проверяем владелец ли это
+        return has_board_role(request, obj.id, READ_ROLES if request.method in SAFE_METHODS else OWNER_ROLES)
 
 
 class GoalCategoryPermission(IsAuthenticated):
@@ -28,14 +27,8 @@ class GoalCategoryPermission(IsAuthenticated):
 
     def has_object_permission(self, request, view, obj: GoalCategory):
         # Если метод безопасный, то возвращаем состояние да\нет существует ли юзер в участниках
-        if request.method in SAFE_METHODS:
-            return BoardParticipant.objects.filter(user=request.user, board=obj.board).exists()
-        # При попытке удаления\изменения выполняем запрос и проверяем владелец ли это
-        return BoardParticipant.objects.filter(
-                                                user=request.user,
-                                                board=obj.board,
-                                                role__in=[BoardParticipant.Roles.owner, BoardParticipant.Roles.writer],
-                                               ).exists()
+        # При попытке удаления\изменения проверяем владелец или редактор ли это
+        return has_board_role(request, obj.board_id, READ_ROLES if request.method in SAFE_METHODS else WRITE_ROLES)
 
 
 class GoalPermission(IsAuthenticated):
@@ -43,13 +36,7 @@ class GoalPermission(IsAuthenticated):
 
     def has_object_permission(self, request, view, obj: Goal):
         # Если метод безопасный, то возращаем состояние да\нет существует ли юзер в участниках
-        if request.method in SAFE_METHODS:
-            return BoardParticipant.objects.filter(user=request.user, board=obj.category.board).exists()
-        return BoardParticipant.objects.filter(
-                                                user=request.user,
-                                                board=obj.category.board,
-                                                role__in=[BoardParticipant.Roles.owner, BoardParticipant.Roles.writer]
-                                            ).exists()
+        return has_board_role(request, obj.board_id, READ_ROLES if request.method in SAFE_METHODS else WRITE_ROLES)
 
 
 class CommentPermission(IsAuthenticated):
@@ -0,0 +1,95 @@
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db.models import Count
+from django.utils import timezone
+
+from core.models import User
+from goals.models import Board, BoardParticipant, GoalCategory, Goal, GoalComment, BoardGoalStats
+
+BATCH_SIZE = 5000
+
+
+@dataclass
+class SeedOptions:
+    users: int = 200
+    boards: int = 300
+    categories_per_board: int = 4
+    goals: int = 50000
+    comments: int = 50000
+    seed: int = 42
+    prefix: str = 'seed_user'
+    # Пароль для всех пользователей, None – войти по паролю нельзя (хеширование одно на всех, не на каждого)
+    password: str | None = None
+
+
+# Комментарий для себя
+# Данные должны быть похожи на боевые, иначе планы запросов и их стоимость будут другими:
+# - членство неравномерное: первые пользователи состоят в большинстве досок, остальные в нескольких;
+# - часть досок и категорий удалена, около трети целей в архиве, сроки разбросаны в прошлое и будущее;
+# - комментарии растянуты по времени, чтобы сортировка по created не совпадала с порядком id.
+# Все вставки через bulk_create, поэтому save() и сигналы не вызываются: доску целей и комментариев
+# проставляем сами, статистику досок пересчитываем в конце. Журнал изменений не заполняется.
+def seed(options: SeedOptions) -> list[User]:
+    rnd = random.Random(options.seed)
+    now = timezone.now()
+    password = make_password(options.password)
+
+    users = User.objects.bulk_create([
+        User(username=f'{options.prefix}_{i}', password=password) for i in range(options.users)
+    ], batch_size=BATCH_SIZE)
+    boards = Board.objects.bulk_create([
+        Board(title=f'Доска {i}', is_deleted=rnd.random() < 0.1, created=now, updated=now)
+        for i in range(options.boards)
+    ], batch_size=BATCH_SIZE)
+
+    members = {}
+    participants = []
+    for board in boards:
+        board_members = [rnd.choice(users[:10])]
+        for user in {rnd.choice(users) for _ in range(rnd.randint(1, 5))} - set(board_members):
+            board_members.append(user)
+        members[board.id] = board_members
+        participants.extend(
+            BoardParticipant(user=user, board=board, created=now, updated=now,
+                             role=BoardParticipant.Roles.owner if not number else rnd.randint(2, 3))
+            for number, user in enumerate(board_members))
+    BoardParticipant.objects.bulk_create(participants, batch_size=BATCH_SIZE)
+
+    categories = GoalCategory.objects.bulk_create([
+        GoalCategory(title=f'Категория {i}', board=board, user=members[board.id][0],
+                     is_deleted=board.is_deleted or rnd.random() < 0.1, created=now, updated=now)
+        for i, board in enumerate(boards * options.categories_per_board)
+    ], batch_size=BATCH_SIZE)
+
+    goals = []
+    for i in range(options.goals):
+        category = rnd.choice(categories)
+        # Цели удаленных категорий архивные, как после удаления через API
+        goal_status = Goal.Status.archived if category.is_deleted else \
+            rnd.choices(list(Goal.Status.values), weights=(3, 2, 2, 3))[0]
+        goals.append(Goal(
+            title=f'Цель {i}', description=f'Описание цели {i}' if rnd.random() < 0.5 else None,
+            category=category, board_id=category.board_id, user=rnd.choice(members[category.board_id]),
+            status=goal_status, priority=rnd.choice(Goal.Priority.values),
+            due_date=now + timedelta(days=rnd.randint(-60, 60)),
+            created=now - timedelta(minutes=options.goals - i), updated=now))
+    goals = Goal.objects.bulk_create(goals, batch_size=BATCH_SIZE)
+
+    GoalComment.objects.bulk_create([
+        GoalComment(goal=goal, board_id=goal.board_id, user=rnd.choice(members[goal.board_id]),
+                    text=f'Комментарий {i}', created=now - timedelta(minutes=rnd.randint(0, 60 * 24 * 90)),
+                    updated=now)
+        for i, goal in enumerate(rnd.choice(goals) for _ in range(options.comments))
+    ], batch_size=BATCH_SIZE)
+
+    BoardGoalStats.objects.rebuild()
+    return users
+
+
+def busiest_user(users: list[User]) -> User:
+    # Пользователь с наибольшим числом досок – худший случай для списков
+    return User.objects.filter(id__in=[user.id for user in users]).annotate(
+        boards_count=Count('participants')).order_by('-boards_count', 'id').first()
@@ -1,16 +1,28 @@
+from collections import Counter
 from typing import Type
 
 from django.db import transaction
+from django.db.models import Prefetch, prefetch_related_objects
+from django.utils import timezone
 from rest_framework import serializers
 
+from core.metrics import TimedSerializerMixin
 from core.models import User
 from core.serializers import UserSerializer
-from goals.models import GoalCategory, Goal, GoalComment, Board, BoardParticipant
+from goals.broker import publish_participants
+from goals.membership import has_board_role, get_board_roles, invalidate_board_roles, WRITE_ROLES
+from goals.models import GoalCategory, Goal, GoalComment, Board, BoardParticipant, BoardEvent, BoardGoalStats, \
+    GoalArchive, ArchivedGoalComment
+
+# Id – bigint, больший id в запрос к базе не передаем
+MAX_ID = 2 ** 63 - 1
 
 
 # Сериализаторы категорий
-class CreateGoalCategorySerializer(serializers.ModelSerializer):
+class CreateGoalCategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
+    # Удаленную доску находим, чтобы ответить понятной ошибкой, а не "Недопустимый первичный ключ"
+    board = serializers.PrimaryKeyRelatedField(queryset=Board.with_archived.all())
 
     class Meta:
         model = GoalCategory
@@ -20,17 +32,12 @@ class CreateGoalCategorySerializer(serializers.ModelSerializer):
     def validate_board(self, value: Board):
         if value.is_deleted:
             raise serializers.ValidationError('Нет прав для удаления категории')
-        if not BoardParticipant.objects.filter(
-                board=value,
-                role__in=[BoardParticipant.Roles.owner,
-                          BoardParticipant.Roles.writer],
-                user=self.context['request'].user
-        ).exists():
+        if not has_board_role(self.context['request'], value.id, WRITE_ROLES):
             raise serializers.ValidationError('Нет прав Владельца или Редактора')
         return value
 
 
-class ListGoalCategorySerializer(serializers.ModelSerializer):
+class ListGoalCategorySerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
     class Meta:
@@ -40,44 +47,209 @@ class ListGoalCategorySerializer(serializers.ModelSerializer):
 
 
 # Сериализаторы Целей
-class CreateGoalSerializer(serializers.ModelSerializer):
+class CreateGoalSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
-    category = serializers.PrimaryKeyRelatedField(queryset=GoalCategory.objects.filter(is_deleted=False))
+    category = serializers.PrimaryKeyRelatedField(queryset=GoalCategory.objects.all())
 
     class Meta:
         model = Goal
-        fields = '__all__'
+        exclude = ('search_vector',)
         read_only_fields = ('id', 'created', 'updated', 'user')
 
     # Комментарий для будущего меня
     # Можно валидировать необходимые поля с помощью validate_{имя поля}
     def validate_category(self, value: GoalCategory):
-        if value.is_deleted:
-            raise serializers.ValidationError('Запрещено добавлять удаленную категорию')
-        if value.user != self.context['request'].user:
+        if value.user_id != self.context['request'].user.id:
             raise serializers.ValidationError('Запрещено работать не владельцам категории')
-        if not BoardParticipant.objects.filter(
-            board_id=value.board_id,
-            role__in=[BoardParticipant.Roles.owner, BoardParticipant.Roles.writer],
-            user=self.context['request'].user
-        ).exists():
+        if not has_board_role(self.context['request'], value.board_id, WRITE_ROLES):
             raise serializers.ValidationError('Отсутствуют требуемые права')
 
         return value
 
 
-class ListGoalSerializer(serializers.ModelSerializer):
+class ListGoalSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
-    category = serializers.PrimaryKeyRelatedField(queryset=GoalCategory.objects.filter(is_deleted=False))
+    category = serializers.PrimaryKeyRelatedField(queryset=GoalCategory.objects.all())
 
     class Meta:
         model = Goal
-        fields = '__all__'
+        exclude = ('search_vector',)
         read_only_fields = ('id', 'created', 'updated', 'user')
 
+    def validate_category(self, value: GoalCategory):
+        # Перенести цель можно только в категорию доски, где есть права на запись
+        if not has_board_role(self.context['request'], value.board_id, WRITE_ROLES):
+            raise serializers.ValidationError('Отсутствуют требуемые права')
+        return value
+
+
+
+class BatchGoalItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Категории проверяются пачкой в BatchGoalSerializer, здесь только id
+    category = serializers.IntegerField(min_value=1, max_value=MAX_ID)
+
+    class Meta:
+        model = Goal
+        fields = ('title', 'description', 'category', 'status', 'priority', 'due_date')
+
+
+class BatchGoalPatchItemSerializer(BatchGoalItemSerializer):
+    id = serializers.IntegerField(min_value=1, max_value=MAX_ID)
+
+    class Meta(BatchGoalItemSerializer.Meta):
+        fields = ('id', *BatchGoalItemSerializer.Meta.fields)
+
+
+class BatchGoalSerializer(serializers.Serializer):
+    max_operations = 500
+
+    # Поля объявлены здесь, а не атрибутами класса, иначе поле create перекроется методом create
+    def get_fields(self):
+        return {
+            'create': serializers.ListField(child=serializers.DictField(), required=False, default=list),
+            'patch': serializers.ListField(child=serializers.DictField(), required=False, default=list),
+            'archive': serializers.ListField(child=serializers.IntegerField(), required=False, default=list),
+        }
+
+    def validate(self, attrs):
+        if sum(map(len, attrs.values())) > self.max_operations:
+            raise serializers.ValidationError(f'Не более {self.max_operations} операций за один запрос')
+        return attrs
+
+    # Комментарий для себя
+    # Ошибка в одной операции не отменяет остальные: каждая операция получает свой результат,
+    # а все корректные операции сохраняются одной транзакцией через bulk_create/bulk_update.
+    # Категории и цели загружаются одним запросом на все операции, права проверяются по карте ролей.
+    def create(self, validated_data) -> list[dict]:
+        request = self.context['request']
+        user = request.user
+        roles = get_board_roles(request)
+        results = []
+
+        def error(op: str, index: int, errors) -> None:
+            results.append({'op': op, 'index': index, 'status': 'error', 'errors': errors})
+
+        creates = self._validate_items(BatchGoalItemSerializer, 'create', validated_data['create'], error)
+        updates = self._validate_items(BatchGoalPatchItemSerializer, 'patch', validated_data['patch'], error)
+
+        category_ids = {item['category'] for _, item in creates} | {
+            item['category'] for _, item in updates if 'category' in item}
+        categories = GoalCategory.objects.in_bulk(category_ids)
+
+        def check_category(category_id: int) -> str | None:
+            category = categories.get(category_id)
+            if category is None:
+                return 'Категория не найдена'
+            if roles.get(category.board_id) not in WRITE_ROLES:
+                return 'Отсутствуют требуемые права'
+            return None
+
+        now = timezone.now()
+        new_goals, new_goals_indices = [], []
+        for index, item in creates:
+            if message := check_category(item['category']):
+                error('create', index, {'category': [message]})
+            elif categories[item['category']].user_id != user.id:
+                error('create', index, {'category': ['Запрещено работать не владельцам категории']})
+            else:
+                item['category_id'] = item.pop('category')
+                new_goals.append(Goal(**item, user=user, board_id=categories[item['category_id']].board_id,
+                                      created=now, updated=now))
+                new_goals_indices.append(index)
+
+        with transaction.atomic():
+            goal_ids = [item['id'] for _, item in updates] + validated_data['archive']
+            # Блокируем изменяемые цели до конца транзакции, чтобы не затереть параллельные правки
+            goals = Goal.objects.select_for_update().filter(
+                board_id__in=roles.keys()).order_by('id').in_bulk(goal_ids)
+
+            changed_goals, changed_fields, moved_goals, seen = {}, {'updated'}, {}, set()
+            # Пары (доска, цель) для журнала изменений, у переехавших целей – обе доски
+            events = set()
+
+            def check_goal(op: str, index: int, goal_id: int) -> Goal | None:
+                goal, is_duplicate = goals.get(goal_id), goal_id in seen
+                seen.add(goal_id)
+                if is_duplicate:
+                    error(op, index, {'id': ['Цель указана в запросе несколько раз']})
+                elif goal is None:
+                    error(op, index, {'id': ['Цель не найдена']})
+                elif goal.user_id != user.id:
+                    error(op, index, {'id': ['Редактирование доступно только для владельца']})
+                elif roles.get(goal.board_id) not in WRITE_ROLES:
+                    error(op, index, {'id': ['Отсутствуют требуемые права']})
+                else:
+                    return goal
+                return None
+
+            for index, item in updates:
+                goal = check_goal('patch', index, item.pop('id'))
+                if goal is None:
+                    continue
+                if 'category' in item:
+                    if message := check_category(item['category']):
+                        error('patch', index, {'category': [message]})
+                        continue
+                    item['category_id'] = item.pop('category')
+                    item['board_id'] = categories[item['category_id']].board_id
+                    if item['board_id'] != goal.board_id:
+                        moved_goals[goal.id] = item['board_id']
+                events.add((goal.board_id, goal.id))
+                for field, value in item.items():
+                    setattr(goal, field, value)
+                goal.updated = now
+                changed_fields.update(field.removesuffix('_id') for field in item)
+                changed_goals[goal.id] = goal
+                results.append({'op': 'patch', 'index': index, 'status': 'ok', 'id': goal.id})
+
+            for index, goal_id in enumerate(validated_data['archive']):
+                goal = check_goal('archive', index, goal_id)
+                if goal is None:
+                    continue
+                goal.status, goal.updated = Goal.Status.archived, now
+                changed_fields.add('status')
+                changed_goals[goal.id] = goal
+                results.append({'op': 'archive', 'index': index, 'status': 'ok', 'id': goal.id})
+
+            Goal.objects.bulk_create(new_goals)
+            if changed_goals:
+                Goal.objects.bulk_update(changed_goals.values(), fields=sorted(changed_fields))
+            # Счетчики досок: загруженные цели помнят, в какой строке статистики были учтены
+            stats = Counter(goal.stats_key for goal in [*new_goals, *changed_goals.values()])
+            stats.subtract(goal._loaded_stats_key for goal in changed_goals.values())
+            stats.pop(None, None)
+            BoardGoalStats.objects.apply(stats)
+            # bulk-методы не отправляют сигналы, журнал пишем сами
+            events.update((goal.board_id, goal.id) for goal in [*new_goals, *changed_goals.values()])
+            BoardEvent.objects.record(BoardEvent.Entity.goal, events)
+            # Комментарии переезжают на новую доску вместе с целью, один UPDATE на доску
+            for board_id in set(moved_goals.values()):
+                comments = GoalComment.objects.filter(
+                    goal_id__in=[goal_id for goal_id, board in moved_goals.items() if board == board_id])
+                BoardEvent.objects.record_queryset(BoardEvent.Entity.comment, comments)
+                comments.update(board_id=board_id, updated=now)
+                BoardEvent.objects.record_queryset(BoardEvent.Entity.comment, comments)
+
+        results.extend({'op': 'create', 'index': index, 'status': 'ok', 'id': goal.id}
+                       for index, goal in zip(new_goals_indices, new_goals))
+        order = {'create': 0, 'patch': 1, 'archive': 2}
+        return sorted(results, key=lambda result: (order[result['op']], result['index']))
+
+    def _validate_items(self, serializer_class, op: str, items: list[dict], error) -> list[tuple[int, dict]]:
+        valid = []
+        for index, item in enumerate(items):
+            serializer = serializer_class(data=item, partial=op == 'patch', context=self.context)
+            if not serializer.is_valid():
+                error(op, index, serializer.errors)
+            elif op == 'patch' and 'id' not in serializer.validated_data:
+                error(op, index, {'id': ['Обязательное поле.']})
+            else:
+                valid.append((index, dict(serializer.validated_data)))
+        return valid
+
 
 # Сериализаторы комментариев
-class CreateCommentSerializer(serializers.ModelSerializer):
+class CreateCommentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
     class Meta:
@@ -86,7 +258,7 @@ class CreateCommentSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created', 'updated', 'user')
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
     class Meta:
@@ -95,8 +267,34 @@ class CommentSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created', 'updated', 'user', 'goal')
 
 
+# Сериализаторы архива целей
+class ArchivedGoalSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    user = UserSerializer(read_only=True)
+    is_cold = serializers.BooleanField(read_only=True)
+
+    class Meta:
+        model = GoalArchive
+        fields = '__all__'
+
+
+class ArchivedGoalDetailSerializer(ArchivedGoalSerializer):
+    comments = serializers.SerializerMethodField()
+
+    def get_comments(self, obj: GoalArchive) -> list:
+        # Комментарии лежат в той же таблице (горячей или холодной), что и цель
+        model = ArchivedGoalComment if obj.is_cold else GoalComment
+        comments = model.objects.select_related('user').filter(goal_id=obj.id).order_by('-created', '-id')
+        return CommentSerializer(comments, many=True).data
+
+
+class RestoreGoalSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(
+        choices=[choice for choice in Goal.Status.choices if choice[0] != Goal.Status.archived],
+        default=Goal.Status.to_do)
+
+
 # Сериализаторы досок
-class BoardCreateSerializer(serializers.ModelSerializer):
+class BoardCreateSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
     class Meta:
@@ -111,9 +309,10 @@ class BoardCreateSerializer(serializers.ModelSerializer):
         return board
 
 
-class BoardParticipantSerializer(serializers.ModelSerializer):
+class BoardParticipantSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     role = serializers.ChoiceField(required=True, choices=BoardParticipant.Roles.choices[1:])
-    user = serializers.SlugRelatedField(slug_field='username', queryset=User.objects.all())
+    # Имена пользователей разрешаются одним запросом для всего списка в BoardSerializer.validate_participants
+    user = serializers.CharField(source='user.username')
 
     class Meta:
         model = BoardParticipant
@@ -121,7 +320,7 @@ class BoardParticipantSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'created', 'updated', 'board')
 
 
-class BoardSerializer(serializers.ModelSerializer):
+class BoardSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     participants = BoardParticipantSerializer(many=True)
     user = serializers.HiddenField(default=serializers.CurrentUserDefault())
 
@@ -130,34 +329,70 @@ class BoardSerializer(serializers.ModelSerializer):
         fields = '__all__'
         read_only_fields = ('id', 'created', 'updated')
 
+    def validate_participants(self, value: list[dict]) -> dict[int, int]:
+        # Возвращаем карту {user_id: role}, при повторе пользователя берем последнюю роль
+        roles = {member['user']['username']: member['role'] for member in value}
+        user_ids = dict(User.objects.filter(username__in=roles.keys()).values_list('username', 'id'))
+        unknown = sorted(roles.keys() - user_ids.keys())
+        if unknown:
+            raise serializers.ValidationError(f'Пользователи не найдены: {", ".join(unknown)}')
+        return {user_ids[username]: role for username, role in roles.items()}
+
     def update(self, instance, validated_data):
-        # Достаем пользователя и участников
+        # Достаем пользователя и участников, себя владелец не меняет
         user = validated_data.pop('user')
-        new_participants = validated_data.pop('participants')
-        new_participants_indices = {member['user'].id: member for member in new_participants}
-        old_participants = instance.participants.exclude(user=user)
+        new_roles = validated_data.pop('participants')
+        new_roles.pop(user.id, None)
 
-        # Применяем все изменения одной транзакцией:
+        # Применяем все изменения одной транзакцией и фиксированным числом запросов:
+        # удаление, обновление ролей и вставка новых участников
         with transaction.atomic():
-            for participant in old_participants:
-                if participant.user_id not in new_participants_indices:
-                    participant.delete()
-                else:
-                    if participant.role != new_participants_indices[participant.user_id]['role']:
-                        participant.role = new_participants_indices[participant.user_id]['role']
-                        participant.save()
-                    new_participants_indices.pop(participant.user_id)
-            for new_participant in new_participants_indices.values():
-                BoardParticipant.objects.create(board=instance,
-                                                user=new_participant['user'],
-                                                role=new_participant['role'])
+            old_participants = {participant.user_id: participant
+                                for participant in instance.participants.exclude(user=user)}
+            removed = old_participants.keys() - new_roles.keys()
+            if removed:
+                instance.participants.filter(user_id__in=removed).delete()
+
+            now = timezone.now()
+            changed = []
+            for user_id in old_participants.keys() & new_roles.keys():
+                participant = old_participants[user_id]
+                if participant.role != new_roles[user_id]:
+                    participant.role, participant.updated = new_roles[user_id], now
+                    changed.append(participant)
+            BoardParticipant.objects.bulk_update(changed, ['role', 'updated'])
+
+            # Если участника успели добавить параллельно, ON CONFLICT обновит ему роль вместо ошибки
+            # bulk_create не вызывает save() и сигналы, поэтому даты и сброс кеша ролей делаем сами
+            added = [BoardParticipant(board=instance, user_id=user_id, role=new_roles[user_id],
+                                      created=now, updated=now)
+                     for user_id in new_roles.keys() - old_participants.keys()]
+            BoardParticipant.objects.bulk_create(added, update_conflicts=True, unique_fields=['user_id', 'board_id'],
+                                                 update_fields=['role', 'updated'])
+            user_ids = [participant.user_id for participant in changed + added]
+            invalidate_board_roles(*user_ids)
+            publish_participants(instance.id, user_ids)
+
             instance.title = validated_data.get('title', instance.title)
             instance.save()
 
         return instance
 
+    def to_representation(self, instance):
+        # Участников вместе с пользователями загружаем одним запросом
+        if 'participants' not in getattr(instance, '_prefetched_objects_cache', {}):
+            prefetch_related_objects([instance], Prefetch('participants',
+                                                          queryset=BoardParticipant.objects.select_related('user')))
+        return super().to_representation(instance)
+
+
+class BoardListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    # Аннотации BoardListView
+    role = serializers.ChoiceField(choices=BoardParticipant.Roles.choices, read_only=True)
+    participants_count = serializers.IntegerField(read_only=True)
+    categories_count = serializers.IntegerField(read_only=True)
+    goals_count = serializers.IntegerField(read_only=True)
 
-class BoardListSerializer(serializers.ModelSerializer):
     class Meta:
         model = Board
         fields = '__all__'
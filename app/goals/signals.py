@@ -0,0 +1,38 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from goals.broker import publish_participants
+from goals.membership import invalidate_board_roles
+from goals.models import BoardParticipant, BoardEvent, BoardGoalStats, GoalCategory, Goal, GoalComment
+
+
+@receiver([post_save, post_delete], sender=BoardParticipant)
+def participant_changed(sender, instance: BoardParticipant, **kwargs):
+    invalidate_board_roles(instance.user_id)
+    publish_participants(instance.board_id, [instance.user_id])
+
+
+@receiver([post_save, post_delete], sender=GoalCategory)
+def record_category_event(sender, instance: GoalCategory, **kwargs):
+    BoardEvent.objects.record(BoardEvent.Entity.category, [(instance.board_id, instance.id)])
+
+
+@receiver([post_save, post_delete], sender=Goal)
+def record_goal_event(sender, instance: Goal, **kwargs):
+    # Цель, переехавшая на другую доску, для участников старой доски удалена
+    pairs = [(instance.board_id, instance.id)]
+    previous_board_id = getattr(instance, '_loaded_board_id', None)
+    if previous_board_id is not None and previous_board_id != instance.board_id:
+        pairs.append((previous_board_id, instance.id))
+    BoardEvent.objects.record(BoardEvent.Entity.goal, pairs)
+
+
+@receiver(post_delete, sender=Goal)
+def subtract_goal_stats(sender, instance: Goal, **kwargs):
+    # Если цель загружена из базы, вычитаем ту строку, в которой она учтена, а не несохраненные значения
+    BoardGoalStats.objects.move(getattr(instance, '_loaded_stats_key', instance.stats_key), None)
+
+
+@receiver([post_save, post_delete], sender=GoalComment)
+def record_comment_event(sender, instance: GoalComment, **kwargs):
+    BoardEvent.objects.record(BoardEvent.Entity.comment, [(instance.board_id, instance.id)])
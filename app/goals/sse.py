@@ -0,0 +1,99 @@
+import asyncio
+import json
+from importlib import import_module
+from io import BytesIO
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+
+from goals.broker import get_bus, RESET
+from goals.membership import load_board_roles
+
+HEADERS = [
+    (b'content-type', b'text/event-stream; charset=utf-8'),
+    (b'cache-control', b'no-cache'),
+    # Чтобы nginx не копил события в буфере
+    (b'x-accel-buffering', b'no'),
+]
+
+
+@sync_to_async
+def authenticate(scope) -> tuple[int | None, list[int]]:
+    # Та же сессия, что и у REST API: пользователя берем по session cookie
+    try:
+        request = ASGIRequest(scope, BytesIO())
+        session_store = import_module(settings.SESSION_ENGINE).SessionStore
+        request.session = session_store(request.COOKIES.get(settings.SESSION_COOKIE_NAME))
+        user = get_user(request)
+        if not user.is_authenticated:
+            return None, []
+        return user.id, list(load_board_roles(user.id))
+    finally:
+        close_old_connections()
+
+
+@sync_to_async
+def get_board_ids(user_id: int) -> list[int]:
+    try:
+        return list(load_board_roles(user_id))
+    finally:
+        close_old_connections()
+
+
+def format_event(message: dict) -> bytes:
+    return f'event: {message["entity"]}\ndata: {json.dumps(message, separators=(",", ":"))}\n\n'.encode('utf-8')
+
+
+async def wait_disconnect(receive) -> None:
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def stream(send, subscription) -> None:
+    bus = get_bus()
+    await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+    while True:
+        try:
+            message = await asyncio.wait_for(subscription.queue.get(), settings.GOALS_EVENTS_HEARTBEAT)
+        except asyncio.TimeoutError:
+            # Комментарий не доходит до обработчиков клиента, но не дает прокси закрыть соединение
+            await send({'type': 'http.response.body', 'body': b': ping\n\n', 'more_body': True})
+            continue
+
+        if message['entity'] == 'participant' and subscription.user_id in message['users']:
+            # Пользователя добавили на доску или убрали с нее – меняем набор досок подписки
+            bus.resubscribe(subscription, await get_board_ids(subscription.user_id))
+        await send({'type': 'http.response.body', 'body': format_event(message), 'more_body': True})
+        if message is RESET:
+            break
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+# Комментарий для себя
+# Django 4.1 не умеет отдавать потоковый ответ из асинхронного кода, поэтому SSE – отдельное ASGI приложение,
+# которое ToDoList/asgi.py ставит перед Django. Ожидающее соединение – это подписка с очередью и две корутины,
+# потоков и соединений с базой оно не держит, так что один воркер держит тысячи клиентов.
+# События – только уведомления (доска, тип, id). Сами данные и пропущенные за время обрыва изменения
+# клиент забирает через goals/sync по своему токену, поэтому Last-Event-ID не нужен.
+async def application(scope, receive, send) -> None:
+    user_id, board_ids = await authenticate(scope)
+    if user_id is None:
+        await send({'type': 'http.response.start', 'status': 403, 'headers': [(b'content-type', b'text/plain; charset=utf-8')]})
+        await send({'type': 'http.response.body', 'body': 'Учетные данные не были предоставлены.'.encode('utf-8')})
+        return
+
+    bus = get_bus()
+    subscription = bus.subscribe(user_id, board_ids)
+    try:
+        await send({'type': 'http.response.start', 'status': 200, 'headers': HEADERS})
+        tasks = [asyncio.ensure_future(stream(send, subscription)), asyncio.ensure_future(wait_disconnect(receive))]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            task.result()
+    finally:
+        bus.unsubscribe(subscription)
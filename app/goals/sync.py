@@ -0,0 +1,113 @@
+import hashlib
+import json
+from base64 import b64decode, b64encode
+from binascii import Error as BinasciiError
+from datetime import timedelta
+from typing import NamedTuple
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from goals.membership import get_board_roles
+from goals.models import BoardEvent, GoalCategory, Goal, GoalComment
+from goals.serializers import ListGoalCategorySerializer, ListGoalSerializer, CommentSerializer
+
+Entity = BoardEvent.Entity
+
+ENTITY_KEYS = {Entity.category: 'categories', Entity.goal: 'goals', Entity.comment: 'comments'}
+SERIALIZERS = {
+    Entity.category: ListGoalCategorySerializer,
+    Entity.goal: ListGoalSerializer,
+    Entity.comment: CommentSerializer,
+}
+
+
+class SyncToken(NamedTuple):
+    txid: int
+    event_id: int
+    boards: str
+    issued: int
+
+
+def encode_token(token: SyncToken) -> str:
+    return b64encode(json.dumps(token._asdict(), separators=(',', ':')).encode('utf-8')).decode('ascii')
+
+
+def decode_token(encoded: str) -> SyncToken:
+    try:
+        token = SyncToken(**json.loads(b64decode(encoded.encode('ascii')).decode('utf-8')))
+    except (TypeError, ValueError, BinasciiError, UnicodeError):
+        token = None
+    # Токен приходит от клиента: поле не того типа дошло бы до SQL и дало 500 вместо 400
+    if token is None or type(token.boards) is not str or \
+            any(type(value) is not int for value in (token.txid, token.event_id, token.issued)):
+        raise ValidationError({'token': ['Неверный токен синхронизации']})
+    return token
+
+
+def boards_digest(board_ids) -> str:
+    return hashlib.md5(','.join(map(str, sorted(board_ids))).encode('ascii')).hexdigest()
+
+
+def current_xmin() -> int:
+    # Все транзакции с номером меньше xmin уже завершены, их события больше не появятся
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_snapshot_xmin(pg_current_snapshot())::text::bigint')
+        return cursor.fetchone()[0]
+
+
+def get_live_querysets(board_ids) -> dict:
+    return {
+        Entity.category: GoalCategory.objects.select_related('user').filter(board_id__in=board_ids),
+        Entity.goal: Goal.objects.select_related('user').filter(board_id__in=board_ids),
+        Entity.comment: GoalComment.objects.select_related('user').filter(board_id__in=board_ids),
+    }
+
+
+# Комментарий для себя
+# Позиция в журнале – пара (txid, id). События отдаем только из завершенных транзакций (txid < xmin),
+# иначе транзакция, начавшаяся раньше, но закоммиченная позже, получила бы id меньше уже выданного токена
+# и клиент ее пропустил бы. Долгая транзакция задерживает синхронизацию, но ничего не теряется.
+# Из событий берем только id объектов, а состояние читаем из таблиц: если объекта нет среди видимых
+# пользователю, клиент получает его в deleted.
+# reset = True означает, что клиент должен перечитать списки целиком: токена нет, он устарел
+# (журнал старше SYNC_EVENTS_RETENTION_DAYS удаляется) или изменился набор досок пользователя.
+# Все читаем в транзакции основной базы (роутер внутри нее не отдает чтение репликам): xmin берется
+# с основной, и отстающая реплика вернула бы события ниже xmin не полностью – токен перескочил бы через них.
+@transaction.atomic
+def get_changes(request, encoded_token: str | None, limit: int) -> dict:
+    board_ids = get_board_roles(request).keys()
+    digest = boards_digest(board_ids)
+    xmin = current_xmin()
+    now = int(timezone.now().timestamp())
+    changes = {key: [] for key in ENTITY_KEYS.values()}
+    changes['deleted'] = {key: [] for key in ENTITY_KEYS.values()}
+
+    token = decode_token(encoded_token) if encoded_token else None
+    expired = now - timedelta(days=settings.SYNC_EVENTS_RETENTION_DAYS).total_seconds()
+    if token is None or token.boards != digest or token.issued < expired:
+        return {'token': encode_token(SyncToken(xmin, 0, digest, now)), 'reset': True, 'has_more': False, **changes}
+
+    events = list(BoardEvent.objects.filter(board_id__in=board_ids, txid__lt=xmin).filter(
+        Q(txid__gt=token.txid) | Q(txid=token.txid, id__gt=token.event_id)
+    ).order_by('txid', 'id').values_list('txid', 'id', 'entity', 'object_id')[:limit + 1])
+    has_more = len(events) > limit
+    events = events[:limit]
+    position = events[-1][:2] if has_more else (xmin, 0)
+
+    touched = {entity: set() for entity in ENTITY_KEYS}
+    for _, _, entity, object_id in events:
+        touched[entity].add(object_id)
+    for entity, queryset in get_live_querysets(board_ids).items():
+        if not touched[entity]:
+            continue
+        objects = queryset.in_bulk(touched[entity])
+        serializer = SERIALIZERS[entity](objects.values(), many=True, context={'request': request})
+        changes[ENTITY_KEYS[entity]] = serializer.data
+        changes['deleted'][ENTITY_KEYS[entity]] = sorted(touched[entity] - objects.keys())
+
+    return {'token': encode_token(SyncToken(*position, digest, now)), 'reset': False, 'has_more': has_more,
+            **changes}
@@ -1,11 +1,37 @@
+import asyncio
+import base64
+import csv
+import gzip
+import io
+import json
+import threading
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from asgiref.testing import ApplicationCommunicator
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.db.models import F, Sum
+from django.test import override_settings, RequestFactory
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from parameterized import parameterized
 from rest_framework import status
 from rest_framework.reverse import reverse
-from rest_framework.test import APITestCase
+from rest_framework.test import APITestCase, APITransactionTestCase
 from django.urls import reverse
 from core.models import User
-from goals.models import Board, BoardParticipant, GoalCategory
+from core.routers import replica_alias
+from goals.bench import SCENARIOS, route_names
+from goals.seed import SeedOptions, seed, busiest_user
+from goals.membership import load_board_roles
+from goals.sse import application
+from ToDoList.asgi import application as asgi_application
+from goals.sync import get_changes
+from goals.models import Board, BoardEvent, BoardParticipant, BoardGoalStats, GoalCategory, Goal, GoalComment, \
+    ArchivedGoal, ArchivedGoalComment
 
 
 class BoardCreateTest(APITestCase):
@@ -110,17 +136,25 @@ class BoardListTest(APITestCase):
                                      "created": timezone.localtime(self.board_2.created).isoformat(),
                                      "updated": timezone.localtime(self.board_2.updated).isoformat(),
                                      "title": "a_test_board",
-                                     "is_deleted": False
+                                     "is_deleted": False,
+                                     "role": BoardParticipant.Roles.writer,
+                                     "participants_count": 1,
+                                     "categories_count": 0,
+                                     "goals_count": 0
                                  },
                                  {
                                      "id": self.board_1.id,
                                      "created": timezone.localtime(self.board_1.created).isoformat(),
                                      "updated": timezone.localtime(self.board_1.updated).isoformat(),
                                      "title": "z_test_board",
-                                     "is_deleted": False
+                                     "is_deleted": False,
+                                     "role": BoardParticipant.Roles.owner,
+                                     "participants_count": 1,
+                                     "categories_count": 0,
+                                     "goals_count": 0
                                  }
                             ]
-        self.assertListEqual(response.json(), response_expected)
+        self.assertListEqual(response.json()['results'], response_expected)
 
     def test_deleted_board_does_not_display(self):
         deleted_board = Board.objects.create(title='b_test_board', is_deleted=True)
@@ -134,17 +168,51 @@ class BoardListTest(APITestCase):
                 "created": timezone.localtime(self.board_2.created).isoformat(),
                 "updated": timezone.localtime(self.board_2.updated).isoformat(),
                 "title": "a_test_board",
-                "is_deleted": False
+                "is_deleted": False,
+                "role": BoardParticipant.Roles.writer,
+                "participants_count": 1,
+                "categories_count": 0,
+                "goals_count": 0
             },
             {
                 "id": self.board_1.id,
                 "created": timezone.localtime(self.board_1.created).isoformat(),
                 "updated": timezone.localtime(self.board_1.updated).isoformat(),
                 "title": "z_test_board",
-                "is_deleted": False
+                "is_deleted": False,
+                "role": BoardParticipant.Roles.owner,
+                "participants_count": 1,
+                "categories_count": 0,
+                "goals_count": 0
             }
         ]
-        self.assertListEqual(response.json(), response_expected)
+        self.assertListEqual(response.json()['results'], response_expected)
+
+    def test_counts_in_single_query(self):
+        reader = User.objects.create_user(username='reader', password='!@#qwe123')
+        BoardParticipant.objects.create(board=self.board_1, user=reader, role=BoardParticipant.Roles.reader)
+        category = GoalCategory.objects.create(board=self.board_1, title='category', user=self.user)
+        GoalCategory.objects.create(board=self.board_1, title='deleted', user=self.user, is_deleted=True)
+        for goal_status in (Goal.Status.to_do, Goal.Status.done, Goal.Status.archived):
+            Goal.objects.create(title='goal', category=category, user=self.user, status=goal_status,
+                                due_date=timezone.now())
+        self.client.force_login(self.user)
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Страница досок со всеми счетчиками – один запрос
+        self.assertEqual(sum('ORDER BY' in query['sql'] for query in context.captured_queries), 1)
+        board = response.json()['results'][1]
+        self.assertEqual((board['role'], board['participants_count'], board['categories_count'],
+                          board['goals_count']), (BoardParticipant.Roles.owner, 2, 1, 2))
+
+        # Счетчики изменились, а сама доска нет – ETag другой
+        etag = response['ETag']
+        Goal.objects.create(title='goal', category=category, user=self.user, due_date=timezone.now())
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['results'][1]['goals_count'], 3)
 
 
 class GoalListTest(APITestCase):
@@ -197,4 +265,887 @@ class GoalListTest(APITestCase):
                 "board": self.board_1.id
             }
         ]
-        self.assertListEqual(response.json(), response_expected)
+        self.assertListEqual(response.json()['results'], response_expected)
+
+
+class GoalListPaginationTest(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.board = Board.objects.create(title='test_board')
+        BoardParticipant.objects.create(board=self.board, user=self.user, role=BoardParticipant.Roles.owner)
+        self.category = GoalCategory.objects.create(board=self.board, title='test_category', user=self.user)
+        # Одинаковые приоритеты, чтобы проверить однозначность порядка при равных значениях
+        self.goals = [
+            Goal.objects.create(title=f'goal_{i}', category=self.category, user=self.user,
+                                priority=Goal.Priority.high if i % 2 else Goal.Priority.low,
+                                due_date=timezone.now())
+            for i in range(7)
+        ]
+        self.url = reverse('list-goal')
+        self.client.force_login(self.user)
+
+    def _walk(self, params: dict) -> list[int]:
+        ids = []
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids.extend(goal['id'] for goal in response.json()['results'])
+            if not response.json()['next']:
+                return ids
+            response = self.client.get(response.json()['next'])
+
+    @parameterized.expand([
+        ('title', 'title'),
+        ('priority', '-priority'),
+        ('due_date', 'due_date'),
+        ('created', '-created'),
+    ])
+    def test_pages_follow_ordering(self, _, ordering: str):
+        expected = list(Goal.objects.order_by(ordering, '-id' if ordering.startswith('-') else 'id')
+                        .values_list('id', flat=True))
+        self.assertListEqual(self._walk({'ordering': ordering, 'limit': 2}), expected)
+
+    def test_previous_page(self):
+        first_page = self.client.get(self.url, {'limit': 3}).json()
+        second_page = self.client.get(first_page['next']).json()
+        self.assertIsNone(first_page['previous'])
+        response = self.client.get(second_page['previous'])
+        self.assertListEqual(response.json()['results'], first_page['results'])
+
+    def test_page_size_is_limited(self):
+        Goal.objects.bulk_create([
+            Goal(title='bulk', category=self.category, board=self.board, user=self.user, due_date=timezone.now(),
+                 created=timezone.now(), updated=timezone.now())
+            for _ in range(120)
+        ])
+        response = self.client.get(self.url, {'limit': 1000})
+        self.assertEqual(len(response.json()['results']), 100)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {'cursor': 'broken'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class GoalBoardSyncTest(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.board_1 = Board.objects.create(title='board_1')
+        self.board_2 = Board.objects.create(title='board_2')
+        for board in (self.board_1, self.board_2):
+            BoardParticipant.objects.create(board=board, user=self.user, role=BoardParticipant.Roles.owner)
+        self.cat_1 = GoalCategory.objects.create(board=self.board_1, title='category_1', user=self.user)
+        self.cat_2 = GoalCategory.objects.create(board=self.board_2, title='category_2', user=self.user)
+        self.client.force_login(self.user)
+
+    def test_goal_and_comments_follow_category_board(self):
+        response = self.client.post(reverse('create-goal'), {'title': 'goal', 'category': self.cat_1.id,
+                                                             'due_date': timezone.now().isoformat()})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        goal = Goal.objects.get(id=response.json()['id'])
+        self.assertEqual(goal.board_id, self.board_1.id)
+
+        self.client.post(reverse('create-comment'), {'goal': goal.id, 'text': 'comment'})
+        self.assertEqual(goal.comments.get().board_id, self.board_1.id)
+
+        response = self.client.patch(reverse('retrieve-update-delete-goal', kwargs={'pk': goal.id}),
+                                     {'category': self.cat_2.id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        goal.refresh_from_db()
+        self.assertEqual(goal.board_id, self.board_2.id)
+        self.assertEqual(goal.comments.get().board_id, self.board_2.id)
+
+    def test_goal_is_hidden_from_non_participant(self):
+        goal = Goal.objects.create(title='goal', category=self.cat_1, user=self.user, due_date=timezone.now())
+        stranger = User.objects.create_user(username='stranger', password='!@#qwe123')
+        self.client.force_login(stranger)
+        response = self.client.get(reverse('retrieve-update-delete-goal', kwargs={'pk': goal.id}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SoftDeleteManagerTest(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.board = Board.objects.create(title='board')
+        BoardParticipant.objects.create(board=self.board, user=self.user, role=BoardParticipant.Roles.owner)
+        self.category = GoalCategory.objects.create(board=self.board, title='category', user=self.user)
+        self.goals = [Goal.objects.create(title=f'goal_{i}', category=self.category, user=self.user,
+                                          due_date=timezone.now()) for i in range(2)]
+        self.client.force_login(self.user)
+
+    def test_archived_goal_is_hidden_by_default(self):
+        self.client.delete(reverse('retrieve-update-delete-goal', kwargs={'pk': self.goals[0].pk}))
+        self.assertListEqual(list(Goal.objects.values_list('id', flat=True)), [self.goals[1].id])
+        self.assertListEqual(list(self.category.goals.values_list('id', flat=True)), [self.goals[1].id])
+        self.assertEqual(Goal.with_archived.count(), 2)
+
+    def test_deleted_board_hides_categories_and_goals(self):
+        response = self.client.delete(reverse('retrieve-update-delete-board', kwargs={'pk': self.board.pk}))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Board.objects.exists())
+        self.assertFalse(GoalCategory.objects.exists())
+        self.assertFalse(Goal.objects.exists())
+        self.assertTrue(GoalCategory.with_archived.get(id=self.category.id).is_deleted)
+        self.assertEqual(Goal.with_archived.filter(status=Goal.Status.archived).count(), 2)
+
+        response = self.client.post(reverse('create-category'), {'board': self.board.id, 'title': 'category'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertListEqual(response.json()['board'], ['Нет прав для удаления категории'])
+
+
+class ConditionalGetTest(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.board = Board.objects.create(title='board')
+        BoardParticipant.objects.create(board=self.board, user=self.user, role=BoardParticipant.Roles.owner)
+        self.category = GoalCategory.objects.create(board=self.board, title='category', user=self.user)
+        self.goals = [Goal.objects.create(title=f'goal_{i}', category=self.category, user=self.user,
+                                          due_date=timezone.now()) for i in range(3)]
+        self.client.force_login(self.user)
+
+    def test_goal_list_not_modified(self):
+        url = reverse('list-goal')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertFalse(any('ORDER BY' in query['sql'] for query in context.captured_queries))
+
+        # Другая страница или сортировка - другой ETag
+        response = self.client.get(url, {'ordering': '-created'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @parameterized.expand([
+        ('update', lambda goal: goal.save()),
+        ('archive', lambda goal: Goal.objects.filter(id=goal.id).update(status=Goal.Status.archived)),
+    ])
+    def test_goal_list_modified(self, _, change):
+        url = reverse('list-goal')
+        etag = self.client.get(url)['ETag']
+        change(self.goals[0])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_goal_detail_not_modified(self):
+        url = reverse('retrieve-update-delete-goal', kwargs={'pk': self.goals[0].pk})
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        response_304 = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response_304.status_code, status.HTTP_304_NOT_MODIFIED)
+        response_304 = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response_304.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        self.client.patch(url, {'title': 'new_title'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['title'], 'new_title')
+
+
+class BoardMembershipTest(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.board = Board.objects.create(title='board')
+        BoardParticipant.objects.create(board=self.board, user=self.user, role=BoardParticipant.Roles.owner)
+        self.category = GoalCategory.objects.create(board=self.board, title='category', user=self.user)
+        self.goal = Goal.objects.create(title='goal', category=self.category, user=self.user, due_date=timezone.now())
+        self.url = reverse('retrieve-update-delete-goal', kwargs={'pk': self.goal.pk})
+        self.client.force_login(self.user)
+        cache.clear()
+
+    @staticmethod
+    def _participant_queries(context: CaptureQueriesContext) -> int:
+        return sum('goals_boardparticipant' in query['sql'] for query in context.captured_queries)
+
+    def test_goal_patch_loads_membership_once(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.patch(self.url, {'category': self.category.id, 'title': 'new_title'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._participant_queries(context), 1)
+
+    @override_settings(BOARD_ROLES_CACHE_TIMEOUT=60)
+    def test_cached_membership_is_reset_on_participant_change(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self._participant_queries(context), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            BoardParticipant.objects.filter(user=self.user).get().delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_reader_can_not_edit_own_goal(self):
+        reader = User.objects.create_user(username='reader', password='!@#qwe123')
+        BoardParticipant.objects.create(board=self.board, user=reader, role=BoardParticipant.Roles.reader)
+        goal = Goal.objects.create(title='goal', category=self.category, user=reader, due_date=timezone.now())
+        self.client.force_login(reader)
+        response = self.client.patch(reverse('retrieve-update-delete-goal', kwargs={'pk': goal.pk}),
+                                     {'title': 'new_title'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class BoardRolesReplicaTest(APITransactionTestCase):
+
+    @override_settings(BOARD_ROLES_CACHE_TIMEOUT=60)
+    def test_cached_roles_read_from_primary(self):
+        cache.clear()
+        user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        board = Board.objects.create(title='board')
+        BoardParticipant.objects.create(board=board, user=user, role=BoardParticipant.Roles.owner)
+        # Запрос, которому middleware выбрало реплику; такой базы нет, и любое чтение с нее упадет
+        reset = replica_alias.set('lagging_replica')
+        try:
+            roles = load_board_roles(user.id)
+        finally:
+            replica_alias.reset(reset)
+        self.assertDictEqual(roles, {board.id: BoardParticipant.Roles.owner})
+
+
+class BoardParticipantSyncTest(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.users = [User.objects.create_user(username=f'member_{i}', password='!@#qwe123') for i in range(40)]
+        self.board = Board.objects.create(title='board')
+        BoardParticipant.objects.create(board=self.board, user=self.user, role=BoardParticipant.Roles.owner)
+        for user in self.users[:4]:
+            BoardParticipant.objects.create(board=self.board, user=user, role=BoardParticipant.Roles.reader)
+        self.url = reverse('retrieve-update-delete-board', kwargs={'pk': self.board.pk})
+        self.client.force_login(self.user)
+
+    def _put(self, members: dict[str, int]):
+        return self.client.put(self.url, {
+            'title': 'new_title',
+            'participants': [{'user': username, 'role': role} for username, role in members.items()],
+        }, format='json')
+
+    def test_participants_sync(self):
+        reader, writer = BoardParticipant.Roles.reader, BoardParticipant.Roles.writer
+        response = self._put({'member_0': reader, 'member_1': writer, 'member_5': writer, 'test_user': reader})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()['title'], 'new_title')
+        self.assertDictEqual(
+            dict(self.board.participants.values_list('user__username', 'role')),
+            {'test_user': BoardParticipant.Roles.owner, 'member_0': reader, 'member_1': writer, 'member_5': writer},
+        )
+        self.assertEqual(len(response.json()['participants']), 4)
+
+    def test_statement_count_does_not_depend_on_members(self):
+        reader, writer = BoardParticipant.Roles.reader, BoardParticipant.Roles.writer
+
+        def count_queries(members: dict[str, int]) -> int:
+            with CaptureQueriesContext(connection) as context:
+                response = self._put(members)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            return len(context.captured_queries)
+
+        # В обоих случаях есть удаление, смена роли и добавление, отличается только число участников
+        few = count_queries({'member_0': writer, 'member_4': reader, 'member_5': reader})
+        many = count_queries({'member_0': reader, 'member_4': writer,
+                              **{user.username: reader for user in self.users[6:]}})
+        self.assertEqual(few, many)
+        self.assertEqual(self.board.participants.count(), 37)
+
+    def test_unknown_username(self):
+        response = self._put({'member_0': BoardParticipant.Roles.reader, 'nobody': BoardParticipant.Roles.reader})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.board.participants.count(), 5)
+
+
+class GoalBatchTest(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.board = Board.objects.create(title='board')
+        self.foreign_board = Board.objects.create(title='foreign_board')
+        BoardParticipant.objects.create(board=self.board, user=self.user, role=BoardParticipant.Roles.owner)
+        BoardParticipant.objects.create(board=self.foreign_board, user=self.user, role=BoardParticipant.Roles.reader)
+        self.category = GoalCategory.objects.create(board=self.board, title='category', user=self.user)
+        self.foreign_category = GoalCategory.objects.create(board=self.foreign_board, title='foreign', user=self.user)
+        self.goals = [Goal.objects.create(title=f'goal_{i}', category=self.category, user=self.user,
+                                          due_date=timezone.now()) for i in range(3)]
+        self.url = reverse('batch-goal')
+        self.client.force_login(self.user)
+
+    def test_auth_required(self):
+        self.client.logout()
+        response = self.client.post(self.url, {})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_batch(self):
+        due_date = timezone.now().isoformat()
+        response = self.client.post(self.url, {
+            'create': [
+                {'title': 'new_1', 'category': self.category.id, 'due_date': due_date},
+                {'title': 'new_2', 'category': self.foreign_category.id, 'due_date': due_date},
+                {'title': 'new_3', 'category': self.category.id},
+            ],
+            'patch': [
+                {'id': self.goals[0].id, 'status': Goal.Status.done},
+                {'id': self.goals[1].id, 'category': self.foreign_category.id},
+            ],
+            'archive': [self.goals[2].id, self.goals[0].id],
+        })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = [(result['op'], result['index'], result['status']) for result in response.json()['results']]
+        self.assertListEqual(results, [
+            ('create', 0, 'ok'), ('create', 1, 'error'), ('create', 2, 'error'),
+            ('patch', 0, 'ok'), ('patch', 1, 'error'),
+            ('archive', 0, 'ok'), ('archive', 1, 'error'),
+        ])
+
+        new_goal = Goal.objects.get(id=response.json()['results'][0]['id'])
+        self.assertEqual((new_goal.title, new_goal.board_id), ('new_1', self.board.id))
+        self.assertEqual(Goal.objects.get(id=self.goals[0].id).status, Goal.Status.done)
+        self.assertEqual(Goal.objects.get(id=self.goals[1].id).category_id, self.category.id)
+        self.assertEqual(Goal.with_archived.get(id=self.goals[2].id).status, Goal.Status.archived)
+
+    def test_operations_limit(self):
+        response = self.client.post(self.url, {'archive': list(range(501))})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BoardSummaryTest(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.board = Board.objects.create(title='board')
+        BoardParticipant.objects.create(board=self.board, user=self.user, role=BoardParticipant.Roles.owner)
+        self.category = GoalCategory.objects.create(board=self.board, title='category', user=self.user)
+        self.other_category = GoalCategory.objects.create(board=self.board, title='other', user=self.user)
+        now = timezone.now()
+        self.goals = [
+            Goal.objects.create(title='overdue', category=self.category, user=self.user,
+                                due_date=now - timezone.timedelta(days=1)),
+            Goal.objects.create(title='done', category=self.category, user=self.user, status=Goal.Status.done,
+                                due_date=now - timezone.timedelta(days=1)),
+            Goal.objects.create(title='high', category=self.other_category, user=self.user,
+                                priority=Goal.Priority.high, due_date=now + timezone.timedelta(days=1)),
+        ]
+        self.url = reverse('summary-board')
+        self.client.force_login(self.user)
+
+    def _stats(self) -> dict:
+        return {(row.board_id, row.status, row.priority): row.count
+                for row in BoardGoalStats.objects.filter(count__gt=0)}
+
+    def _assert_consistent(self):
+        stats = self._stats()
+        BoardGoalStats.objects.rebuild()
+        self.assertDictEqual(stats, self._stats())
+
+    def test_summary(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # Из таблицы целей читаем только просроченные
+        self.assertEqual(sum('FROM "goals_goal"' in query['sql'] for query in context.captured_queries), 1)
+        self.assertDictEqual(response.json()['results'][0], {
+            'board': self.board.id, 'title': 'board', 'total': 3, 'overdue': 1,
+            'by_status': {str(Goal.Status.to_do): 2, str(Goal.Status.done): 1},
+            'by_priority': {str(Goal.Priority.medium): 2, str(Goal.Priority.high): 1},
+        })
+
+    def test_stats_follow_changes(self):
+        self.client.patch(reverse('retrieve-update-delete-goal', kwargs={'pk': self.goals[0].pk}),
+                          {'status': Goal.Status.in_progress, 'priority': Goal.Priority.low})
+        self.client.delete(reverse('retrieve-update-delete-goal', kwargs={'pk': self.goals[1].pk}))
+        self.client.post(reverse('batch-goal'), {
+            'create': [{'title': 'new', 'category': self.category.id, 'due_date': timezone.now().isoformat()}],
+            'patch': [{'id': self.goals[0].id, 'status': Goal.Status.done}],
+        }, format='json')
+        self._assert_consistent()
+        self.assertEqual(self.client.get(self.url).json()['results'][0]['total'], 3)
+
+        self.client.delete(reverse('retrieve-update-delete-category', kwargs={'pk': self.other_category.pk}))
+        self._assert_consistent()
+        Goal.objects.get(id=self.goals[0].id).delete()
+        self._assert_consistent()
+
+        self.client.delete(reverse('retrieve-update-delete-board', kwargs={'pk': self.board.pk}))
+        self.assertDictEqual(self._stats(), {})
+
+
+class GoalColdStorageTest(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.board = Board.objects.create(title='board')
+        BoardParticipant.objects.create(board=self.board, user=self.user, role=BoardParticipant.Roles.owner)
+        self.category = GoalCategory.objects.create(board=self.board, title='category', user=self.user)
+        self.old, self.recent, self.live = [
+            Goal.objects.create(title=title, category=self.category, user=self.user, due_date=timezone.now(),
+                                status=goal_status)
+            for title, goal_status in [('old', Goal.Status.archived), ('recent', Goal.Status.archived),
+                                       ('live', Goal.Status.to_do)]
+        ]
+        self.comment = GoalComment.objects.create(goal=self.old, user=self.user, text='comment')
+        Goal.with_archived.filter(id=self.old.id).update(updated=timezone.now() - timezone.timedelta(days=365))
+        self.client.force_login(self.user)
+
+    def test_archive_moves_old_goals_with_comments(self):
+        call_command('archive_goals', stdout=io.StringIO())
+        self.assertListEqual(list(ArchivedGoal.objects.values_list('id', flat=True)), [self.old.id])
+        self.assertListEqual(list(ArchivedGoalComment.objects.values_list('id', flat=True)), [self.comment.id])
+        self.assertFalse(Goal.with_archived.filter(id=self.old.id).exists())
+        self.assertFalse(GoalComment.objects.exists())
+
+        response = self.client.get(reverse('list-archived-goal'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual([(goal['id'], goal['is_cold']) for goal in response.json()['results']],
+                             [(self.recent.id, False), (self.old.id, True)])
+
+        response = self.client.get(reverse('retrieve-archived-goal', kwargs={'pk': self.old.pk}))
+        self.assertListEqual([comment['text'] for comment in response.json()['comments']], ['comment'])
+
+    def test_conditional_get_sees_move_to_cold_storage(self):
+        list_url = reverse('list-archived-goal')
+        detail_url = reverse('retrieve-archived-goal', kwargs={'pk': self.old.pk})
+        list_etag, detail_etag = self.client.get(list_url)['ETag'], self.client.get(detail_url)['ETag']
+        call_command('archive_goals', stdout=io.StringIO())
+
+        response = self.client.get(list_url, HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn((self.old.id, True), [(goal['id'], goal['is_cold']) for goal in response.json()['results']])
+        response = self.client.get(detail_url, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.json()['is_cold'])
+
+    @parameterized.expand([('cold', True), ('hot', False)])
+    def test_restore(self, _, archive):
+        if archive:
+            call_command('archive_goals', stdout=io.StringIO())
+        response = self.client.post(reverse('restore-archived-goal', kwargs={'pk': self.old.pk}),
+                                    {'status': Goal.Status.in_progress})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Goal.objects.get(id=self.old.id).status, Goal.Status.in_progress)
+        self.assertListEqual(list(GoalComment.objects.values_list('id', flat=True)), [self.comment.id])
+        self.assertFalse(ArchivedGoal.objects.exists())
+        self.assertEqual(BoardGoalStats.objects.get(board=self.board, status=Goal.Status.in_progress).count, 1)
+
+        response = self.client.post(reverse('restore-archived-goal', kwargs={'pk': self.old.pk}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_restore_into_deleted_category(self):
+        call_command('archive_goals', stdout=io.StringIO())
+        self.client.delete(reverse('retrieve-update-delete-category', kwargs={'pk': self.category.pk}))
+        response = self.client.post(reverse('restore-archived-goal', kwargs={'pk': self.old.pk}))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(ArchivedGoal.objects.filter(id=self.old.id).exists())
+
+
+class SeedTest(APITestCase):
+
+    def test_seed(self):
+        users = seed(SeedOptions(users=5, boards=6, goals=200, comments=50, prefix='seed_test'))
+        self.assertEqual(Board.with_archived.count(), 6)
+        self.assertEqual(Goal.with_archived.count(), 200)
+        self.assertEqual(GoalComment.objects.count(), 50)
+        # Цели и комментарии пишут только участники их досок
+        self.assertFalse(Goal.with_archived.exclude(board__participants__user=F('user')).exists())
+        self.assertFalse(GoalComment.objects.exclude(board__participants__user=F('user')).exists())
+        self.assertEqual(BoardGoalStats.objects.aggregate(total=Sum('count'))['total'], Goal.objects.count())
+        self.assertIn(busiest_user(users), users)
+
+    def test_every_route_has_bench_scenario(self):
+        self.assertSetEqual(set(route_names()) - SCENARIOS.keys(), set())
+
+
+class BoardExportTest(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.board = Board.objects.create(title='board')
+        BoardParticipant.objects.create(board=self.board, user=self.user, role=BoardParticipant.Roles.reader)
+        self.category = GoalCategory.objects.create(board=self.board, title='категория', user=self.user)
+        self.goals = [Goal.objects.create(title=f'goal_{i}', category=self.category, user=self.user,
+                                          due_date=timezone.now()) for i in range(3)]
+        self.comment = GoalComment.objects.create(goal=self.goals[0], user=self.user, text='comment')
+        self.url = reverse('export-board', kwargs={'pk': self.board.pk})
+        self.client.force_login(self.user)
+
+    def test_ndjson(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertListEqual([row['type'] for row in rows], ['categories'] + ['goals'] * 3 + ['comments'])
+        self.assertEqual(rows[0]['title'], 'категория')
+        self.assertEqual(rows[1]['user'], 'test_user')
+
+    def test_csv_gzip(self):
+        response = self.client.get(self.url, {'output': 'csv', 'entity': 'goals', 'gzip': '1'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        rows = list(csv.reader(gzip.decompress(b''.join(response.streaming_content)).decode('utf-8').splitlines()))
+        self.assertEqual(rows[0][:3], ['id', 'board', 'category'])
+        self.assertListEqual([row[3] for row in rows[1:]], ['goal_0', 'goal_1', 'goal_2'])
+
+    @parameterized.expand([
+        ('csv_without_entity', {'output': 'csv'}),
+        ('unknown_output', {'output': 'xml'}),
+    ])
+    def test_invalid_params(self, _, params: dict):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_not_participant(self):
+        self.client.force_login(User.objects.create_user(username='other', password='!@#qwe123'))
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_cold_storage(self):
+        Goal.objects.filter(id=self.goals[0].id).update(status=Goal.Status.archived,
+                                                        updated=timezone.now() - timezone.timedelta(days=365))
+        call_command('archive_goals', stdout=io.StringIO())
+        self.assertTrue(ArchivedGoalComment.objects.exists())
+        response = self.client.get(self.url)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertListEqual([(row['type'], row['id']) for row in rows if row['type'] != 'categories'],
+                             [('goals', goal.id) for goal in self.goals] + [('comments', self.comment.id)])
+
+
+class BoardExportAsgiTest(APITransactionTestCase):
+    # С настроенными репликами запрос выгрузки читает с них (в тестах это та же база)
+    databases = '__all__'
+
+    def setUp(self) -> None:
+        user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        board = Board.objects.create(title='board')
+        BoardParticipant.objects.create(board=board, user=user, role=BoardParticipant.Roles.reader)
+        category = GoalCategory.objects.create(board=board, title='category', user=user)
+        Goal.objects.create(title='goal', category=category, user=user, due_date=timezone.now())
+        self.client.force_login(user)
+        cookie = f'sessionid={self.client.cookies["sessionid"].value}'.encode('ascii')
+        self.scope = {'type': 'http', 'http_version': '1.1', 'method': 'GET', 'query_string': b'',
+                      'path': reverse('export-board', kwargs={'pk': board.pk}), 'headers': [(b'cookie', cookie)]}
+
+    async def _export(self) -> tuple[int, bytes]:
+        communicator = ApplicationCommunicator(asgi_application, self.scope)
+        await communicator.send_input({'type': 'http.request'})
+        start = await communicator.receive_output(timeout=5)
+        body = b''
+        while True:
+            message = await communicator.receive_output(timeout=5)
+            body += message.get('body', b'')
+            if not message.get('more_body'):
+                return start['status'], body
+
+    def test_export_under_asgi(self):
+        response_status, body = async_to_sync(self._export)()
+        self.assertEqual(response_status, status.HTTP_200_OK)
+        self.assertListEqual([json.loads(line)['type'] for line in body.decode('utf-8').splitlines()],
+                             ['categories', 'goals'])
+
+    def test_concurrent_exports(self):
+        # Каждая выгрузка ждет, пока вторая тоже начнет отдавать данные: в одном потоке они бы не дождались
+        barrier = threading.Barrier(2, timeout=3)
+
+        def slow_export(*args, **kwargs):
+            barrier.wait()
+            yield b'ok'
+
+        async def scenario():
+            return await asyncio.gather(self._export(), self._export())
+
+        with mock.patch('goals.views.iter_export', slow_export):
+            results = async_to_sync(scenario)()
+        self.assertListEqual(results, [(status.HTTP_200_OK, b'ok')] * 2)
+
+
+class GoalImportTest(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.board = Board.objects.create(title='board')
+        self.foreign_board = Board.objects.create(title='foreign_board')
+        BoardParticipant.objects.create(board=self.board, user=self.user, role=BoardParticipant.Roles.owner)
+        BoardParticipant.objects.create(board=self.foreign_board, user=self.user, role=BoardParticipant.Roles.reader)
+        self.category = GoalCategory.objects.create(board=self.board, title='category', user=self.user)
+        self.foreign_category = GoalCategory.objects.create(board=self.foreign_board, title='foreign', user=self.user)
+        self.url = reverse('import-goal')
+        self.client.force_login(self.user)
+
+    def _upload(self, rows: list[list], name: str = 'goals.csv', **data):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(['title', 'category', 'status', 'priority', 'due_date', 'unknown'])
+        writer.writerows(rows)
+        file = SimpleUploadedFile(name, buffer.getvalue().encode('utf-8'))
+        return self.client.post(self.url, {'file': file, **data}, format='multipart')
+
+    def test_import_with_errors(self):
+        due_date = timezone.now().isoformat()
+        response = self._upload([
+            ['goal_1', self.category.id, '', '', due_date, 'x'],
+            ['goal_2', self.category.id, 99, 1, due_date, ''],
+            ['goal_3', self.foreign_category.id, 1, 1, due_date, ''],
+            ['goal_4', self.category.id, Goal.Status.done, Goal.Priority.high, '', ''],
+            ['goal_5', 0, 1, 1, due_date, ''],
+            ['goal_6', self.category.id, Goal.Status.in_progress, Goal.Priority.low, due_date, ''],
+            ['goal_7', 3000000000, 1, 1, due_date, ''],
+            ['goal_8', 2 ** 63, 1, 1, due_date, ''],
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        report = response.json()
+        self.assertEqual((report['rows'], report['created']), (8, 2))
+        self.assertDictEqual({error['row']: list(error['errors']) for error in report['errors']},
+                             {2: ['status'], 3: ['category'], 4: ['due_date'], 5: ['category'], 7: ['category'],
+                              8: ['category']})
+
+        goals = Goal.objects.filter(board=self.board).order_by('id')
+        self.assertListEqual([(goal.title, goal.status, goal.user_id) for goal in goals], [
+            ('goal_1', Goal.Status.to_do, self.user.id), ('goal_6', Goal.Status.in_progress, self.user.id)])
+        self.assertEqual(BoardEvent.objects.filter(entity=BoardEvent.Entity.goal).count(), 2)
+        self.assertEqual(sum(BoardGoalStats.objects.values_list('count', flat=True)), 2)
+
+    def test_statement_count_does_not_depend_on_rows(self):
+        def count_queries(rows: int) -> int:
+            due_date = timezone.now().isoformat()
+            with CaptureQueriesContext(connection) as context:
+                response = self._upload([[f'goal_{i}', self.category.id, 1, 1, due_date, ''] for i in range(rows)])
+            self.assertEqual(response.json()['created'], rows)
+            return len(context.captured_queries)
+
+        self.assertEqual(count_queries(3), count_queries(300))
+
+    def test_dry_run(self):
+        response = self._upload([['goal', self.category.id, 1, 1, timezone.now().isoformat(), '']], dry_run='1')
+        self.assertEqual(response.json()['created'], 0)
+        self.assertFalse(Goal.objects.exists())
+
+    def test_ndjson(self):
+        row = {'title': 'goal', 'category': self.category.id, 'due_date': timezone.now().isoformat(), 'type': 'goals'}
+        content = '\n'.join([json.dumps(row), '{broken', '[1, 2]', '', json.dumps({**row, 'title': 'goal_2'})])
+        file = SimpleUploadedFile('goals.ndjson', content.encode('utf-8'))
+        response = self.client.post(self.url, {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        report = response.json()
+        self.assertEqual((report['rows'], report['created']), (4, 2))
+        self.assertListEqual([error['row'] for error in report['errors']], [2, 3])
+        self.assertListEqual(list(Goal.objects.order_by('id').values_list('title', flat=True)), ['goal', 'goal_2'])
+
+    @parameterized.expand([
+        ('cp1251', 'title,category\nцель,1\n'.encode('cp1251')),
+        ('field_too_large', b'title,category\n"' + b'x' * (csv.field_size_limit() + 1) + b'",1\n'),
+    ])
+    def test_unreadable_file(self, _, content: bytes):
+        file = SimpleUploadedFile('goals.csv', content)
+        response = self.client.post(self.url, {'file': file}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('file', response.json())
+        self.assertFalse(Goal.objects.exists())
+
+
+class GoalSearchTest(APITestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.board = Board.objects.create(title='board')
+        BoardParticipant.objects.create(board=self.board, user=self.user, role=BoardParticipant.Roles.owner)
+        self.category = GoalCategory.objects.create(board=self.board, title='category', user=self.user)
+        self.in_title = Goal.objects.create(title='Купить билеты в театр', category=self.category, user=self.user,
+                                            due_date=timezone.now())
+        self.in_description = Goal.objects.create(title='Выходные', description='Сходить в театры города',
+                                                  category=self.category, user=self.user, due_date=timezone.now())
+        Goal.objects.create(title='Починить велосипед', category=self.category, user=self.user,
+                            due_date=timezone.now())
+        self.url = reverse('list-goal')
+        self.client.force_login(self.user)
+
+    def test_search_by_title_and_description_with_ranking(self):
+        response = self.client.get(self.url, {'search': 'театр'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertListEqual([goal['id'] for goal in response.json()['results']],
+                             [self.in_title.id, self.in_description.id])
+        self.assertNotIn('search_vector', response.json()['results'][0])
+
+    def test_search_vector_follows_updates(self):
+        self.in_title.title = 'Купить велосипед'
+        self.in_title.save()
+        response = self.client.get(self.url, {'search': 'велосипед', 'ordering': 'created'})
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_search_respects_participants(self):
+        self.client.force_login(User.objects.create_user(username='stranger', password='!@#qwe123'))
+        response = self.client.get(self.url, {'search': 'театр'})
+        self.assertListEqual(response.json()['results'], [])
+
+    def test_search_pages(self):
+        response = self.client.get(self.url, {'search': 'театр', 'limit': 1})
+        next_page = self.client.get(response.json()['next']).json()
+        self.assertListEqual([goal['id'] for goal in next_page['results']], [self.in_description.id])
+
+
+# Журнал отдает только события завершенных транзакций, поэтому тест не может жить внутри одной транзакции
+def encode_token_payload(payload) -> str:
+    return base64.b64encode(json.dumps(payload).encode('utf-8')).decode('ascii')
+
+
+class SyncTest(APITransactionTestCase):
+    # С настроенными репликами GET запросы вне транзакции читают с них (в тестах это та же база)
+    databases = '__all__'
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.board = Board.objects.create(title='board')
+        BoardParticipant.objects.create(board=self.board, user=self.user, role=BoardParticipant.Roles.owner)
+        self.category = GoalCategory.objects.create(board=self.board, title='category', user=self.user)
+        self.goal = Goal.objects.create(title='goal', category=self.category, user=self.user, due_date=timezone.now())
+        self.url = reverse('sync')
+        self.client.force_login(self.user)
+
+    def _sync(self, token: str | None = None, **params) -> dict:
+        response = self.client.get(self.url, {'token': token, **params} if token else params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.json()
+
+    def test_auth_required(self):
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_changes_since_token(self):
+        data = self._sync()
+        self.assertTrue(data['reset'])
+        data = self._sync(data['token'])
+        self.assertFalse(data['reset'])
+        self.assertEqual(data['goals'], [])
+
+        new_goal = Goal.objects.create(title='new_goal', category=self.category, user=self.user,
+                                       due_date=timezone.now())
+        self.client.patch(reverse('retrieve-update-delete-goal', kwargs={'pk': self.goal.pk}), {'title': 'new_title'})
+        data = self._sync(data['token'])
+        self.assertListEqual(sorted(goal['title'] for goal in data['goals']), ['new_goal', 'new_title'])
+
+        # Удаление категории архивирует ее цели через update(), они должны прийти удаленными
+        self.client.delete(reverse('retrieve-update-delete-category', kwargs={'pk': self.category.pk}))
+        data = self._sync(data['token'])
+        self.assertListEqual(data['goals'], [])
+        self.assertListEqual(data['deleted']['goals'], sorted([self.goal.id, new_goal.id]))
+        self.assertListEqual(data['deleted']['categories'], [self.category.id])
+
+        self.assertListEqual(self._sync(data['token'])['deleted']['goals'], [])
+
+    def test_board_delete_and_paging(self):
+        token = self._sync()['token']
+        for i in range(3):
+            Goal.objects.create(title=f'goal_{i}', category=self.category, user=self.user, due_date=timezone.now())
+        self.client.delete(reverse('retrieve-update-delete-board', kwargs={'pk': self.board.pk}))
+
+        deleted, has_more = set(), True
+        while has_more:
+            data = self._sync(token, limit=2)
+            token, has_more = data['token'], data['has_more']
+            deleted.update(data['deleted']['goals'])
+        self.assertSetEqual(deleted, set(Goal.with_archived.values_list('id', flat=True)))
+
+    def test_foreign_boards_and_membership_change(self):
+        token = self._sync()['token']
+        other = User.objects.create_user(username='other', password='!@#qwe123')
+        board = Board.objects.create(title='foreign_board')
+        BoardParticipant.objects.create(board=board, user=other, role=BoardParticipant.Roles.owner)
+        GoalCategory.objects.create(board=board, title='foreign', user=other)
+
+        data = self._sync(token)
+        self.assertFalse(data['reset'])
+        self.assertListEqual(data['categories'], [])
+
+        BoardParticipant.objects.create(board=board, user=self.user, role=BoardParticipant.Roles.reader)
+        self.assertTrue(self._sync(data['token'])['reset'])
+
+    @parameterized.expand([
+        ('not_base64', 'invalid'),
+        ('not_object', encode_token_payload([1, 2])),
+        ('txid_str', encode_token_payload({'txid': '1', 'event_id': 1, 'boards': '', 'issued': 1})),
+        ('event_id_null', encode_token_payload({'txid': 1, 'event_id': None, 'boards': '', 'issued': 1})),
+        ('boards_int', encode_token_payload({'txid': 1, 'event_id': 1, 'boards': 1, 'issued': 1})),
+        ('issued_float', encode_token_payload({'txid': 1, 'event_id': 1, 'boards': '', 'issued': 1.5})),
+    ])
+    def test_invalid_token(self, _, token: str):
+        response = self.client.get(self.url, {'token': token})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_reads_from_primary(self):
+        token = self._sync()['token']
+        Goal.objects.create(title='new_goal', category=self.category, user=self.user, due_date=timezone.now())
+        request = RequestFactory().get(self.url)
+        request.user = self.user
+        # Запрос, которому middleware выбрало реплику; такой базы нет, и любое чтение с нее упадет
+        reset = replica_alias.set('lagging_replica')
+        try:
+            data = get_changes(request, token, limit=10)
+        finally:
+            replica_alias.reset(reset)
+        self.assertListEqual([goal['title'] for goal in data['goals']], ['new_goal'])
+
+
+class BoardEventsStreamTest(APITransactionTestCase):
+
+    def setUp(self) -> None:
+        self.user = User.objects.create_user(username='test_user', password='!@#qwe123')
+        self.board = Board.objects.create(title='board')
+        BoardParticipant.objects.create(board=self.board, user=self.user, role=BoardParticipant.Roles.owner)
+        self.category = GoalCategory.objects.create(board=self.board, title='category', user=self.user)
+
+    def _scope(self, cookies: str = '') -> dict:
+        return {'type': 'http', 'method': 'GET', 'path': '/goals/events', 'query_string': b'',
+                'headers': [(b'cookie', cookies.encode('ascii'))]}
+
+    @staticmethod
+    async def _read_events(communicator: ApplicationCommunicator, count: int) -> list[dict]:
+        events = []
+        while len(events) < count:
+            body = (await communicator.receive_output(timeout=3))['body'].decode('utf-8')
+            events += [json.loads(line[len('data: '):]) for line in body.splitlines() if line.startswith('data: ')]
+        return events
+
+    def test_auth_required(self):
+        async def scenario():
+            communicator = ApplicationCommunicator(application, self._scope())
+            await communicator.send_input({'type': 'http.request'})
+            return await communicator.receive_output(timeout=3)
+        self.assertEqual(async_to_sync(scenario)()['status'], status.HTTP_403_FORBIDDEN)
+
+    def test_events_for_own_boards(self):
+        self.client.force_login(self.user)
+        scope = self._scope(f'sessionid={self.client.cookies["sessionid"].value}')
+        other_board = Board.objects.create(title='foreign_board')
+
+        def create_goal_and_foreign_category() -> Goal:
+            GoalCategory.objects.create(board=other_board, title='foreign', user=self.user)
+            return Goal.objects.create(title='goal', category=self.category, user=self.user, due_date=timezone.now())
+
+        async def scenario():
+            communicator = ApplicationCommunicator(application, scope)
+            await communicator.send_input({'type': 'http.request'})
+            self.assertEqual((await communicator.receive_output(timeout=3))['status'], status.HTTP_200_OK)
+            await communicator.receive_output(timeout=3)
+
+            # Событие чужой доски не приходит, своей – приходит после коммита
+            goal = await sync_to_async(create_goal_and_foreign_category)()
+            self.assertListEqual(await self._read_events(communicator, 1),
+                                 [{'board': self.board.id, 'entity': 'goal', 'ids': [goal.id]}])
+
+            # После добавления на доску подписка расширяется
+            await sync_to_async(BoardParticipant.objects.create)(board=other_board, user=self.user,
+                                                                 role=BoardParticipant.Roles.reader)
+            self.assertEqual((await self._read_events(communicator, 1))[0]['entity'], 'participant')
+            category = await sync_to_async(GoalCategory.objects.create)(board=other_board, title='new',
+                                                                        user=self.user)
+            self.assertListEqual(await self._read_events(communicator, 1),
+                                 [{'board': other_board.id, 'entity': 'category', 'ids': [category.id]}])
+
+            await communicator.send_input({'type': 'http.disconnect'})
+            await communicator.wait(timeout=3)
+
+        async_to_sync(scenario)()
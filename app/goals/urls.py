@@ -5,7 +5,9 @@ from goals import views
 urlpatterns = [
     path('board/create', views.BoardCreateView.as_view(), name='create-board'),
     path('board/list', views.BoardListView.as_view(), name='list-board'),
+    path('board/summary', views.BoardSummaryView.as_view(), name='summary-board'),
     path('board/<pk>', views.BoardView.as_view(), name='retrieve-update-delete-board'),
+    path('board/<pk>/export', views.BoardExportView.as_view(), name='export-board'),
 
     path('goal_category/create', views.CreateGoalCategoryView.as_view(), name='create-category'),
     path('goal_category/list', views.ListGoalCategoryView.as_view(), name='list-category'),
@@ -13,9 +15,16 @@ urlpatterns = [
 
     path('goal/create', views.CreateGoalView.as_view(), name='create-goal'),
     path('goal/list', views.ListGoalView.as_view(), name='list-goal'),
+    path('goal/batch', views.BatchGoalView.as_view(), name='batch-goal'),
+    path('goal/import', views.GoalImportView.as_view(), name='import-goal'),
+    path('goal/archived', views.ListArchivedGoalView.as_view(), name='list-archived-goal'),
+    path('goal/archived/<pk>', views.RetrieveArchivedGoalView.as_view(), name='retrieve-archived-goal'),
+    path('goal/archived/<pk>/restore', views.RestoreArchivedGoalView.as_view(), name='restore-archived-goal'),
     path('goal/<pk>', views.RUDGoalView.as_view(), name='retrieve-update-delete-goal'),
 
     path('goal_comment/create', views.CreateGoalCommentView.as_view(), name='create-comment'),
     path('goal_comment/list', views.ListGoalCommentView.as_view(), name='list-comment'),
     path('goal_comment/<pk>', views.RUDGoalCommentView.as_view(), name='retrieve-update-delete-comment'),
+
+    path('sync', views.SyncView.as_view(), name='sync'),
 ]
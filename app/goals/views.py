@@ -1,14 +1,28 @@
 from django.db import transaction
-from django.db.models import Q
+from django.db.models import Prefetch, Count, OuterRef, Subquery, Sum, Max
+from django.db.models.functions import Coalesce
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import permissions, generics, filters
-from rest_framework.pagination import LimitOffsetPagination
-from goals.filters import GoalDateFilter
-from goals.models import GoalCategory, Goal, GoalComment, Board
+from rest_framework.exceptions import ValidationError, NotFound
+from rest_framework.pagination import _positive_int
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
+from goals.export import iter_export, ENTITIES, FORMATS
+from goals.filters import GoalDateFilter, GoalSearchFilter
+from goals.importer import GoalImporter, read_rows
+from goals.membership import get_board_roles
+from goals.mixins import ConditionalListMixin, ConditionalRetrieveMixin, make_etag
+from goals.models import GoalCategory, Goal, GoalComment, Board, BoardParticipant, BoardEvent, \
+    BoardGoalStats, GoalArchive, ArchivedGoal
+from goals.pagination import KeysetPagination
 from goals.permissions import IsAnAuthor, BoardPermission, GoalCategoryPermission, GoalPermission, CommentPermission
 from goals.serializers import CreateGoalCategorySerializer, ListGoalCategorySerializer, CreateGoalSerializer, \
     ListGoalSerializer, CreateCommentSerializer, CommentSerializer, BoardSerializer, BoardListSerializer, \
-    BoardCreateSerializer
+    BoardCreateSerializer, BatchGoalSerializer, ArchivedGoalSerializer, ArchivedGoalDetailSerializer, \
+    RestoreGoalSerializer
+from goals.sync import get_changes
 
 
 # Вьюшки досок
@@ -18,40 +32,133 @@ class BoardCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
 
-class BoardListView(generics.ListAPIView):
+class BoardListView(ConditionalListMixin, generics.ListAPIView):
     model = Board
     serializer_class = BoardListSerializer
     permission_classes = [permissions.IsAuthenticated, BoardPermission]
-    pagination_class = LimitOffsetPagination
+    pagination_class = KeysetPagination
     filter_backends = [filters.OrderingFilter]
+    ordering_fields = ['title', 'created']
     ordering = ['title']
 
+    # Комментарий для себя
+    # Роль пользователя и счетчики считаем коррелированными подзапросами в том же SELECT, что и страницу досок.
+    # Каждый подзапрос идет по своему индексу: роль – по уникальному (user, board), участники – по board_id,
+    # категории – по частичному индексу живых категорий, цели – по BoardGoalStats. JOIN с GROUP BY тут не годится:
+    # соединение участников, категорий и целей перемножает строки и требует DISTINCT в каждом COUNT.
     def get_queryset(self):
-        return Board.objects.prefetch_related('participants').filter(
-            participants__user_id=self.request.user.id,
-            is_deleted=False)
+        board = OuterRef('pk')
+        return Board.objects.filter(id__in=get_board_roles(self.request).keys()).annotate(
+            role=Subquery(BoardParticipant.objects.filter(board=board, user=self.request.user).values('role')[:1]),
+            participants_count=self._count(BoardParticipant.objects.filter(board=board)),
+            categories_count=self._count(GoalCategory.objects.filter(board=board)),
+            goals_count=Coalesce(Subquery(
+                BoardGoalStats.objects.filter(board=board).order_by().values('board').annotate(
+                    total=Sum('count')).values('total')), 0),
+        )
+
+    @staticmethod
+    def _count(queryset) -> Coalesce:
+        return Coalesce(Subquery(queryset.order_by().values('board').annotate(count=Count('*')).values('count')), 0)
+
+    def get_list_etag(self, queryset) -> str:
+        # Счетчики меняются без изменения самой доски: учитываем последнее событие журнала
+        # (категории и цели) и состояние участников досок
+        board_ids = get_board_roles(self.request).keys()
+        events = BoardEvent.objects.filter(board_id__in=board_ids).aggregate(last=Max('id'))
+        participants = BoardParticipant.objects.filter(board_id__in=board_ids).aggregate(
+            last_updated=Max('updated'), count=Count('id'))
+        return make_etag(super().get_list_etag(queryset), events['last'],
+                         participants['last_updated'], participants['count'])
+
+
+class BoardSummaryView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    # Комментарий для себя
+    # Счетчики по статусу и приоритету читаем из BoardGoalStats, а не из целей.
+    # Просроченные зависят от текущего времени, их не сохранить заранее, поэтому считаем по индексу (board, due_date)
+    def get(self, request, *args, **kwargs):
+        boards = Board.objects.filter(id__in=get_board_roles(request).keys()).order_by('title', 'id')
+        summary = {board.id: {'board': board.id, 'title': board.title, 'total': 0, 'overdue': 0,
+                              'by_status': {}, 'by_priority': {}} for board in boards.only('id', 'title')}
+
+        stats = BoardGoalStats.objects.filter(board_id__in=summary.keys(), count__gt=0)
+        for board_id, goal_status, priority, count in stats.values_list('board_id', 'status', 'priority', 'count'):
+            board = summary[board_id]
+            board['total'] += count
+            board['by_status'][goal_status] = board['by_status'].get(goal_status, 0) + count
+            board['by_priority'][priority] = board['by_priority'].get(priority, 0) + count
 
+        overdue = Goal.objects.filter(
+            board_id__in=summary.keys(), due_date__lt=timezone.now(),
+            status__in=[Goal.Status.to_do, Goal.Status.in_progress],
+        ).order_by().values_list('board_id').annotate(count=Count('id'))
+        for board_id, count in overdue:
+            summary[board_id]['overdue'] = count
 
-class BoardView(generics.RetrieveUpdateDestroyAPIView):
+        return Response({'results': list(summary.values())})
+
+
+class BoardView(ConditionalRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
     model = Board
     permission_classes = [permissions.IsAuthenticated, BoardPermission]
     serializer_class = BoardSerializer
 
     def get_queryset(self):
-        return Board.objects.prefetch_related('participants').filter(
-            participants__user=self.request.user.id,
-            is_deleted=False)
+        return Board.objects.prefetch_related(
+            Prefetch('participants', queryset=BoardParticipant.objects.select_related('user'))).filter(
+            id__in=get_board_roles(self.request).keys())
 
     def perform_destroy(self, instance):
         # При удалении доски ставим отметку is_deleted = True, обновляем статусы целей и удаляем категории
         with transaction.atomic():
             instance.is_deleted = True
             instance.save(update_fields=('is_deleted',))
-            instance.categories.update(is_deleted=True)
-            Goal.objects.filter(category__board=instance).update(status=Goal.Status.archived)
+            # update() не вызывает save() и сигналы: дату обновления ставим сами, по ней считается ETag,
+            # а удаление категорий и целей записываем в журнал для синхронизации
+            now = timezone.now()
+            # Менеджеры связей отдают только живые категории и цели
+            categories = instance.categories.all()
+            goals = instance.goals.all()
+            BoardEvent.objects.record_queryset(BoardEvent.Entity.category, categories)
+            BoardEvent.objects.record_queryset(BoardEvent.Entity.goal, goals)
+            BoardGoalStats.objects.subtract_queryset(goals)
+            categories.update(is_deleted=True, updated=now)
+            goals.update(status=Goal.Status.archived, updated=now)
         return instance
 
 
+class BoardExportView(generics.GenericAPIView):
+    # Ответ – синхронный генератор с транзакцией между отдачами, под ASGI его обслуживает WSGI обработчик
+    # (см. ToDoList/asgi.py)
+    permission_classes = [permissions.IsAuthenticated, BoardPermission]
+    content_types = {'ndjson': 'application/x-ndjson; charset=utf-8', 'csv': 'text/csv; charset=utf-8'}
+
+    def get_queryset(self):
+        return Board.objects.filter(id__in=get_board_roles(self.request).keys())
+
+    def get(self, request, *args, **kwargs):
+        board = self.get_object()
+        # Параметр format занят DRF под выбор рендерера, поэтому output
+        output = request.query_params.get('output', 'ndjson')
+        entity = request.query_params.get('entity')
+        if output not in FORMATS:
+            raise ValidationError({'output': [f'Допустимые значения: {", ".join(FORMATS)}']})
+        if entity is not None and entity not in ENTITIES:
+            raise ValidationError({'entity': [f'Допустимые значения: {", ".join(ENTITIES)}']})
+        if output == 'csv' and entity is None:
+            raise ValidationError({'entity': ['Для CSV нужно выбрать одну сущность']})
+
+        entities = [entity] if entity else list(ENTITIES)
+        compress = request.query_params.get('gzip') in ('1', 'true')
+        filename = f'board-{board.id}-{entity or "all"}.{output}' + ('.gz' if compress else '')
+        response = StreamingHttpResponse(iter_export(board.id, output, entities, compress),
+                                         content_type='application/gzip' if compress else self.content_types[output])
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
 # Вьюшки категорий
 class CreateGoalCategoryView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
@@ -59,11 +166,11 @@ class CreateGoalCategoryView(generics.CreateAPIView):
     serializer_class = CreateGoalCategorySerializer
 
 
-class ListGoalCategoryView(generics.ListAPIView):
+class ListGoalCategoryView(ConditionalListMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated, GoalCategoryPermission]
     model = GoalCategory
     serializer_class = ListGoalCategorySerializer
-    pagination_class = LimitOffsetPagination
+    pagination_class = KeysetPagination
     filter_backends = [filters.OrderingFilter, filters.SearchFilter, DjangoFilterBackend]
     filterset_fields = ['board']
     ordering_fields = ['title', 'created']
@@ -71,26 +178,27 @@ class ListGoalCategoryView(generics.ListAPIView):
     search_fields = ['title']
 
     def get_queryset(self):
-        return GoalCategory.objects.prefetch_related('board__participants').filter(
-                                is_deleted=False,
-                                board__participants__user_id=self.request.user.id)
+        return GoalCategory.objects.select_related('user').filter(
+                                board_id__in=get_board_roles(self.request).keys())
 
 
-class RUDGoalCategoryView(generics.RetrieveUpdateDestroyAPIView):
+class RUDGoalCategoryView(ConditionalRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     model = GoalCategory
     serializer_class = ListGoalCategorySerializer
 
     def get_queryset(self):
-        return GoalCategory.objects.prefetch_related('board__participants').filter(
-                                is_deleted=False,
-                                board__participants__user_id=self.request.user.id)
+        return GoalCategory.objects.select_related('user').filter(
+                                board_id__in=get_board_roles(self.request).keys())
 
     def perform_destroy(self, instance: GoalCategory):
         with transaction.atomic():
             instance.is_deleted = True
             instance.save(update_fields=('is_deleted',))
-            Goal.objects.filter(category=instance).update(status=Goal.Status.archived)
+            goals = instance.goals.all()
+            BoardEvent.objects.record_queryset(BoardEvent.Entity.goal, goals)
+            BoardGoalStats.objects.subtract_queryset(goals)
+            goals.update(status=Goal.Status.archived, updated=timezone.now())
         return instance
 
 
@@ -101,30 +209,29 @@ class CreateGoalView(generics.CreateAPIView):
     serializer_class = CreateGoalSerializer
 
 
-class ListGoalView(generics.ListAPIView):
+class ListGoalView(ConditionalListMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated, GoalPermission]
     model = Goal
     serializer_class = ListGoalSerializer
-    pagination_class = LimitOffsetPagination
-    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, filters.SearchFilter]
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter, GoalSearchFilter]
     filterset_class = GoalDateFilter
-    ordering_fields = ['priority', 'due_date']
+    ordering_fields = ['title', 'priority', 'due_date', 'created']
     ordering = ['title']
-    search_fields = ['title']
 
     def get_queryset(self):
-        return Goal.objects.select_related('user', 'category__board').filter(Q(
-            category__board__participants__user_id=self.request.user.id)).filter(~Q(status=Goal.Status.archived))
+        return Goal.objects.select_related('user').filter(
+            board_id__in=get_board_roles(self.request).keys())
 
 
-class RUDGoalView(generics.RetrieveUpdateDestroyAPIView):
+class RUDGoalView(ConditionalRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated, IsAnAuthor, GoalPermission]
     model = Goal
     serializer_class = ListGoalSerializer
 
     def get_queryset(self):
-        return Goal.objects.select_related('user', 'category__board').filter(Q(
-            category__board__participants__user_id=self.request.user.id)).filter(~Q(status=Goal.Status.archived))
+        return Goal.objects.select_related('user').filter(
+            board_id__in=get_board_roles(self.request).keys())
 
     def perform_destroy(self, instance):
         instance.status = Goal.Status.archived
@@ -132,40 +239,132 @@ class RUDGoalView(generics.RetrieveUpdateDestroyAPIView):
         return instance
 
 
+class BatchGoalView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = BatchGoalSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response({'results': serializer.save()})
+
+
+class GoalImportView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, *args, **kwargs):
+        file = request.FILES.get('file')
+        if file is None:
+            raise ValidationError({'file': ['Обязательное поле.']})
+        dry_run = request.data.get('dry_run') in ('1', 'true')
+        importer = GoalImporter(request.user, get_board_roles(request))
+        return Response(importer.run(read_rows(file, file.name), dry_run=dry_run))
+
+
+class ListArchivedGoalView(ConditionalListMixin, generics.ListAPIView):
+    permission_classes = [permissions.IsAuthenticated, GoalPermission]
+    model = GoalArchive
+    serializer_class = ArchivedGoalSerializer
+    pagination_class = KeysetPagination
+    filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
+    filterset_fields = ['board', 'category']
+    ordering_fields = ['updated', 'title', 'due_date']
+    ordering = ['-updated']
+    # archive_goals переносит цель в холодную таблицу, не меняя updated и количество строк, а is_cold меняется
+    etag_aggregates = {'last_archived': Max('archived'), 'cold': Count('archived')}
+
+    # Архивные цели из горячей и холодной таблиц одним запросом через представление
+    def get_queryset(self):
+        return GoalArchive.objects.select_related('user').filter(board_id__in=get_board_roles(self.request).keys())
+
+
+class RetrieveArchivedGoalView(ConditionalRetrieveMixin, generics.RetrieveAPIView):
+    permission_classes = [permissions.IsAuthenticated, GoalPermission]
+    model = GoalArchive
+    serializer_class = ArchivedGoalDetailSerializer
+
+    def get_modified(self, instance: GoalArchive):
+        # Перенос в холодную таблицу меняет is_cold, но не updated
+        return max(instance.updated, instance.archived or instance.updated)
+
+    def get_queryset(self):
+        return GoalArchive.objects.select_related('user').filter(board_id__in=get_board_roles(self.request).keys())
+
+
+class RestoreArchivedGoalView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated, IsAnAuthor, GoalPermission]
+    serializer_class = RestoreGoalSerializer
+
+    def get_queryset(self):
+        return GoalArchive.objects.select_related('category').filter(
+            board_id__in=get_board_roles(self.request).keys())
+
+    def post(self, request, *args, **kwargs):
+        entry = self.get_object()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        if entry.category.is_deleted:
+            raise ValidationError({'category': ['Категория удалена, цель восстановить нельзя']})
+
+        goal_status = serializer.validated_data['status']
+        try:
+            if entry.is_cold:
+                goal = ArchivedGoal.objects.restore(entry.id, goal_status)
+            else:
+                with transaction.atomic():
+                    goal = Goal.with_archived.select_for_update().get(id=entry.id, status=Goal.Status.archived)
+                    goal.status = goal_status
+                    goal.save(update_fields=('status',))
+        except (ArchivedGoal.DoesNotExist, Goal.DoesNotExist):
+            # Цель успели перенести между таблицами или восстановить параллельным запросом
+            raise NotFound
+        return Response(ListGoalSerializer(goal, context=self.get_serializer_context()).data)
+
+
 class CreateGoalCommentView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated, CommentPermission]
     model = GoalComment
     serializer_class = CreateCommentSerializer
 
 
-class ListGoalCommentView(generics.ListAPIView):
+class ListGoalCommentView(ConditionalListMixin, generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated, CommentPermission]
     model = GoalComment
     serializer_class = CommentSerializer
-    pagination_class = LimitOffsetPagination
+    pagination_class = KeysetPagination
     filter_backends = [DjangoFilterBackend, filters.OrderingFilter]
     filterset_fields = ['goal', 'created']
+    ordering_fields = ['created']
     ordering = ['-created']
 
     def get_queryset(self):
-        return GoalComment.objects.select_related('goal__category__board', 'user').filter(
-            goal__category__board__participants__user_id=self.request.user.id
+        return GoalComment.objects.select_related('user').filter(
+            board_id__in=get_board_roles(self.request).keys()
         )
 
 
-class RUDGoalCommentView(generics.RetrieveUpdateDestroyAPIView):
+class RUDGoalCommentView(ConditionalRetrieveMixin, generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated, IsAnAuthor, CommentPermission]
     model = GoalComment
     serializer_class = CommentSerializer
 
     def get_queryset(self):
-        return GoalComment.objects.select_related('goal__category__board', 'user').filter(
-            goal__category__board__participants__user_id=self.request.user.id
+        return GoalComment.objects.select_related('user').filter(
+            board_id__in=get_board_roles(self.request).keys()
         )
 
 
-
-
-
-
-
+class SyncView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    token_query_param = 'token'
+    limit_query_param = 'limit'
+    default_limit = 500
+    max_limit = 1000
+
+    def get(self, request, *args, **kwargs):
+        try:
+            limit = _positive_int(request.query_params[self.limit_query_param], strict=True, cutoff=self.max_limit)
+        except (KeyError, ValueError):
+            limit = self.default_limit
+        return Response(get_changes(request, request.query_params.get(self.token_query_param), limit))